@@ -1,15 +1,40 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 from pydantic import BaseModel, ValidationError
 from dotenv import load_dotenv
-from playwright.sync_api import sync_playwright
-from llama_index.llms.openai import OpenAI
-from llama_index.program.openai import OpenAIPydanticProgram
 from typing import List, Optional
 from datetime import datetime
+from db_pool import ConnectionPool, PoolTimeout
+from export import ExportError, EXPORT_FORMATS, STREAMERS, check_export_format, export_columns, iter_rows, json_default
+from tables import TABLE_COLUMNS
+from duplicates import find_duplicate_candidates
+from dedup_index import DUPLICATE_BACKEND, DUPLICATE_INDEX_REFRESH, DuplicateIndex
+from bulk import BulkError, bulk_insert, bulk_update
+from extraction import FakeProgram, chunk_records, chunk_text, extract_entries
+from column_mapping import frame_to_entries, merge_llm_fields
+from llm_cache import CachedProgram, ExtractionCache, program_fingerprint
+from token_usage import MeteredProgram, TokenUsage, token_totals, usage_callback_manager
+from schema_trim import SCHEMA_MODE, TrimmedProgram, supports_trimming
+from browser_pool import get_browser_pool
+from scraping import SCRAPE_MODE, fast_scrape
+from jobs import JobQueue
+from metrics import COLLECTORS, REQUEST_SECONDS, REQUESTS_TOTAL, StageTimer, render_metrics
+from response_cache import (RESPONSE_CACHE, RESPONSE_CACHE_LISTEN, COMPRESS_MIN_BYTES, NOTIFY_QUERY,
+                            ResponseCache, choose_encoding, compress, listen_for_changes, table_versions)
+from listing import (ListingError, wants_pagination, parse_listing_args, parse_listing_format,
+                     build_listing_query, next_cursor, count_rows)
+from serialization import RowSerializer
+from search import (SEARCH_COLUMNS, parse_search_args, parse_nearby_args, build_search_query,
+                    build_nearby_query, next_search_cursor)
+import atexit
+import base64
+import functools
+import io
+import json
 import os
+import threading
+import time
 import psycopg2
-import pandas as pd
 
 # Load environment variables
 load_dotenv()
@@ -18,21 +43,159 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app)
 
-# Initialize the LlamaIndex LLM
-openai_api_key = os.getenv("OPENAI_API_KEY")
-if not openai_api_key:
-    raise ValueError("OPENAI_API_KEY is not set in environment variables.")
+# Parse uploads with known spreadsheet headers directly instead of through the LLM
+HEADER_FAST_PATH = os.getenv("HEADER_FAST_PATH", "true").lower() == "true"
 
-llm = OpenAI(model="gpt-3.5-turbo", api_key=openai_api_key)
+# Queue /process-* requests as background jobs by default instead of running them inline
+PROCESS_ASYNC = os.getenv("PROCESS_ASYNC", "false").lower() == "true"
+JOB_EVENTS_POLL_INTERVAL = 0.5
+
+# Database connection pool shared by all routes
+db_pool = ConnectionPool(
+    minconn=int(os.getenv("DB_POOL_MIN", "1")),
+    maxconn=int(os.getenv("DB_POOL_MAX", "10")),
+    acquire_timeout=float(os.getenv("DB_POOL_TIMEOUT", "5")),
+    health_check=os.getenv("DB_POOL_HEALTH_CHECK", "true").lower() == "true",
+    host=os.getenv("DB_HOST"),
+    database=os.getenv("DB_NAME"),
+    user=os.getenv("DB_USER"),
+    password=os.getenv("DB_PASSWORD")
+)
+atexit.register(db_pool.close)
+
+# Seconds a client is told to wait (Retry-After) when no database connection is free
+DB_POOL_RETRY_AFTER = os.getenv("DB_POOL_RETRY_AFTER", "1")
 
-# Database connection
 def get_db_connection():
-    return psycopg2.connect(
-        host=os.getenv("DB_HOST"),
-        database=os.getenv("DB_NAME"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD")
-    )
+    return db_pool.connection()
+
+@app.errorhandler(PoolTimeout)
+def handle_pool_timeout(e):
+    return jsonify({'error': str(e)}), 503, {'Retry-After': DB_POOL_RETRY_AFTER}
+
+@app.route('/pool-metrics', methods=['GET'])
+def get_pool_metrics():
+    return jsonify(db_pool.stats())
+
+# Add ?timings=true (or RESPONSE_TIMINGS=true) to get the per-stage breakdown in the response
+RESPONSE_TIMINGS = os.getenv("RESPONSE_TIMINGS", "false").lower() == "true"
+
+def wants_timings():
+    return RESPONSE_TIMINGS or request.values.get('timings', 'false').lower() == 'true'
+
+def endpoint_label():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+def request_timer():
+    if 'timer' not in g:
+        g.timer = StageTimer(endpoint_label())
+    return g.timer
+
+def with_timings(response):
+    """Attaches the stage breakdown to a JSON response (dict body) or as a Server-Timing header."""
+    if not wants_timings() or 'timer' not in g:
+        return response
+    summary = g.timer.summary()
+    body = response.get_json(silent=True)
+    if isinstance(body, dict):
+        body['timings'] = summary
+        response.set_data(app.json.dumps(body))
+    response.headers['Server-Timing'] = ', '.join(f'{name};dur={ms}' for name, ms in summary.items())
+    return response
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    if 'request_started' in g:
+        endpoint = endpoint_label()
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, endpoint, request.method)
+        REQUESTS_TOTAL.inc(endpoint, request.method, str(response.status_code))
+    return compress_response(with_timings(response))
+
+def compress_response(response):
+    """Compresses large JSON bodies the listing cache did not already encode."""
+    if (response.status_code != 200 or response.is_streamed or response.mimetype != 'application/json'
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is None or response.content_length is None or response.content_length < COMPRESS_MIN_BYTES:
+        return response
+    response.set_data(compress(response.get_data(), encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus scrape endpoint."""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+def collect_pool_metrics():
+    stats = db_pool.stats()
+    return [
+        ('cassis_db_pool_connections', 'gauge', 'Database connections by state.',
+         [({'state': 'in_use'}, stats['in_use']), ({'state': 'idle'}, stats['idle'])]),
+        ('cassis_db_pool_waiting', 'gauge', 'Requests waiting for a database connection.', [({}, stats['waiting'])]),
+        ('cassis_db_pool_acquired_total', 'counter', 'Connections handed out.', [({}, stats['acquired_total'])]),
+        ('cassis_db_pool_timeouts_total', 'counter', 'Connection requests that timed out.', [({}, stats['timeouts_total'])]),
+    ]
+
+COLLECTORS.append(collect_pool_metrics)
+
+# Listing responses, cached per table and query string until the next write to the table
+response_cache = ResponseCache() if RESPONSE_CACHE else None
+
+def table_changed(cursor, table_name):
+    """Called in a write transaction: notifies the other workers, delivered by Postgres at commit."""
+    if response_cache is not None:
+        cursor.execute(NOTIFY_QUERY, (table_name,))
+
+def table_committed(table_name):
+    """Called after a committed write: invalidates the cached listings of this worker."""
+    table_versions.bump(table_name)
+
+def cached_listing(table_name, build):
+    """
+    Serves `build(table_name)` from the response cache while the table is unchanged, with a
+    strong ETag: a client sending it back in If-None-Match gets a 304 without a body.
+    """
+    if response_cache is None or wants_timings():
+        return build(table_name)
+    key = ('wsgi', request.path, tuple(sorted(request.args.items(multi=True))))
+    version = table_versions.get(table_name)
+    entry = response_cache.get(key, version)
+    if entry is None:
+        response = app.make_response(build(table_name))
+        if response.status_code != 200:
+            return response
+        entry = response_cache.put(key, version, response.get_data(), response.mimetype)
+    status, body, headers = entry.respond(request.headers.get('If-None-Match'), request.headers.get('Accept-Encoding'))
+    if status == 304:
+        response_cache.record_not_modified()
+    response = Response(body, status=status, headers=headers, mimetype=entry.content_type)
+    response.vary.add('Accept-Encoding')
+    return response
+
+def collect_response_cache_metrics():
+    if response_cache is None:
+        return []
+    stats = response_cache.stats()
+    return [
+        ('cassis_response_cache_entries', 'gauge', 'Cached listing responses.', [({}, stats['entries'])]),
+        ('cassis_response_cache_bytes', 'gauge', 'Size of the cached listing bodies.', [({}, stats['bytes'])]),
+        ('cassis_response_cache_requests_total', 'counter', 'Listing requests by cache outcome.',
+         [({'result': 'hit'}, stats['hits']), ({'result': 'miss'}, stats['misses']),
+          ({'result': 'not_modified'}, stats['not_modified'])]),
+    ]
+
+COLLECTORS.append(collect_response_cache_metrics)
+
+def listen_connection():
+    return psycopg2.connect(host=os.getenv("DB_HOST"), database=os.getenv("DB_NAME"),
+                            user=os.getenv("DB_USER"), password=os.getenv("DB_PASSWORD"))
 
 # Define Pydantic models for structured data with descriptions
 class AnnuaireEntry(BaseModel):
@@ -90,6 +253,11 @@ class EvenementEntry(BaseModel):
     id_dernier_modificateur: Optional[str]
     date_de_peremption: Optional[str]
 
+ENTRY_MODELS = {
+    "annuaire": AnnuaireEntry,
+    "evenement": EvenementEntry,
+}
+
 class AnnuaireEntries(BaseModel):
     """Model representing multiple entries for the Annuaire database."""
     entries: List[AnnuaireEntry]
@@ -98,197 +266,682 @@ class EvenementEntries(BaseModel):
     """Model representing multiple entries for the Evenement database."""
     entries: List[EvenementEntry]
 
-# Define Pydantic programs
-annuaire_program = OpenAIPydanticProgram.from_defaults(
-    output_cls=AnnuaireEntries,
-    llm=llm,
-    prompt_template_str="Extract structured data for AnnuaireEntries from the following text: {text_input}",
-    verbose=True
-)
+# Pydantic programs are built on first use (see get_program), so starting a worker does not
+# import LlamaIndex nor require OPENAI_API_KEY. LLM_BACKEND=fake swaps the OpenAI calls for a
+# local offline stand-in.
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-3.5-turbo") if LLM_BACKEND != "fake" else "fake"
+ANNUAIRE_PROMPT = "Extract structured data for AnnuaireEntries from the following text: {text_input}"
+EVENEMENT_PROMPT = "Extract structured data for EvenementEntries from the following text: {text_input}"
 
-evenement_program = OpenAIPydanticProgram.from_defaults(
-    output_cls=EvenementEntries,
-    llm=llm,
-    prompt_template_str="Extract structured data for EvenementEntries from the following text: {text_input}",
-    verbose=True
-)
+# Per table program settings, LLM_MODEL_ANNUAIRE / LLM_MODEL_EVENEMENT override LLM_MODEL
+PROGRAM_SETTINGS = {
+    "annuaire": {
+        "output_cls": AnnuaireEntries,
+        "prompt": ANNUAIRE_PROMPT,
+        "model": (os.getenv("LLM_MODEL_ANNUAIRE") or LLM_MODEL) if LLM_BACKEND != "fake" else "fake",
+    },
+    "evenement": {
+        "output_cls": EvenementEntries,
+        "prompt": EVENEMENT_PROMPT,
+        "model": (os.getenv("LLM_MODEL_EVENEMENT") or LLM_MODEL) if LLM_BACKEND != "fake" else "fake",
+    },
+}
+
+# Cache extraction results so retried uploads do not pay for the LLM again
+LLM_CACHE = os.getenv("LLM_CACHE", "true").lower() == "true"
+extraction_cache = None
+extraction_cache_lock = threading.Lock()
+
+def get_extraction_cache():
+    """Opens the extraction cache on first use, None when LLM_CACHE is off."""
+    global extraction_cache
+    if not LLM_CACHE:
+        return None
+    with extraction_cache_lock:
+        if extraction_cache is None:
+            extraction_cache = ExtractionCache()
+        return extraction_cache
+
+@functools.lru_cache(maxsize=None)
+def get_llm(model):
+    """One LlamaIndex client per model name, shared by the programs using it."""
+    from llama_index.llms.openai import OpenAI
+
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not openai_api_key:
+        raise ValueError("OPENAI_API_KEY is not set in environment variables.")
+    # Reports the API token usage of each call to MeteredProgram
+    return OpenAI(model=model, api_key=openai_api_key, callback_manager=usage_callback_manager())
+
+programs = {}
+programs_lock = threading.Lock()
+
+def get_program(table_name):
+    """Builds (once) the extraction program of a table, wrapped in the extraction cache when enabled."""
+    with programs_lock:
+        program = programs.get(table_name)
+        if program is not None:
+            return program
+
+        settings = PROGRAM_SETTINGS[table_name]
+
+        def make_program(output_cls, prompt_template):
+            if LLM_BACKEND == "fake":
+                program = FakeProgram(output_cls, latency=float(os.getenv("FAKE_LLM_LATENCY", "0")))
+            else:
+                from llama_index.program.openai import OpenAIPydanticProgram
+
+                program = OpenAIPydanticProgram.from_defaults(
+                    output_cls=output_cls,
+                    llm=get_llm(settings["model"]),
+                    prompt_template_str=prompt_template,
+                    verbose=True
+                )
+            return MeteredProgram(program, table_name, prompt_template)
+
+        # LLM_SCHEMA_MODE=core|two_pass only sends the fields likely to be in the text
+        mode = SCHEMA_MODE if supports_trimming(table_name) else "full"
+        if mode == "full":
+            program = make_program(settings["output_cls"], settings["prompt"])
+        else:
+            program = TrimmedProgram(table_name, settings["output_cls"], make_program, settings["prompt"],
+                                     two_pass=mode == "two_pass")
+
+        cache = get_extraction_cache()
+        if cache is not None:
+            program = CachedProgram(
+                program, cache,
+                program_fingerprint(f"{table_name}:{mode}", settings["model"], settings["prompt"], settings["output_cls"])
+            )
+        programs[table_name] = program
+        return program
+
+@app.route('/token-metrics', methods=['GET'])
+def get_token_metrics():
+    """Estimated LLM token usage since start up, per table."""
+    return jsonify({name: usage.as_dict() for name, usage in token_totals.items()})
+
+def collect_llm_metrics():
+    samples = []
+    cache = get_extraction_cache()
+    if cache is not None:
+        stats = cache.stats()
+        samples.append(('cassis_llm_cache_lookups_total', 'counter', 'Extraction cache lookups by result.',
+                        [({'result': 'hit'}, stats['hits']), ({'result': 'miss'}, stats['misses'])]))
+        samples.append(('cassis_llm_cache_entries', 'gauge', 'Results stored in the extraction cache.',
+                        [({}, stats['entries'])]))
+    usage = {name: totals.as_dict() for name, totals in token_totals.items()}
+    samples.append(('cassis_llm_calls_total', 'counter', 'LLM calls by table.',
+                    [({'table': name}, u['calls']) for name, u in usage.items()]))
+    samples.append(('cassis_llm_tokens_total', 'counter', 'Estimated LLM tokens by table and direction.',
+                    [({'table': name, 'direction': direction}, u[f'{direction}_tokens'])
+                     for name, u in usage.items() for direction in ('prompt', 'completion')]))
+    return samples
+
+COLLECTORS.append(collect_llm_metrics)
+
+@app.route('/cache-metrics', methods=['GET'])
+def get_cache_metrics():
+    cache = get_extraction_cache()
+    if cache is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(cache.stats(), enabled=True))
 
 @app.route('/annuaire', methods=['GET'])
 def get_annuaire():
-    return fetch_table_entries("annuaire")
+    return cached_listing("annuaire", fetch_table_entries)
 
 @app.route('/evenements', methods=['GET'])
 def get_evenement_entries():
-    return fetch_table_entries("evenement")
+    return cached_listing("evenement", fetch_table_entries)
+
+def json_response(body):
+    return Response(body, mimetype='application/json')
 
 def fetch_table_entries(table_name):
+    if wants_pagination(table_name, request.args):
+        return fetch_table_page(table_name)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT * FROM {table_name};")
-        rows = cursor.fetchall()
-        column_names = [desc[0] for desc in cursor.description]
-        conn.close()
-        return jsonify([dict(zip(column_names, row)) for row in rows])
+        listing_format = parse_listing_format(request.args)
+    except ListingError as e:
+        return jsonify({'error': str(e)}), 400
+
+    timer = request_timer()
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            with timer.stage('query'):
+                cursor.execute(f"SELECT * FROM {table_name};")
+                rows = cursor.fetchall()
+            serializer = RowSerializer(cursor.description)
+        with timer.stage('serialize'):
+            return json_response(serializer.dumps(serializer.listing(rows, listing_format)))
+    except PoolTimeout:
+        raise
     except Exception as e:
         import traceback
         print("Error occurred while fetching table entries:")
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
-def scrape_content(url):
+def fetch_table_page(table_name):
+    """
+    Keyset-paginated listing, e.g. GET /annuaire?limit=50&fields=nom,prenom&localite=Paris&sort=nom.
+    Returns {"entries", "next_cursor", "total", "total_is_estimate"}; pass next_cursor back as `after`.
+    With format=columnar, "entries" is replaced by "columns" and "rows" (one array per row).
+    """
+    try:
+        options = parse_listing_args(table_name, request.args)
+        listing_format = parse_listing_format(request.args)
+    except ListingError as e:
+        return jsonify({'error': str(e)}), 400
+
+    timer = request_timer()
+    try:
+        query, params = build_listing_query(table_name, options)
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            with timer.stage('query'):
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+            serializer = RowSerializer(cursor.description)
+            with timer.stage('count'):
+                total, is_estimate = count_rows(cursor, table_name, options)
+        with timer.stage('serialize'):
+            return json_response(serializer.dumps(serializer.page(
+                rows[:options['limit']], listing_format,
+                next_cursor=next_cursor(rows, serializer.columns, options),
+                total=total,
+                total_is_estimate=is_estimate
+            )))
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        import traceback
+        print("Error occurred while fetching table page:")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/search/<table_name>', methods=['GET'])
+def search_table(table_name):
+    """
+    Ranked full-text search, e.g. GET /search/annuaire?q=physiothérapie lausanne&limit=20.
+    Returns {"entries", "next_cursor"}, best match first, each entry with its `rank`.
+    """
+    if table_name not in SEARCH_COLUMNS:
+        return jsonify({'error': f"Unknown table '{table_name}'"}), 404
+    return cached_listing(table_name, fetch_search_page)
+
+def fetch_search_page(table_name):
+    try:
+        options = parse_search_args(table_name, request.args)
+        listing_format = parse_listing_format(request.args)
+    except ListingError as e:
+        return jsonify({'error': str(e)}), 400
+    query, params = build_search_query(table_name, options)
+    return fetch_ranked_page(query, params, options, listing_format, 'rank')
+
+@app.route('/annuaire/nearby', methods=['GET'])
+def nearby_annuaire():
+    """
+    Partners closest to a point, e.g. GET /annuaire/nearby?lat=46.52&lon=6.63&radius_km=5.
+    Returns {"entries", "next_cursor"}, nearest first, each entry with its `distance_km`.
+    """
+    return cached_listing("annuaire", fetch_nearby_page)
+
+def fetch_nearby_page(table_name):
+    try:
+        options = parse_nearby_args(request.args)
+        listing_format = parse_listing_format(request.args)
+    except ListingError as e:
+        return jsonify({'error': str(e)}), 400
+    query, params = build_nearby_query(options)
+    return fetch_ranked_page(query, params, options, listing_format, 'distance_km')
+
+def fetch_ranked_page(query, params, options, listing_format, key):
+    timer = request_timer()
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            with timer.stage('query'):
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+            serializer = RowSerializer(cursor.description)
+        with timer.stage('serialize'):
+            return json_response(serializer.dumps(serializer.page(
+                rows[:options['limit']], listing_format,
+                next_cursor=next_search_cursor(rows, serializer.columns, options, key)
+            )))
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        import traceback
+        print("Error occurred while searching:")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/export/<table_name>', methods=['GET'])
+def export_table(table_name):
+    """
+    Streams a whole table, e.g. GET /export/annuaire?format=csv&fields=nom,prenom.
+    Rows are read through a server-side cursor so memory stays constant whatever the table size.
+    """
+    if table_name not in TABLE_COLUMNS:
+        return jsonify({'error': f"Unknown table '{table_name}'"}), 404
+
+    export_format = request.args.get('format', 'ndjson')
+    try:
+        check_export_format(export_format)
+        columns = export_columns(table_name, request.args.get('fields'))
+    except ExportError as e:
+        return jsonify({'error': str(e)}), 400
+
+    conn = db_pool.getconn()
+    released = []
+
+    def release():
+        if not released:
+            released.append(True)
+            db_pool.putconn(conn)
+
+    def generate():
+        try:
+            yield from STREAMERS[export_format](iter_rows(conn, table_name, columns), columns)
+        except Exception:
+            import traceback
+            print("Error occurred while exporting table:")
+            traceback.print_exc()
+            raise
+        finally:
+            release()
+
+    response = Response(stream_with_context(generate()), mimetype=EXPORT_FORMATS[export_format])
+    response.headers['Content-Disposition'] = f'attachment; filename="{table_name}.{export_format}"'
+    response.call_on_close(release)
+    return response
+
+async def scrape_page(page, url):
+    # Visit the page
+    await page.goto(url, timeout=60000)
+    await page.wait_for_load_state("domcontentloaded")  # Ensure basic page content is loaded
+
+    # Optional: Click toggles/buttons to reveal hidden content
+    try:
+        # Adjust this selector to match elements that toggle hidden content
+        toggles = await page.query_selector_all("button, .toggle, [data-toggle]")
+        for toggle in toggles:
+            if await toggle.is_visible():  # Only click visible elements
+                await toggle.click()
+                await page.wait_for_timeout(100)  # Small delay for DOM updates
+    except Exception as toggle_error:
+        print(f"Error clicking toggles: {toggle_error}")
+
+    # Wait for the main content to load
+    try:
+        await page.wait_for_selector(".content-class", timeout=10000)  # Replace with actual content selector
+    except Exception as wait_error:
+        print(f"Content not found in time: {wait_error}")
+
+    # Extract all visible text from the page
+    return await page.evaluate("() => document.body.innerText")
+
+def scrape_handler(timings=None):
+    if SCRAPE_MODE == "fast":
+        return lambda page, page_url: fast_scrape(page, page_url, timings)
+    return scrape_page
+
+def scrape_content(url, timings=None):
+    """
+    Returns the visible text of `url`, or None on failure.
+    SCRAPE_MODE=fast (default) blocks heavy resources and waits for the DOM to settle, filling
+    `timings` with per-phase durations; SCRAPE_MODE=legacy keeps the fixed waits of scrape_page.
+    """
+    handler = scrape_handler(timings)
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-
-            # Visit the page
-            page.goto(url, timeout=60000)
-            page.wait_for_load_state("domcontentloaded")  # Ensure basic page content is loaded
-
-            # Optional: Click toggles/buttons to reveal hidden content
-            try:
-                # Adjust this selector to match elements that toggle hidden content
-                toggles = page.query_selector_all("button, .toggle, [data-toggle]")
-                for toggle in toggles:
-                    if toggle.is_visible():  # Only click visible elements
-                        toggle.click()
-                        page.wait_for_timeout(100)  # Small delay for DOM updates
-            except Exception as toggle_error:
-                print(f"Error clicking toggles: {toggle_error}")
-
-            # Wait for the main content to load
-            try:
-                page.wait_for_selector(".content-class", timeout=10000)  # Replace with actual content selector
-            except Exception as wait_error:
-                print(f"Content not found in time: {wait_error}")
-
-            # Extract all visible text from the page
-            content = page.evaluate("() => document.body.innerText")
-
-            browser.close()
-            return content
+        # Pages are served from the shared, long-lived browser instead of a fresh Chromium per call
+        return get_browser_pool().scrape(url, handler)
     except Exception as e:
         print(f"Error occurred while scraping: {e}")
         return None
 
 @app.route('/process-annuaire', methods=['POST'])
 def process_annuaire_input():
-    return process_input("annuaire", annuaire_program)
+    return process_input("annuaire")
 
 @app.route('/process-evenement', methods=['POST'])
 def process_evenement_input():
-    return process_input("evenement", evenement_program)
+    return process_input("evenement")
 
-def process_input(table_name, program):
-    url = request.form.get('url', None)
-    text_input = request.form.get('text', '')
-    file = request.files.get('file')
+def build_process_payload(form, file):
+    """JSON-safe copy of the posted url, text and file, as stored for background jobs."""
+    return {
+        'url': form.get('url', None),
+        'text': form.get('text', ''),
+        'file_name': file.filename if file else None,
+        'file_content': base64.b64encode(file.read()).decode() if file else None
+    }
+
+def process_input(table_name):
+    """
+    Runs the scrape/extract/deduplicate/insert pipeline on the posted url, text or file.
+    With `async=true` (or PROCESS_ASYNC=true) the work is queued and a job id is returned
+    immediately; poll GET /jobs/<id> or stream GET /jobs/<id>/events for the result.
+    """
+    payload = build_process_payload(request.form, request.files.get('file'))
+
+    run_async = request.values.get('async', 'true' if PROCESS_ASYNC else 'false').lower() == 'true'
+    if run_async:
+        response, status_code = enqueue_process_job(table_name, payload)
+    else:
+        response, status_code = run_process_pipeline(table_name, payload, timer=request_timer())
+    return jsonify(response), status_code
+
+def enqueue_process_job(table_name, payload):
+    job_id = get_job_queue().enqueue(table_name, payload)
+    return {
+        'job_id': job_id,
+        'status_url': f'/jobs/{job_id}',
+        'events_url': f'/jobs/{job_id}/events'
+    }, 202
+
+def parse_upload(table_name, payload):
+    """
+    Turns an uploaded file into extraction input.
+    :return: Tuple (text_input, records, fast_path); `fast_path` is set when the headers are known
+             and the rows were parsed without the LLM, `records` holds the rows otherwise.
+    """
+    import pandas as pd  # only needed for uploads, kept out of the worker start up
+
+    content = base64.b64decode(payload.get('file_content') or '')
+    file_name = payload['file_name']
+    if file_name.endswith('.csv'):
+        df = pd.read_csv(io.BytesIO(content), dtype=str)  # keep leading zeros of phone numbers
+    elif file_name.endswith('.xlsx'):
+        df = pd.read_excel(io.BytesIO(content), dtype=str)
+    else:
+        return content.decode('utf-8'), None, None
+
+    if HEADER_FAST_PATH:
+        # Headers matching the known spreadsheet layout are parsed without the LLM
+        fast_path = frame_to_entries(table_name, df, ENTRY_MODELS[table_name])
+        if fast_path is not None:
+            return '', None, fast_path
+
+    # Round-trip through to_json so NaN and timestamps become JSON friendly values
+    records = json.loads(df.to_json(orient='records'))
+    return (json.dumps(records, ensure_ascii=False) if records else ''), records, None
+
+def prepare_new_entries(entries):
+    entry_dicts = []
+    for entry in entries:
+        entry_dict = entry.model_dump()  # Use Pydantic v2 `model_dump` to serialize data
+        entry_dict.pop('numero', None)  # Ensure `numero` is excluded for new entries
+        entry_dicts.append(entry_dict)
+    return entry_dicts
+
+def split_duplicates(entry_dicts, all_matches):
+    """Returns (duplicates, entries to insert) from the candidate matches of each new entry."""
+    duplicates = []
+    to_insert = []
+    today = datetime.now().strftime('%Y-%m-%d')
+    for entry_dict, close_matches in zip(entry_dicts, all_matches):
+        if close_matches:
+            # Add to duplicates if matches found
+            duplicates.append({
+                'new_entry': entry_dict,
+                'existing_entries': close_matches
+            })
+        else:
+            entry_dict['date_derniere_modification'] = today
+            to_insert.append(entry_dict)
+    return duplicates, to_insert
+
+def build_process_response(successful_inserts, duplicates, scrape_timings, token_usage=None, rejected_rows=None,
+                           llm_merged_rows=None):
+    # Construct the response
+    response = {'message': 'Processing completed.', 'successful_inserts': successful_inserts}
+    if duplicates:
+        response['duplicates'] = duplicates
+    if rejected_rows:
+        # Upload rows the fast path could not convert, with the reason
+        response['rejected_rows'] = rejected_rows
+    if llm_merged_rows is not None:
+        # Fast path rows completed from their unmapped columns, 0 when the LLM output could not be aligned
+        response['llm_merged_rows'] = llm_merged_rows
+    if scrape_timings:
+        response['scrape_timings'] = scrape_timings
+    if token_usage is not None and (token_usage.calls or token_usage.cache_hits):
+        response['token_usage'] = token_usage.as_dict()
+
+    # If duplicates exist, return a 409 status with duplicate details
+    if duplicates:
+        return response, 409
+
+    # Return success response if no duplicates
+    return response, 201
+
+def run_process_pipeline(table_name, payload, progress=None, timer=None):
+    """
+    Request independent body of process_input, also run by the job workers.
+    :param payload: Dict with url, text, file_name and base64 file_content.
+    :param progress: Optional callback `progress(stage, **details)`.
+    :param timer: Optional StageTimer collecting the duration of each stage.
+    :return: Tuple (response dict, HTTP status code).
+    """
+    progress = progress or (lambda stage, **details: None)
+    timer = timer or StageTimer(f"/process-{table_name}")
+    url = payload.get('url')
+    text_input = payload.get('text') or ''
+    records = None
+    fast_path = None
+    rejected_rows = []
+    llm_merged_rows = None
+    scrape_timings = {}
+    token_usage = TokenUsage()
 
     if url:
         # Scrape content if a URL is provided
-        text_input = scrape_content(url)
+        progress('scraping', url=url)
+        with timer.stage('scrape'):
+            text_input = scrape_content(url, scrape_timings)
         if not text_input:
-            return jsonify({'error': 'Failed to scrape content from the provided URL'}), 400
-    elif file:
+            timer.error('scrape')
+            return {'error': 'Failed to scrape content from the provided URL'}, 400
+    elif payload.get('file_name'):
         # Process the uploaded file
+        progress('parsing', file_name=payload['file_name'])
         try:
-            if file.filename.endswith('.csv'):
-                df = pd.read_csv(file)
-            elif file.filename.endswith('.xlsx'):
-                df = pd.read_excel(file)
-            else:
-                text_input = file.read().decode('utf-8')
-                df = None
-
-            if df is not None:
-                text_input = df.to_json(orient='records')
+            with timer.stage('parse'):
+                text_input, records, fast_path = parse_upload(table_name, payload)
         except Exception as e:
-            return jsonify({'error': f"Failed to process file: {str(e)}"}), 400
+            return {'error': f"Failed to process file: {str(e)}"}, 400
 
-    if not text_input:
-        return jsonify({'error': 'No input provided'}), 400
+    if not text_input and fast_path is None:
+        return {'error': 'No input provided'}, 400
 
     try:
-        # Use Pydantic Program for structured extraction
-        response = program(text_input=text_input)
-        entries = response.entries
+        with timer.stage('extract'):
+            if fast_path is not None:
+                entries, leftovers, rejected_rows = fast_path
+                if leftovers:
+                    # Only the rows with values in unmapped columns go through the LLM
+                    progress('extracting', chunks=1)
+                    llm_entries = extract_entries(get_program(table_name), chunk_records([record for _, record in leftovers]),
+                                                  usage=token_usage)
+                    llm_merged_rows = merge_llm_fields(entries, leftovers, llm_entries)
+            else:
+                # Use Pydantic Program for structured extraction, on row/paragraph aligned chunks in parallel
+                chunks = chunk_records(records) if records else chunk_text(text_input)
+                progress('extracting', chunks=len(chunks))
+                entries = extract_entries(get_program(table_name), chunks, usage=token_usage)
     except (ValidationError, Exception) as e:
-        return jsonify({'error': f"Failed to process input: {str(e)}"}), 500
+        return {'error': f"Failed to process input: {str(e)}"}, 500
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    duplicates = []
-    successful_inserts = []
+    progress('deduplicating', entries=len(entries))
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
 
-    for entry in entries:
         try:
-            entry_dict = entry.model_dump()  # Use Pydantic v2 `model_dump` to serialize data
-            entry_dict.pop('numero', None)  # Ensure `numero` is excluded for new entries
-
-            # Prepare the duplicate detection query
-            if table_name == "annuaire":
-                cursor.execute(
-                    """
-                    SELECT *
-                    FROM annuaire
-                    WHERE similarity(nom, %s) > 0.3 AND LEFT(prenom, 1) = LEFT(%s, 1);
-                    """,
-                    (entry_dict['nom'], entry_dict['prenom'])
-                )
-            elif table_name == "evenement":
-                cursor.execute(
-                    """
-                    SELECT *
-                    FROM evenement
-                    WHERE similarity(nom_evenement, %s) > 0.3 AND LEFT(nom_evenement, 1) = LEFT(%s, 1);
-                    """,
-                    (entry_dict['nom_evenement'], entry_dict['nom_evenement'])
-                )
+            entry_dicts = prepare_new_entries(entries)
 
-            # Check for existing entries
-            existing = cursor.fetchall()
-            column_names = [desc[0] for desc in cursor.description]
-            close_matches = [dict(zip(column_names, row)) for row in existing]
-
-            if close_matches:
-                # Add to duplicates if matches found
-                duplicates.append({
-                    'new_entry': entry_dict,
-                    'existing_entries': close_matches
-                })
-            else:
-                # Insert into the database if no duplicates
-                entry_dict['date_derniere_modification'] = datetime.now().strftime('%Y-%m-%d')
-                columns = ', '.join(entry_dict.keys())
-                values = ', '.join(['%s'] * len(entry_dict))
-                cursor.execute(
-                    f"INSERT INTO {table_name} ({columns}) VALUES ({values}) RETURNING numero",
-                    list(entry_dict.values())
-                )
-                new_numero = cursor.fetchone()[0]  # Fetch the new `numero`
+            # Duplicate detection for the whole batch in one query
+            with timer.stage('deduplicate'):
+                all_matches = find_duplicates(cursor, table_name, entry_dicts)
+            duplicates, successful_inserts = split_duplicates(entry_dicts, all_matches)
+
+            # Insert all non-duplicates with multi-row INSERT statements
+            progress('inserting', entries=len(successful_inserts))
+            with timer.stage('insert'):
+                new_numeros = bulk_insert(cursor, table_name, successful_inserts)
+            for entry_dict, new_numero in zip(successful_inserts, new_numeros):
                 entry_dict['numero'] = new_numero  # Update entry with the generated `numero`
-                successful_inserts.append(entry_dict)
+            if successful_inserts:
+                table_changed(cursor, table_name)
         except Exception as e:
             conn.rollback()
-            return jsonify({'error': f"Database error: {str(e)}"}), 500
+            return {'error': f"Database error: {str(e)}"}, 500
 
-    # Commit changes to the database
-    conn.commit()
-    conn.close()
+        # Commit changes to the database
+        with timer.stage('commit'):
+            conn.commit()
+    if successful_inserts:
+        table_committed(table_name)
+    index_inserted(table_name, successful_inserts)
 
-    # Construct the response
-    response = {'message': 'Processing completed.', 'successful_inserts': successful_inserts}
-    if duplicates:
-        response['duplicates'] = duplicates
+    return build_process_response(successful_inserts, duplicates, scrape_timings, token_usage, rejected_rows,
+                                  llm_merged_rows)
 
-    # If duplicates exist, return a 409 status with duplicate details
-    if duplicates:
-        return jsonify(response), 409
+# In-memory duplicate indexes (DUPLICATE_BACKEND=memory), loaded once and updated on every write
+duplicate_indexes = {}
+duplicate_indexes_lock = threading.Lock()
 
-    # Return success response if no duplicates
-    return jsonify(response), 201
+def get_duplicate_index(table_name, cursor=None):
+    with duplicate_indexes_lock:
+        index = duplicate_indexes.get(table_name)
+        stale = (index is not None and DUPLICATE_INDEX_REFRESH
+                 and time.time() - index.loaded_at > DUPLICATE_INDEX_REFRESH)
+        if index is None or stale:
+            if index is None:
+                index = DuplicateIndex(table_name)
+            if cursor is not None:
+                index.load(cursor)
+            else:
+                with get_db_connection() as conn:
+                    index.load(conn.cursor())
+            duplicate_indexes[table_name] = index
+        return index
+
+def find_duplicates(cursor, table_name, entry_dicts):
+    if DUPLICATE_BACKEND == "memory":
+        return get_duplicate_index(table_name, cursor).find_duplicate_candidates(entry_dicts)
+    return find_duplicate_candidates(cursor, table_name, entry_dicts)
+
+def index_inserted(table_name, rows):
+    index = duplicate_indexes.get(table_name)
+    if index is not None:
+        for row in rows:
+            index.add(row)
+
+def index_updated(table_name, entries, results):
+    index = duplicate_indexes.get(table_name)
+    if index is not None:
+        for result in results:
+            if result['status'] == 'updated':
+                index.update(int(result['numero']), entries[result['index']])
+
+def warm_duplicate_indexes():
+    for table_name in TABLE_COLUMNS:
+        try:
+            get_duplicate_index(table_name)
+        except Exception as e:
+            print(f"Error while loading the duplicate index of {table_name}: {e}")
+
+def run_process_job(table_name, payload, progress):
+    return run_process_pipeline(table_name, payload, progress)
+
+job_queue = None
+job_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """Creates and starts the job workers of this process on first use."""
+    global job_queue
+    with job_queue_lock:
+        if job_queue is None:
+            job_queue = JobQueue(run_process_job, json_default=json_default)
+            job_queue.start()
+            atexit.register(job_queue.stop)
+        return job_queue
+
+# Threads and connections of the serving process, started by the server entry points (asgi.py,
+# `python app.py`) or the first request, never at import: tests and scripts importing the app
+# do not spawn threads nor connect to the database.
+background_tasks_started = False
+background_tasks_lock = threading.Lock()
+
+def start_background_tasks():
+    """Starts the job workers, the table change listener and the duplicate index warmup, once per process."""
+    global background_tasks_started
+    with background_tasks_lock:
+        if background_tasks_started:
+            return
+        background_tasks_started = True
+    get_job_queue()
+    if response_cache is not None and RESPONSE_CACHE_LISTEN:
+        threading.Thread(target=listen_for_changes, args=(listen_connection,), name="table-changes-listener",
+                         daemon=True).start()
+    if DUPLICATE_BACKEND == "memory":
+        threading.Thread(target=warm_duplicate_indexes, name="duplicate-index-warmup", daemon=True).start()
+
+def restart_background_tasks_after_fork():
+    """Threads do not survive fork(): the child of a process that already started them starts its own."""
+    global background_tasks_started, background_tasks_lock, job_queue_lock
+    background_tasks_lock = threading.Lock()
+    job_queue_lock = threading.Lock()
+    if job_queue is not None:
+        job_queue.restart_after_fork()
+    if background_tasks_started:
+        background_tasks_started = False
+        start_background_tasks()
+
+os.register_at_fork(after_in_child=restart_background_tasks_after_fork)
+
+@app.before_request
+def ensure_background_tasks():
+    if not background_tasks_started:
+        start_background_tasks()
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({'error': f"Unknown job '{job_id}'"}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    """Server-sent events with the job progress, ending with a `result` event."""
+    queue = get_job_queue()
+    if queue.get(job_id) is None:
+        return jsonify({'error': f"Unknown job '{job_id}'"}), 404
+
+    def generate():
+        last_progress = None
+        while True:
+            job = queue.get(job_id)
+            if job is None:
+                return
+            if job['progress'] != last_progress:
+                last_progress = job['progress']
+                yield f"event: progress\ndata: {json.dumps(job['progress'])}\n\n"
+            if job['status'] in ('done', 'failed'):
+                data = json.dumps({'status': job['status'], 'status_code': job['status_code'], 'result': job['result']})
+                yield f"event: result\ndata: {data}\n\n"
+                return
+            time.sleep(JOB_EVENTS_POLL_INTERVAL)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/replace-annuaire', methods=['PUT'])
 def replace_annuaire_entry():
@@ -299,26 +952,40 @@ def replace_evenement_entry():
     return replace_entry("evenement")
 
 def replace_entry(table_name):
+    """
+    Replaces a batch of entries in one round trip and reports a status per row.
+    Responds 200 when every row was updated, 207 when some rows failed.
+    """
     try:
         data = request.json
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        if not isinstance(data, list):
+            return jsonify({'error': "Expected a JSON array of entries"}), 400
 
-        for entry in data:
-            processed_entry = {k: (None if v == "" else v) for k, v in entry.items()}
-            if "numero" in processed_entry:
-                cursor.execute(f"""
-                    UPDATE {table_name}
-                    SET {', '.join([f'{k} = %s' for k in processed_entry.keys() if k != 'numero'])},
-                        date_derniere_modification = CURRENT_DATE
-                    WHERE numero = %s
-                """, list(processed_entry.values()) + [processed_entry['numero']])
-            else:
-                return jsonify({'error': "Missing 'numero' field for replacement"}), 400
+        processed_entries = [
+            {k: (None if v == "" else v) for k, v in entry.items()} if isinstance(entry, dict) else entry
+            for entry in data
+        ]
+        timer = request_timer()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            with timer.stage('update'):
+                results = bulk_update(cursor, table_name, processed_entries)
+            updated = sum(1 for result in results if result['status'] == 'updated')
+            if updated:
+                table_changed(cursor, table_name)
+            with timer.stage('commit'):
+                conn.commit()
+        if updated:
+            table_committed(table_name)
+        index_updated(table_name, processed_entries, results)
 
-        conn.commit()
-        conn.close()
-        return jsonify({'message': f'Entries in {table_name} replaced successfully'}), 200
+        response = {
+            'message': f'{updated} of {len(results)} entries in {table_name} replaced successfully',
+            'results': results
+        }
+        return jsonify(response), 200 if updated == len(results) else 207
+    except PoolTimeout:
+        raise
     except Exception as e:
         return jsonify({'error': f"Database error: {str(e)}"}), 500
 
@@ -331,23 +998,44 @@ def add_evenement_entry():
     return add_entry("evenement")
 
 def add_entry(table_name):
+    """Adds one entry (JSON object) or a batch of entries (JSON array) in a handful of statements."""
     try:
-        entry = request.json
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        payload = request.json
+        batch = isinstance(payload, list)
+        entries = payload if batch else [payload]
+        if not entries or not all(isinstance(entry, dict) for entry in entries):
+            return jsonify({'error': "Expected a JSON object or a non-empty array of objects"}), 400
 
-        processed_entry = {k: (None if v == "" else v) for k, v in entry.items()}
-        processed_entry['date_derniere_modification'] = datetime.now().strftime('%Y-%m-%d')
+        today = datetime.now().strftime('%Y-%m-%d')
+        processed_entries = []
+        for entry in entries:
+            processed_entry = {k: (None if v == "" else v) for k, v in entry.items() if k != 'numero'}
+            processed_entry['date_derniere_modification'] = today
+            processed_entries.append(processed_entry)
 
-        columns = ', '.join(processed_entry.keys())
-        values = ', '.join(['%s'] * len(processed_entry))
-        cursor.execute(f"INSERT INTO {table_name} ({columns}) VALUES ({values})", list(processed_entry.values()))
+        timer = request_timer()
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            with timer.stage('insert'):
+                numeros = bulk_insert(cursor, table_name, processed_entries)
+            table_changed(cursor, table_name)
+            with timer.stage('commit'):
+                conn.commit()
+        table_committed(table_name)
+        index_inserted(table_name, [dict(entry, numero=numero) for entry, numero in zip(processed_entries, numeros)])
 
-        conn.commit()
-        conn.close()
-        return jsonify({'message': f'Entry added to {table_name} successfully'}), 201
+        if batch:
+            return jsonify({'message': f'{len(numeros)} entries added to {table_name} successfully', 'numeros': numeros}), 201
+        return jsonify({'message': f'Entry added to {table_name} successfully', 'numero': numeros[0]}), 201
+    except BulkError as e:
+        return jsonify({'error': str(e)}), 400
+    except PoolTimeout:
+        raise
     except Exception as e:
         return jsonify({'error': f"Database error: {str(e)}"}), 500
 
 if __name__ == '__main__':
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        # Reloader child serving the requests, the parent only watches the files
+        start_background_tasks()
     app.run(debug=True)
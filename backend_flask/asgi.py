@@ -0,0 +1,330 @@
+"""
+ASGI entry point: uvicorn asgi:application --workers 1
+
+The read endpoints and the /process-* pipeline are served by async Quart handlers, so a
+request waiting on Postgres, Chromium or the LLM API no longer holds a worker thread.
+Every other route is forwarded unchanged to the Flask app through asgiref's WsgiToAsgi.
+"""
+import asyncio
+import json
+import os
+import time
+
+from asgiref.wsgi import WsgiToAsgi
+from psycopg_pool import AsyncConnectionPool, PoolTimeout as AsyncPoolTimeout
+from quart import Quart, Response, g, jsonify, request
+from quart_cors import cors
+
+import app as flask_backend
+from browser_pool import get_browser_pool
+from bulk import bulk_insert_async
+from column_mapping import merge_llm_fields
+from db_pool import PoolTimeout
+from dedup_index import DUPLICATE_BACKEND
+from duplicates import find_duplicate_candidates_async
+from extraction import chunk_records, chunk_text, extract_entries_async
+from metrics import REQUEST_SECONDS, REQUESTS_TOTAL, StageTimer
+from response_cache import COMPRESS_MIN_BYTES, NOTIFY_QUERY, choose_encoding, compress, table_versions
+from token_usage import TokenUsage
+from listing import (ListingError, wants_pagination, parse_listing_args, parse_listing_format,
+                     build_listing_query, next_cursor, count_rows_async)
+from serialization import RowSerializer
+
+ASYNC_DB_POOL_MIN = int(os.getenv("ASYNC_DB_POOL_MIN", "1"))
+ASYNC_DB_POOL_MAX = int(os.getenv("ASYNC_DB_POOL_MAX", "20"))
+
+quart_app = cors(Quart(__name__))
+
+# psycopg 3 pool, opened with the event loop of the server
+async_db_pool = AsyncConnectionPool(
+    conninfo="",
+    kwargs={
+        "host": os.getenv("DB_HOST"),
+        "dbname": os.getenv("DB_NAME"),
+        "user": os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASSWORD"),
+    },
+    min_size=ASYNC_DB_POOL_MIN,
+    max_size=ASYNC_DB_POOL_MAX,
+    timeout=float(os.getenv("DB_POOL_TIMEOUT", "5")),
+    open=False,
+)
+
+@quart_app.before_serving
+async def start_serving():
+    await async_db_pool.open()
+    flask_backend.start_background_tasks()
+
+@quart_app.after_serving
+async def stop_serving():
+    await async_db_pool.close()
+
+# The psycopg 3 pool of these handlers and the Flask pool, used by the in-memory duplicate index
+POOL_TIMEOUTS = (AsyncPoolTimeout, PoolTimeout)
+
+@quart_app.errorhandler(AsyncPoolTimeout)
+@quart_app.errorhandler(PoolTimeout)
+async def handle_pool_timeout(e):
+    return jsonify({'error': str(e)}), 503, {'Retry-After': flask_backend.DB_POOL_RETRY_AFTER}
+
+async def wants_timings():
+    """Async counterpart of app.wants_timings (?timings=true, a `timings` form field or RESPONSE_TIMINGS)."""
+    if flask_backend.RESPONSE_TIMINGS:
+        return True
+    values = await request.values
+    return values.get('timings', 'false').lower() == 'true'
+
+def endpoint_label():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+def request_timer():
+    if 'timer' not in g:
+        g.timer = StageTimer(endpoint_label())
+    return g.timer
+
+async def with_timings(response):
+    """Attaches the stage breakdown to a JSON response (dict body) and as a Server-Timing header."""
+    if 'timer' not in g or not await wants_timings():
+        return response
+    summary = g.timer.summary()
+    body = None
+    if response.is_json:
+        try:
+            body = json.loads(await response.get_data())
+        except ValueError:
+            pass
+    if isinstance(body, dict):
+        body['timings'] = summary
+        response.set_data(quart_app.json.dumps(body))
+    response.headers['Server-Timing'] = ', '.join(f'{name};dur={ms}' for name, ms in summary.items())
+    return response
+
+@quart_app.before_request
+async def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@quart_app.after_request
+async def record_request_metrics(response):
+    if 'request_started' in g:
+        endpoint = endpoint_label()
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, endpoint, request.method)
+        REQUESTS_TOTAL.inc(endpoint, request.method, str(response.status_code))
+    return await compress_response(await with_timings(response))
+
+async def compress_response(response):
+    """Async counterpart of app.compress_response, compressing in a thread to keep the event loop free."""
+    if (response.status_code != 200 or response.mimetype != 'application/json'
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return response
+    body = await response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+    response.set_data(await asyncio.to_thread(compress, body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+@quart_app.route('/annuaire', methods=['GET'])
+async def get_annuaire():
+    return await cached_listing("annuaire", fetch_table_entries)
+
+@quart_app.route('/evenements', methods=['GET'])
+async def get_evenement_entries():
+    return await cached_listing("evenement", fetch_table_entries)
+
+async def cached_listing(table_name, build):
+    """Async counterpart of app.cached_listing, sharing its cache and table versions."""
+    response_cache = flask_backend.response_cache
+    if response_cache is None or await wants_timings():
+        return await build(table_name)
+    key = ('asgi', request.path, tuple(sorted(request.args.items(multi=True))))
+    version = table_versions.get(table_name)
+    entry = response_cache.get(key, version)
+    if entry is None:
+        response = await quart_app.make_response(await build(table_name))
+        if response.status_code != 200:
+            return response
+        entry = response_cache.put(key, version, await response.get_data(), response.mimetype)
+    status, body, headers = entry.respond(request.headers.get('If-None-Match'), request.headers.get('Accept-Encoding'))
+    if status == 304:
+        response_cache.record_not_modified()
+    response = Response(body, status=status, headers=headers, mimetype=entry.content_type)
+    response.vary.add('Accept-Encoding')
+    return response
+
+async def fetch_table_entries(table_name):
+    if wants_pagination(table_name, request.args):
+        return await fetch_table_page(table_name)
+    try:
+        listing_format = parse_listing_format(request.args)
+    except ListingError as e:
+        return jsonify({'error': str(e)}), 400
+
+    timer = request_timer()
+    try:
+        async with async_db_pool.connection() as conn:
+            async with conn.cursor() as cursor:
+                with timer.stage('query'):
+                    await cursor.execute(f"SELECT * FROM {table_name};")
+                    rows = await cursor.fetchall()
+                serializer = RowSerializer(cursor.description)
+        with timer.stage('serialize'):
+            return Response(serializer.dumps(serializer.listing(rows, listing_format)), mimetype='application/json')
+    except POOL_TIMEOUTS:
+        raise
+    except Exception as e:
+        import traceback
+        print("Error occurred while fetching table entries:")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+async def fetch_table_page(table_name):
+    try:
+        options = parse_listing_args(table_name, request.args)
+        listing_format = parse_listing_format(request.args)
+    except ListingError as e:
+        return jsonify({'error': str(e)}), 400
+
+    timer = request_timer()
+    try:
+        query, params = build_listing_query(table_name, options)
+        async with async_db_pool.connection() as conn:
+            async with conn.cursor() as cursor:
+                with timer.stage('query'):
+                    await cursor.execute(query, params)
+                    rows = await cursor.fetchall()
+                serializer = RowSerializer(cursor.description)
+                with timer.stage('count'):
+                    total, is_estimate = await count_rows_async(cursor, table_name, options)
+        with timer.stage('serialize'):
+            return Response(serializer.dumps(serializer.page(
+                rows[:options['limit']], listing_format,
+                next_cursor=next_cursor(rows, serializer.columns, options),
+                total=total,
+                total_is_estimate=is_estimate
+            )), mimetype='application/json')
+    except POOL_TIMEOUTS:
+        raise
+    except Exception as e:
+        import traceback
+        print("Error occurred while fetching table page:")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@quart_app.route('/process-annuaire', methods=['POST'])
+async def process_annuaire_input():
+    return await process_input("annuaire")
+
+@quart_app.route('/process-evenement', methods=['POST'])
+async def process_evenement_input():
+    return await process_input("evenement")
+
+async def process_input(table_name):
+    form = await request.form
+    files = await request.files
+    payload = flask_backend.build_process_payload(form, files.get('file'))
+
+    default = 'true' if flask_backend.PROCESS_ASYNC else 'false'
+    if form.get('async', request.args.get('async', default)).lower() == 'true':
+        response, status_code = flask_backend.enqueue_process_job(table_name, payload)
+    else:
+        response, status_code = await run_process_pipeline(table_name, payload, request_timer())
+    return jsonify(response), status_code
+
+async def scrape_content(url, timings=None):
+    try:
+        return await get_browser_pool().scrape_async(url, flask_backend.scrape_handler(timings))
+    except Exception as e:
+        print(f"Error occurred while scraping: {e}")
+        return None
+
+async def run_process_pipeline(table_name, payload, timer):
+    """Async counterpart of app.run_process_pipeline, same responses, status codes and stages."""
+    url = payload.get('url')
+    text_input = payload.get('text') or ''
+    records = None
+    fast_path = None
+    rejected_rows = []
+    llm_merged_rows = None
+    scrape_timings = {}
+    token_usage = TokenUsage()
+
+    if url:
+        with timer.stage('scrape'):
+            text_input = await scrape_content(url, scrape_timings)
+        if not text_input:
+            timer.error('scrape')
+            return {'error': 'Failed to scrape content from the provided URL'}, 400
+    elif payload.get('file_name'):
+        # pandas parsing is CPU bound, keep it off the event loop
+        try:
+            with timer.stage('parse'):
+                text_input, records, fast_path = await asyncio.to_thread(flask_backend.parse_upload, table_name, payload)
+        except Exception as e:
+            return {'error': f"Failed to process file: {str(e)}"}, 400
+
+    if not text_input and fast_path is None:
+        return {'error': 'No input provided'}, 400
+
+    try:
+        with timer.stage('extract'):
+            if fast_path is not None:
+                entries, leftovers, rejected_rows = fast_path
+                if leftovers:
+                    # Building the program imports LlamaIndex and opens the extraction cache the first time
+                    program = await asyncio.to_thread(flask_backend.get_program, table_name)
+                    llm_entries = await extract_entries_async(program, chunk_records([record for _, record in leftovers]),
+                                                              usage=token_usage)
+                    llm_merged_rows = merge_llm_fields(entries, leftovers, llm_entries)
+            else:
+                chunks = chunk_records(records) if records else chunk_text(text_input)
+                program = await asyncio.to_thread(flask_backend.get_program, table_name)
+                entries = await extract_entries_async(program, chunks, usage=token_usage)
+    except Exception as e:
+        return {'error': f"Failed to process input: {str(e)}"}, 500
+
+    async with async_db_pool.connection() as conn:
+        try:
+            async with conn.cursor() as cursor:
+                entry_dicts = flask_backend.prepare_new_entries(entries)
+                with timer.stage('deduplicate'):
+                    if DUPLICATE_BACKEND == "memory":
+                        index = await asyncio.to_thread(flask_backend.get_duplicate_index, table_name)
+                        all_matches = index.find_duplicate_candidates(entry_dicts)
+                    else:
+                        all_matches = await find_duplicate_candidates_async(cursor, table_name, entry_dicts)
+                duplicates, successful_inserts = flask_backend.split_duplicates(entry_dicts, all_matches)
+                with timer.stage('insert'):
+                    new_numeros = await bulk_insert_async(cursor, table_name, successful_inserts)
+                for entry_dict, new_numero in zip(successful_inserts, new_numeros):
+                    entry_dict['numero'] = new_numero
+                if successful_inserts and flask_backend.response_cache is not None:
+                    await cursor.execute(NOTIFY_QUERY, (table_name,))
+        except POOL_TIMEOUTS:
+            await conn.rollback()
+            raise
+        except Exception as e:
+            await conn.rollback()
+            return {'error': f"Database error: {str(e)}"}, 500
+        with timer.stage('commit'):
+            await conn.commit()
+    if successful_inserts:
+        flask_backend.table_committed(table_name)
+    flask_backend.index_inserted(table_name, successful_inserts)
+
+    return flask_backend.build_process_response(successful_inserts, duplicates, scrape_timings,
+                                                 token_usage, rejected_rows, llm_merged_rows)
+
+# Paths answered by the async handlers above, everything else goes to Flask
+ASYNC_PATHS = {'/annuaire', '/evenements', '/process-annuaire', '/process-evenement'}
+
+flask_asgi = WsgiToAsgi(flask_backend.app)
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan' or (scope['type'] == 'http' and scope['path'] in ASYNC_PATHS):
+        await quart_app(scope, receive, send)
+    else:
+        await flask_asgi(scope, receive, send)
@@ -0,0 +1,429 @@
+"""
+Offline benchmark of the backend: seeds the annuaire table at several sizes, starts the app
+with the fake LLM backend and drives each scenario with load_test.run_load, e.g.
+
+    python benchmark.py run --sizes 1000,100000 --concurrency 20
+    python benchmark.py run --temp-postgres --sizes 1000,10000,100000,1000000
+    python benchmark.py run --server asgi --scenarios listing_page,process_text
+    python benchmark.py compare bench_results/<old>.json bench_results/<new>.json
+
+Nothing leaves the machine: extraction goes through FakeProgram (LLM_BACKEND=fake) with
+FAKE_LLM_LATENCY standing in for the API round trip, and the url scenario scrapes HTML pages
+served from a local http.server. The database is DB_* from the environment (BENCH_DB_NAME,
+created if needed, is dropped and reseeded for every size) or, with --temp-postgres, a
+throwaway cluster started with the initdb/pg_ctl binaries of a local PostgreSQL install.
+
+Results are written to bench_results/ with the git revision, so two commits can be compared.
+"""
+import argparse
+import asyncio
+import csv
+import glob
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+from dotenv import load_dotenv
+
+from extraction import CHUNK_TOKENS, count_tokens
+from load_test import run_load
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BACKEND_DIR, "..", "scripts"))
+
+import load_table  # noqa: E402
+
+RESULTS_DIR = os.path.join(BACKEND_DIR, "bench_results")
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+
+# Legacy unpaginated GET /annuaire returns the whole table, only run it up to this size
+FULL_LISTING_MAX_ROWS = 100000
+
+# Scenarios that must insert rows, checked from their responses
+PROCESS_SCENARIOS = ("process_text", "process_csv", "process_url")
+
+FIRST_NAMES = ["Anne", "Marc", "Sophie", "Luc", "Claire", "Pierre", "Julie", "Nicolas", "Elodie", "Thomas"]
+LAST_NAMES = ["Favre", "Rochat", "Mueller", "Bonvin", "Perret", "Gay", "Dubois", "Morel", "Roux", "Blanc"]
+PARTNER_TYPES = ["Institution", "Association", "Independant", "Medecin", "Pharmacie"]
+# Syllables of the names given to the rows a benchmark request inserts
+SYLLABLES = [c + v for c in "bcdfglmnprstvz" for v in "aeiou"]
+SEED_COLUMNS = ["numero", "type_de_partenaire", "nom", "prenom", "voie", "npa", "localite", "pays",
+                "telephone", "courriel", "medecin", "date_saisie", "date_derniere_modification"]
+
+
+def fresh_name(n, tag):
+    """
+    Random four syllable name. Names like the seeded `Favre123` share most of their trigrams
+    with thousands of seeded rows, so a request inserting them would only find duplicates.
+    """
+    rng = random.Random(f"{tag}:{n}")
+    return "".join(rng.choice(SYLLABLES) for _ in range(4)).capitalize()
+
+
+def synthetic_partner(n, tag=""):
+    """Deterministic annuaire row number `n`; with a `tag`, a fresh row unlike the seeded ones."""
+    rng = random.Random(n)
+    nom = f"{rng.choice(LAST_NAMES)}{n}"
+    if tag:
+        nom = fresh_name(n, tag)
+    prenom = rng.choice(FIRST_NAMES)
+    return {
+        "type_de_partenaire": rng.choice(PARTNER_TYPES),
+        "nom": nom,
+        "prenom": prenom,
+        "voie": f"Rue du Lac {n % 200 + 1}",
+        "npa": 1000 + n % 9000,
+        "localite": f"Ville{n % 500}",
+        "pays": "Suisse",
+        "telephone": f"021{n % 10000000:07d}",
+        "courriel": f"{prenom.lower()}.{nom.lower()}@example.ch",
+        "medecin": rng.random() < 0.3,
+        "date_saisie": "2024-01-15",
+        "date_derniere_modification": "2024-06-01",
+    }
+
+
+def fit_in_chunk(records, token_budget=CHUNK_TOKENS):
+    """
+    Drops records from the front until their JSON fits in one extraction chunk. A longer text
+    is cut mid-record by chunk_text and the fake LLM, which parses JSON, then reads nothing.
+    """
+    while len(records) > 1 and count_tokens(json.dumps(records, ensure_ascii=False)) > token_budget:
+        records = records[1:]
+    return records
+
+
+def write_seed_file(path, size):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=SEED_COLUMNS)
+        writer.writeheader()
+        for n in range(1, size + 1):
+            writer.writerow(dict(synthetic_partner(n), numero=n))
+
+
+def seed_table(size, workdir):
+    """Recreates the annuaire table with `size` synthetic rows through the bulk loader."""
+    path = os.path.join(workdir, f"annuaire_{size}.csv")
+    write_seed_file(path, size)
+    conn = load_table.psycopg2.connect(**load_table.connection_settings())
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS annuaire CASCADE")
+        report = load_table.load(conn, "annuaire", path)
+    finally:
+        conn.close()
+        os.remove(path)
+    return {"rows": report["inserted"], "seed_s": report["elapsed_s"]}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def find_postgres_binary(name):
+    found = shutil.which(name)
+    if found:
+        return found
+    candidates = sorted(glob.glob(f"/usr/lib/postgresql/*/bin/{name}") + glob.glob(f"/usr/local/pgsql/bin/{name}"))
+    if not candidates:
+        raise RuntimeError(f"{name} not found, install PostgreSQL or run without --temp-postgres")
+    return candidates[-1]
+
+
+class TempPostgres:
+    """Throwaway PostgreSQL cluster listening on a unix socket in a temporary directory."""
+
+    def __init__(self):
+        self.workdir = tempfile.mkdtemp(prefix="cassis-bench-pg-")
+        self.datadir = os.path.join(self.workdir, "data")
+        self.port = free_port()
+        self.pg_ctl = find_postgres_binary("pg_ctl")
+
+    def start(self):
+        subprocess.run(
+            [find_postgres_binary("initdb"), "-D", self.datadir, "-U", "bench", "--auth=trust", "-E", "UTF8"],
+            check=True, capture_output=True
+        )
+        subprocess.run(
+            [self.pg_ctl, "-D", self.datadir, "-l", os.path.join(self.workdir, "postgres.log"), "-w",
+             "-o", f"-p {self.port} -k {self.workdir} -c listen_addresses=''", "start"],
+            check=True, capture_output=True
+        )
+        return {"DB_HOST": self.workdir, "DB_PORT": str(self.port), "DB_USER": "bench", "DB_PASSWORD": ""}
+
+    def stop(self):
+        subprocess.run([self.pg_ctl, "-D", self.datadir, "-m", "fast", "stop"], capture_output=True)
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def serve_pages(directory, count, batch):
+    """Writes `count` partner pages (JSON records the fake LLM reads back) and serves them over HTTP."""
+    for i in range(count):
+        records = fit_in_chunk([synthetic_partner(i * batch + k, tag="Web") for k in range(batch)])
+        with open(os.path.join(directory, f"partner-{i}.html"), "w", encoding="utf-8") as f:
+            f.write(f"<html><body><pre>{json.dumps(records, ensure_ascii=False)}</pre></body></html>")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(kind, port, env):
+    if kind == "asgi":
+        command = [sys.executable, "-m", "uvicorn", "asgi:application", "--port", str(port), "--log-level", "warning"]
+    else:
+        command = [sys.executable, "-m", "flask", "--app", "app", "run", "--port", str(port), "--no-reload",
+                   "--no-debugger", "--with-threads"]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{kind} server exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/pool-metrics", timeout=1).status_code == 200:
+                return process, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{kind} server did not start on port {port}")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def count_inserts(inserted, name, response):
+    if response.status_code in (201, 409):
+        inserted[name] = inserted.get(name, 0) + len(response.json().get("successful_inserts", []))
+    return response
+
+
+def build_scenarios(size, batch, pages_url, page_count, inserted):
+    """
+    Scenario name -> (default request count, send coroutine function or GET path).
+    Every request of a write scenario uses fresh names so they are inserted, plus one
+    seeded row per batch so the deduplication stage has something to find. The process
+    scenarios add the rows they inserted to `inserted`.
+    """
+    def partners(i, tag):
+        records = [synthetic_partner(i * batch + k, tag=tag) for k in range(batch - 1)]
+        return records + [synthetic_partner(1 + i % size)]
+
+    async def process_text(client, i):
+        # Sent as one chunk: only as many records as fit in the token budget
+        text = json.dumps(fit_in_chunk(partners(i, "Txt")), ensure_ascii=False)
+        response = await client.post("/process-annuaire", data={"text": text, "async": "false"})
+        return count_inserts(inserted, "process_text", response)
+
+    async def process_csv(client, i):
+        lines = [",".join(SEED_COLUMNS[1:])]
+        for record in partners(i, "Csv"):
+            lines.append(",".join(str(record[c]) for c in SEED_COLUMNS[1:]))
+        content = "\n".join(lines).encode()
+        response = await client.post("/process-annuaire", data={"async": "false"},
+                                     files={"file": (f"bench-{i}.csv", content, "text/csv")})
+        return count_inserts(inserted, "process_csv", response)
+
+    async def process_url(client, i):
+        response = await client.post("/process-annuaire",
+                                     data={"url": f"{pages_url}/partner-{i % page_count}.html", "async": "false"})
+        return count_inserts(inserted, "process_url", response)
+
+    async def replace_bulk(client, i):
+        rng = random.Random(i)
+        entries = [{"numero": rng.randint(1, size), "telephone": f"022{rng.randrange(10 ** 7):07d}"}
+                   for _ in range(batch)]
+        return await client.put("/replace-annuaire", json=entries)
+
+    scenarios = {
+        "listing_page": (200, "/annuaire?limit=100"),
+        "listing_filter": (200, "/annuaire?localite=Ville7&limit=100"),
+        "process_text": (50, process_text),
+        "process_csv": (50, process_csv),
+        "replace_bulk": (50, replace_bulk),
+        "export_csv": (5, "/export/annuaire?format=csv"),
+    }
+    if size <= FULL_LISTING_MAX_ROWS:
+        scenarios["listing_full"] = (10, "/annuaire")
+    if pages_url:
+        scenarios["process_url"] = (20, process_url)
+    return scenarios
+
+
+def run_scenario(base_url, target, requests, concurrency):
+    if isinstance(target, str):
+        return asyncio.run(run_load(base_url, target, requests, concurrency, timeout=600.0))
+    return asyncio.run(run_load(base_url, None, requests, concurrency, timeout=600.0, send=target))
+
+
+def git_revision():
+    def git(*args):
+        completed = subprocess.run(["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True)
+        return completed.stdout.strip() if completed.returncode == 0 else None
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def run(args):
+    load_dotenv(os.path.join(BACKEND_DIR, ".env"))
+    temp_postgres = TempPostgres() if args.temp_postgres else None
+    if temp_postgres:
+        os.environ.update(temp_postgres.start())
+    os.environ["DB_NAME"] = args.database
+    load_table.ensure_database(args.database)
+
+    server_env = dict(
+        os.environ,
+        PGPORT=os.environ.get("DB_PORT", "5432"),  # the app pool has no port setting, libpq reads PGPORT
+        LLM_BACKEND="fake",
+        FAKE_LLM_LATENCY=str(args.llm_latency),
+        LLM_CACHE="false",
+        PROCESS_ASYNC="false",
+        DB_POOL_MAX=str(max(args.concurrency, 10)),
+        ASYNC_DB_POOL_MAX=str(max(args.concurrency, 20)),
+    )
+    selected = set(args.scenarios.split(",")) if args.scenarios else None
+
+    workdir = tempfile.mkdtemp(prefix="cassis-bench-")
+    pages_server = pages_url = None
+    if args.scrape:
+        pages_server, pages_url = serve_pages(workdir, args.pages, args.batch)
+
+    results = {
+        "revision": git_revision(),
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "settings": {"server": args.server, "concurrency": args.concurrency, "llm_latency": args.llm_latency,
+                     "batch": args.batch, "requests": args.requests},
+        "sizes": {},
+    }
+    try:
+        for size in args.sizes:
+            print(f"Seeding annuaire with {size} rows...", file=sys.stderr)
+            size_result = seed_table(size, workdir)
+            process, base_url = start_server(args.server, free_port(), server_env)
+            try:
+                inserted = {}
+                scenarios = build_scenarios(size, args.batch, pages_url, args.pages, inserted)
+                size_result["scenarios"] = {}
+                for name, (requests, target) in scenarios.items():
+                    if selected and name not in selected:
+                        continue
+                    print(f"  {name}...", file=sys.stderr)
+                    report = run_scenario(base_url, target, args.requests or requests, args.concurrency)
+                    if name in PROCESS_SCENARIOS:
+                        report["inserted"] = inserted.get(name, 0)
+                        if not report["inserted"]:
+                            raise RuntimeError(f"{name} inserted no entries (statuses {report['statuses']}), "
+                                               f"its timings would not measure the pipeline")
+                    size_result["scenarios"][name] = report
+                    print(f"  {name:>15}: {report['requests_per_s']} req/s, p50 {report['p50_ms']} ms, "
+                          f"p95 {report['p95_ms']} ms, p99 {report['p99_ms']} ms", file=sys.stderr)
+            finally:
+                stop_server(process)
+            results["sizes"][str(size)] = size_result
+    finally:
+        if pages_server:
+            pages_server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+        if temp_postgres:
+            temp_postgres.stop()
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    revision = (results["revision"]["commit"] or "unknown")[:10] + ("-dirty" if results["revision"]["dirty"] else "")
+    path = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{revision}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {path}", file=sys.stderr)
+
+    if args.compare:
+        compare(args.compare, path)
+
+
+def _change(old, new):
+    if old in (None, 0) or new is None:
+        return ""
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def compare(old_path, new_path):
+    """Prints throughput and tail latency of two result files side by side."""
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+
+    print(f"old: {old['revision']['commit']} ({old['started_at']})")
+    print(f"new: {new['revision']['commit']} ({new['started_at']})")
+    print(f"{'size':>8} {'scenario':<15} {'req/s old':>10} {'req/s new':>10} {'':>8} "
+          f"{'p95 old':>9} {'p95 new':>9} {'':>8} {'p99 old':>9} {'p99 new':>9} {'':>8}")
+    for size, new_size in new["sizes"].items():
+        old_scenarios = old["sizes"].get(size, {}).get("scenarios", {})
+        for name, report in new_size.get("scenarios", {}).items():
+            before = old_scenarios.get(name)
+            if before is None:
+                continue
+            print(f"{size:>8} {name:<15} "
+                  f"{before['requests_per_s']!s:>10} {report['requests_per_s']!s:>10} "
+                  f"{_change(before['requests_per_s'], report['requests_per_s']):>8} "
+                  f"{before['p95_ms']!s:>9} {report['p95_ms']!s:>9} {_change(before['p95_ms'], report['p95_ms']):>8} "
+                  f"{before['p99_ms']!s:>9} {report['p99_ms']!s:>9} {_change(before['p99_ms'], report['p99_ms']):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the backend endpoints.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Seed, start the app and run the scenarios")
+    run_parser.add_argument("--sizes", type=lambda v: [int(s) for s in v.split(",")], default=DEFAULT_SIZES,
+                            help="Comma separated annuaire sizes (default: 1000,10000,100000,1000000)")
+    run_parser.add_argument("--scenarios", help="Comma separated subset of the scenarios to run")
+    run_parser.add_argument("--server", choices=["flask", "asgi"], default="flask")
+    run_parser.add_argument("--concurrency", type=int, default=10)
+    run_parser.add_argument("--requests", type=int, help="Requests per scenario (default: per scenario)")
+    run_parser.add_argument("--batch", type=int, default=20, help="Entries per upload or bulk replace request")
+    run_parser.add_argument("--llm-latency", type=float, default=1.0, help="Seconds slept by the fake LLM per call")
+    run_parser.add_argument("--scrape", action="store_true", help="Also scrape local pages (needs Playwright Chromium)")
+    run_parser.add_argument("--pages", type=int, default=20, help="Local pages served for the url scenario")
+    run_parser.add_argument("--database", default=os.getenv("BENCH_DB_NAME", "cassis_ia_bench"))
+    run_parser.add_argument("--temp-postgres", action="store_true",
+                            help="Run against a throwaway cluster created with initdb (not as root)")
+    run_parser.add_argument("--output", help="Result file (default: bench_results/<date>-<commit>.json)")
+    run_parser.add_argument("--compare", help="Previous result file to compare this run with")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        compare(args.old, args.new)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import asyncio
+import atexit
+import concurrent.futures
+import os
+import threading
+
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "4"))
+BROWSER_PAGE_MAX_USES = int(os.getenv("BROWSER_PAGE_MAX_USES", "50"))
+BROWSER_SCRAPE_TIMEOUT = float(os.getenv("BROWSER_SCRAPE_TIMEOUT", "90"))
+
+
+async def read_body_text(page, url):
+    """Default page handler: load the page and return its visible text."""
+    await page.goto(url, timeout=60000)
+    await page.wait_for_load_state("domcontentloaded")
+    return await page.evaluate("() => document.body.innerText")
+
+
+class _PooledPage:
+    def __init__(self, context, page):
+        self.context = context
+        self.page = page
+        self.uses = 0
+
+
+class BrowserPool:
+    """
+    One long-lived headless Chromium shared by the Flask routes and the crawler.
+
+    Playwright objects are bound to the event loop that created them, so the browser lives on a
+    dedicated thread running its own asyncio loop; `scrape()` can be called from any thread and
+    blocks until the result is ready. At most `max_pages` pages are open at once, each page (and
+    its context) is recycled after `max_uses` scrapes, and the browser is relaunched if it crashes.
+    """
+
+    def __init__(self, max_pages=BROWSER_MAX_PAGES, max_uses=BROWSER_PAGE_MAX_USES, headless=True):
+        self.max_pages = max_pages
+        self.max_uses = max_uses
+        self.headless = headless
+
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._playwright = None
+        self._browser = None
+        self._idle = []
+        self._semaphore = None
+        self._launch_lock = None
+        self._relaunches = 0
+        self._scrapes = 0
+
+    # Event loop thread
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever, name="browser-pool", daemon=True)
+            self._thread.start()
+
+    def _submit(self, coro, timeout=None):
+        # The deadline is enforced on the pool loop so the coroutine is cancelled, and its page
+        # released, when it expires instead of running on after the caller gave up
+        self._ensure_started()
+        if timeout is not None:
+            coro = asyncio.wait_for(coro, timeout)
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def _run(self, coro, timeout=None):
+        future = self._submit(coro, timeout)
+        try:
+            # Small margin for the cancellation to complete on the loop
+            return future.result(None if timeout is None else timeout + 5)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    # Browser and pages, only touched from the pool loop
+
+    async def _get_browser(self):
+        if self._browser is not None and self._browser.is_connected():
+            return self._browser
+        async with self._launch_lock:
+            return await self._launch()
+
+    async def _launch(self):
+        if self._browser is not None and self._browser.is_connected():
+            # Another scrape relaunched it while we were waiting for the lock
+            return self._browser
+        if self._browser is not None:
+            # The previous browser crashed, its pages are gone with it
+            print("Browser disconnected, relaunching.")
+            self._relaunches += 1
+            self._idle = []
+        if self._playwright is None:
+            # Imported on first launch so processes that never scrape do not load Playwright
+            from playwright.async_api import async_playwright
+            self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(headless=self.headless)
+        return self._browser
+
+    async def _new_page(self):
+        browser = await self._get_browser()
+        context = await browser.new_context()
+        return _PooledPage(context, await context.new_page())
+
+    async def _acquire(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_pages)
+            self._launch_lock = asyncio.Lock()
+        await self._semaphore.acquire()
+        try:
+            while self._idle:
+                pooled = self._idle.pop()
+                if not pooled.page.is_closed() and self._browser is not None and self._browser.is_connected():
+                    return pooled
+                await self._discard(pooled)
+            return await self._new_page()
+        except Exception:
+            self._semaphore.release()
+            raise
+
+    async def _release(self, pooled, healthy):
+        try:
+            pooled.uses += 1
+            if healthy and pooled.uses < self.max_uses and not pooled.page.is_closed():
+                self._idle.append(pooled)
+            else:
+                await self._discard(pooled)
+        finally:
+            self._semaphore.release()
+
+    @staticmethod
+    async def _discard(pooled):
+        try:
+            await pooled.context.close()
+        except Exception:
+            pass
+
+    async def _scrape(self, url, handler):
+        pooled = await self._acquire()
+        healthy = False
+        try:
+            result = await handler(pooled.page, url)
+            healthy = True
+            return result
+        finally:
+            self._scrapes += 1
+            await self._release(pooled, healthy)
+
+    # Public API
+
+    def scrape(self, url, handler=read_body_text, timeout=BROWSER_SCRAPE_TIMEOUT):
+        """
+        Runs `handler(page, url)` (an async function) on a pooled page and returns its result.
+        :raises: Whatever the handler raised, or TimeoutError after `timeout` seconds.
+        """
+        return self._run(self._scrape(url, handler), timeout)
+
+    async def scrape_async(self, url, handler=read_body_text, timeout=BROWSER_SCRAPE_TIMEOUT):
+        """Awaitable variant of `scrape()` for callers running their own event loop."""
+        # Cancelling the awaiting task also cancels the scrape on the pool loop
+        return await asyncio.wrap_future(self._submit(self._scrape(url, handler), timeout))
+
+    def stats(self):
+        return {
+            'max_pages': self.max_pages,
+            'idle_pages': len(self._idle),
+            'scrapes_total': self._scrapes,
+            'relaunches_total': self._relaunches,
+        }
+
+    async def _shutdown(self):
+        for pooled in self._idle:
+            await self._discard(pooled)
+        self._idle = []
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception:
+                pass
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    def close(self):
+        if self._thread is None or not self._thread.is_alive():
+            return
+        try:
+            self._run(self._shutdown(), timeout=30)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool():
+    """Process-wide pool, the browser is only launched on the first scrape."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+            atexit.register(_pool.close)
+        return _pool
@@ -0,0 +1,207 @@
+import os
+import time
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from tables import TABLE_COLUMNS
+
+BULK_PAGE_SIZE = 500
+
+
+class BulkError(ValueError):
+    """Raised for malformed bulk payloads, reported to the client as a 400."""
+
+
+def check_columns(table_name, columns):
+    unknown = [c for c in columns if c not in TABLE_COLUMNS[table_name]]
+    if unknown:
+        raise BulkError(f"Unknown column(s) for {table_name}: {', '.join(unknown)}")
+
+
+def group_by_columns(rows):
+    """Groups row dicts by their column set, keeping the original position of each row."""
+    groups = {}
+    for position, row in enumerate(rows):
+        groups.setdefault(tuple(row.keys()), []).append(position)
+    return groups
+
+
+def bulk_insert(cursor, table_name, rows, page_size=BULK_PAGE_SIZE):
+    """
+    Inserts many rows with multi-row `INSERT ... VALUES (...), (...) RETURNING numero`
+    statements, one per distinct column set and per `page_size` rows.
+    :param cursor: Open psycopg2 cursor.
+    :param table_name: Target table.
+    :param rows: List of row dicts.
+    :return: List of generated `numero`, in the same order as `rows`.
+    """
+    numeros = [None] * len(rows)
+    for columns, positions in group_by_columns(rows).items():
+        check_columns(table_name, columns)
+        for start in range(0, len(positions), page_size):
+            page = positions[start:start + page_size]
+            result = execute_values(
+                cursor,
+                f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES %s RETURNING numero",
+                [tuple(rows[p][c] for c in columns) for p in page],
+                page_size=len(page),
+                fetch=True
+            )
+            for position, (numero,) in zip(page, result):
+                numeros[position] = numero
+    return numeros
+
+
+async def bulk_insert_async(cursor, table_name, rows, page_size=BULK_PAGE_SIZE):
+    """
+    Same as bulk_insert with a psycopg 3 AsyncCursor, which has no execute_values:
+    the multi-row VALUES list is spelled out with one placeholder per value.
+    """
+    numeros = [None] * len(rows)
+    for columns, positions in group_by_columns(rows).items():
+        check_columns(table_name, columns)
+        row_placeholder = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        for start in range(0, len(positions), page_size):
+            page = positions[start:start + page_size]
+            await cursor.execute(
+                f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES "
+                f"{', '.join([row_placeholder] * len(page))} RETURNING numero",
+                [rows[p][c] for p in page for c in columns]
+            )
+            for position, (numero,) in zip(page, await cursor.fetchall()):
+                numeros[position] = numero
+    return numeros
+
+
+# Column types are reloaded after this many seconds, or as soon as a known column is missing
+COLUMN_TYPES_TTL = float(os.getenv("BULK_COLUMN_TYPES_TTL", "300"))
+_column_types = {}
+
+
+def column_types(cursor, table_name, refresh=False):
+    """SQL types of the table columns, needed to cast the untyped VALUES list of a bulk UPDATE."""
+    cached = _column_types.get(table_name)
+    if refresh or cached is None or time.monotonic() - cached[0] > COLUMN_TYPES_TTL:
+        cursor.execute(
+            """
+            SELECT attname, format_type(atttypid, atttypmod)
+            FROM pg_attribute
+            WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+            """,
+            (table_name,)
+        )
+        cached = _column_types[table_name] = (time.monotonic(), dict(cursor.fetchall()))
+    return cached[1]
+
+
+def _error_message(error):
+    diag = getattr(error, "diag", None)
+    if diag is not None and diag.message_primary:
+        return diag.message_primary
+    return str(error).strip().splitlines()[0]
+
+
+def _execute_update(cursor, query, values, template):
+    """Runs one UPDATE ... FROM (VALUES ...) and returns the set of updated numeros."""
+    updated = execute_values(cursor, query, values, template=template, page_size=len(values), fetch=True)
+    return {numero for (numero,) in updated}
+
+
+def _update_page(cursor, query, values, template):
+    """
+    Runs the UPDATE of one page inside a savepoint. When a value of the page is rejected
+    (bad cast, value too long, constraint), the page is rolled back and retried row by row
+    so only the offending rows fail.
+    :return: Tuple (set of updated numeros, {position in page: error message}).
+    """
+    cursor.execute("SAVEPOINT bulk_update_page")
+    try:
+        updated = _execute_update(cursor, query, values, template)
+        cursor.execute("RELEASE SAVEPOINT bulk_update_page")
+        return updated, {}
+    except psycopg2.Error:
+        cursor.execute("ROLLBACK TO SAVEPOINT bulk_update_page")
+
+    updated, errors = set(), {}
+    for position, row_values in enumerate(values):
+        cursor.execute("SAVEPOINT bulk_update_row")
+        try:
+            updated |= _execute_update(cursor, query, [row_values], template)
+            cursor.execute("RELEASE SAVEPOINT bulk_update_row")
+        except psycopg2.Error as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT bulk_update_row")
+            errors[position] = _error_message(e)
+    cursor.execute("RELEASE SAVEPOINT bulk_update_page")
+    return updated, errors
+
+
+def bulk_update(cursor, table_name, rows, page_size=BULK_PAGE_SIZE):
+    """
+    Updates many rows by `numero` with one `UPDATE ... FROM (VALUES ...)` statement per
+    distinct column set and per `page_size` rows. `date_derniere_modification` is always
+    set to the current date. Invalid rows are reported instead of aborting the batch:
+    malformed rows and repeated numeros before the update, rows whose values the database
+    rejects (status `invalid`) after it.
+    :param cursor: Open psycopg2 cursor.
+    :param table_name: Target table.
+    :param rows: List of row dicts, each carrying its `numero`.
+    :return: One {'index', 'numero', 'status'[, 'error']} dict per input row.
+    """
+    results = [{'index': i, 'numero': row.get('numero') if isinstance(row, dict) else None}
+               for i, row in enumerate(rows)]
+
+    types = column_types(cursor, table_name)
+    valid = {}
+    seen = {}
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict) or row.get('numero') in (None, ""):
+            results[i].update(status='error', error="Missing 'numero' field for replacement")
+            continue
+        try:
+            numero = int(row['numero'])
+        except (TypeError, ValueError):
+            results[i].update(status='error', error="'numero' must be an integer")
+            continue
+        if numero in seen:
+            results[i].update(status='error', error=f"Duplicate numero {numero}, already given at index {seen[numero]}")
+            continue
+        values = {k: v for k, v in row.items() if k not in ('numero', 'date_derniere_modification')}
+        if any(k in TABLE_COLUMNS[table_name] and k not in types for k in values):
+            # Column added since the types were loaded
+            types = column_types(cursor, table_name, refresh=True)
+        unknown = [k for k in values if k not in TABLE_COLUMNS[table_name] or k not in types]
+        if unknown:
+            results[i].update(status='error', error=f"Unknown column(s): {', '.join(unknown)}")
+            continue
+        seen[numero] = i
+        valid[i] = values
+
+    groups = {}
+    for i, values in valid.items():
+        groups.setdefault(tuple(values.keys()), []).append(i)
+
+    for columns, positions in groups.items():
+        assignments = [f"{c} = v.{c}" for c in columns] + ["date_derniere_modification = CURRENT_DATE"]
+        template = "(" + ", ".join(f"%s::{types[c]}" for c in ("numero",) + columns) + ")"
+        query = f"""
+            UPDATE {table_name} AS t
+            SET {', '.join(assignments)}
+            FROM (VALUES %s) AS v(numero{''.join(', ' + c for c in columns)})
+            WHERE t.numero = v.numero
+            RETURNING t.numero
+        """
+        for start in range(0, len(positions), page_size):
+            page = positions[start:start + page_size]
+            updated, errors = _update_page(
+                cursor, query, [(rows[i]['numero'],) + tuple(valid[i][c] for c in columns) for i in page], template
+            )
+            for position, i in enumerate(page):
+                if position in errors:
+                    results[i].update(status='invalid', error=errors[position])
+                elif int(rows[i]['numero']) in updated:
+                    results[i]['status'] = 'updated'
+                else:
+                    results[i].update(status='not_found', error=f"No {table_name} entry with numero {rows[i]['numero']}")
+
+    return results
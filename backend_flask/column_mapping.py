@@ -0,0 +1,181 @@
+import difflib
+import json
+import os
+import re
+import unicodedata
+
+from pydantic import ValidationError
+
+from tables import (TABLE_COLUMNS, HEADER_MAPPINGS, BOOLEAN_COLUMNS, INTEGER_COLUMNS,
+                    FLOAT_COLUMNS, DATE_COLUMNS)
+
+FUZZY_CUTOFF = float(os.getenv("HEADER_FUZZY_CUTOFF", "0.85"))
+
+# Fields that must be present in the upload for the fast path to be usable
+REQUIRED_COLUMNS = {
+    "annuaire": ["nom"],
+    "evenement": ["nom_evenement"],
+}
+
+BOOLEAN_VALUES = {
+    "oui": True, "non": False, "o": True, "n": False,
+    "yes": True, "no": False, "true": True, "false": False, "1": True, "0": False,
+}
+
+# Tried in turn, the spreadsheets use Swiss day-first dates
+DATE_FORMATS = ["ISO8601", "%d.%m.%Y", "%d/%m/%Y"]
+
+
+def normalize_header(header):
+    """Lowercases, strips accents and punctuation: "N° de téléphone" -> "n de telephone"."""
+    text = unicodedata.normalize("NFKD", str(header)).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()
+
+
+def _known_headers(table_name):
+    known = {normalize_header(h): c for h, c in HEADER_MAPPINGS[table_name].items()}
+    # Uploads that already use the database column names are accepted as well
+    known.update({normalize_header(c): c for c in TABLE_COLUMNS[table_name]})
+    return known
+
+
+def map_headers(table_name, headers):
+    """
+    Matches spreadsheet headers to table columns, exactly after normalization or fuzzily.
+    :return: Tuple (mapping {header: column}, list of unmapped headers).
+    """
+    known = _known_headers(table_name)
+    mapping, unmapped = {}, []
+    for header in headers:
+        if str(header).startswith("Unnamed:"):
+            # Index column written by pandas, not data
+            continue
+        key = normalize_header(header)
+        column = known.get(key)
+        if column is None:
+            close = difflib.get_close_matches(key, known.keys(), n=1, cutoff=FUZZY_CUTOFF)
+            column = known[close[0]] if close else None
+        if column is None or column in mapping.values():
+            unmapped.append(header)
+        else:
+            mapping[header] = column
+    return mapping, unmapped
+
+
+def parse_dates(values):
+    """Parses a column of dates with DATE_FORMATS, then day-first for the remaining ones. Unparsable values become NaT."""
+    import pandas as pd
+
+    text = values.astype("string").str.strip()
+    text = text.mask(text == "")
+    parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    for date_format in DATE_FORMATS:
+        pending = parsed.isna() & text.notna()
+        if not pending.any():
+            return parsed
+        parsed[pending] = pd.to_datetime(text[pending], format=date_format, errors="coerce")
+    pending = parsed.isna() & text.notna()
+    if pending.any():
+        # Two digit years and other variants, still read day-first
+        parsed[pending] = pd.to_datetime(text[pending], format="mixed", dayfirst=True, errors="coerce")
+    return parsed
+
+
+def convert_frame(table_name, df):
+    """
+    Vectorized conversion of a renamed DataFrame to records typed like the entry models.
+    :return: Tuple (records, invalid) where `invalid` holds, for each record, the {column: original value}
+             of the values that could not be converted to the column type.
+    """
+    import pandas as pd
+
+    original = df
+    df = df.copy()
+    for column in BOOLEAN_COLUMNS[table_name]:
+        if column in df.columns:
+            df[column] = df[column].astype("string").str.strip().str.lower().map(BOOLEAN_VALUES)
+    for column in INTEGER_COLUMNS[table_name]:
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], errors="coerce").round().astype("Int64")
+    for column in FLOAT_COLUMNS[table_name]:
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], errors="coerce")
+    for column in DATE_COLUMNS[table_name]:
+        if column in df.columns:
+            df[column] = parse_dates(df[column]).dt.strftime("%Y-%m-%d")
+
+    typed = set(BOOLEAN_COLUMNS[table_name] + INTEGER_COLUMNS[table_name] + FLOAT_COLUMNS[table_name])
+    for column in df.columns:
+        if column not in typed and column not in DATE_COLUMNS[table_name]:
+            values = df[column]
+            # Phone numbers and the like are parsed as floats when the column has blanks
+            if pd.api.types.is_float_dtype(values) and (values.dropna() % 1 == 0).all():
+                values = values.astype("Int64")
+            df[column] = values.astype(object).where(values.isna(), values.astype(str).str.strip())
+
+    invalid = [{} for _ in range(len(df))]
+    for column in typed.union(DATE_COLUMNS[table_name]).intersection(df.columns):
+        text = original[column].astype("string").str.strip()
+        failed = (text.notna() & (text != "") & df[column].isna()).to_numpy(dtype=bool)
+        for position in failed.nonzero()[0]:
+            invalid[position][column] = str(original[column].iloc[position]).strip()
+
+    # JSON round trip turns numpy/pandas scalars and missing values into plain Python values
+    return json.loads(df.to_json(orient="records", date_format="iso")), invalid
+
+
+def frame_to_entries(table_name, df, entry_cls):
+    """
+    Parses a well-formed CSV/XLSX upload directly into entry models, without the LLM.
+    :return: Tuple (entries, leftover records for unmapped columns, rejected rows as {"line", "error"})
+             or None when the headers do not match the table closely enough for the fast path.
+    """
+    mapping, unmapped = map_headers(table_name, df.columns)
+    if not all(column in mapping.values() for column in REQUIRED_COLUMNS[table_name]):
+        return None
+
+    records, invalid_values = convert_frame(table_name, df[list(mapping)].rename(columns=mapping))
+    fields = list(entry_cls.model_fields)
+    required = [f for f, info in entry_cls.model_fields.items() if info.annotation is str]
+
+    entries, leftovers, rejected = [], [], []
+    extra = json.loads(df[unmapped].to_json(orient="records", date_format="iso")) if unmapped else None
+    for position, (record, invalid) in enumerate(zip(records, invalid_values)):
+        line = position + 2  # line 1 is the header
+        if invalid:
+            error = "invalid value for " + ", ".join(f"{c} ({v!r})" for c, v in sorted(invalid.items()))
+            rejected.append({"line": line, "error": error})
+            continue
+        values = {f: record.get(f) for f in fields}
+        for f in required:
+            if values[f] is None:
+                values[f] = ""
+        try:
+            entry = entry_cls(**values)
+        except ValidationError as e:
+            rejected.append({"line": line, "error": "; ".join(
+                f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())})
+            continue
+        entries.append(entry)
+        if extra is not None:
+            unmapped_values = {k: v for k, v in extra[position].items() if v is not None}
+            if unmapped_values:
+                leftovers.append((len(entries) - 1, dict(entry.model_dump(exclude_none=True), **unmapped_values)))
+    return entries, leftovers, rejected
+
+
+def merge_llm_fields(entries, leftovers, llm_entries):
+    """
+    Fills, in place, the fields the fast path left empty with the LLM reading of the unmapped
+    columns. Only applied when the LLM returned exactly one entry per leftover row, so rows stay aligned.
+    :return: Number of rows merged, 0 when the LLM output could not be aligned.
+    """
+    if len(llm_entries) != len(leftovers):
+        return 0
+    for (position, _), llm_entry in zip(leftovers, llm_entries):
+        current = entries[position].model_dump()
+        for field, value in llm_entry.model_dump().items():
+            if current.get(field) in (None, "") and value not in (None, ""):
+                current[field] = value
+        entries[position] = type(entries[position])(**current)
+    return len(leftovers)
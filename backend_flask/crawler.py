@@ -1,31 +1,59 @@
 import requests
-from playwright.sync_api import sync_playwright
+from browser_pool import get_browser_pool
+from scraping import SCRAPE_MODE, fast_scrape
 from dotenv import load_dotenv
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urldefrag, urlparse, urlunparse
+from urllib.robotparser import RobotFileParser
+import xml.etree.ElementTree as ET
+import argparse
+import asyncio
+import hashlib
+import json
 import os
+import re
+import sqlite3
+import time
 
 # Load environment variables
 load_dotenv()
 
+USER_AGENT = os.getenv("CRAWLER_USER_AGENT", "CassisIA-Crawler/1.0")
+# Below this many characters of static text the page is assumed to be rendered by JavaScript
+MIN_STATIC_TEXT = 200
+# Pages whose simhash differs by at most this many bits are treated as near-identical
+SIMHASH_DISTANCE = 3
+# Polling of the job when the server queued the text anyway (202)
+JOB_POLL_INTERVAL = 1.0
+JOB_POLL_TIMEOUT = 600
+SKIPPED_EXTENSIONS = (".pdf", ".jpg", ".jpeg", ".png", ".gif", ".svg", ".zip", ".doc", ".docx",
+                      ".xls", ".xlsx", ".mp3", ".mp4", ".css", ".js")
+
+async def read_page_text(page, url):
+    if SCRAPE_MODE == "fast":
+        return await fast_scrape(page, url)
+
+    # Visit the page and wait for network activity to settle
+    await page.goto(url, timeout=60000)
+    await page.wait_for_load_state("networkidle")
+
+    # Extract all the text content from the page
+    return await page.evaluate("() => document.body.innerText")
+
+async def read_page_text_and_links(page, url):
+    text = await read_page_text(page, url)
+    links = await page.evaluate("() => Array.from(document.querySelectorAll('a[href]'), a => a.href)")
+    return text, links
+
 def scrape_content(url):
     """
     Scrapes the content (text only) of a page, including dynamic JavaScript-rendered content.
+    Uses the same long-lived browser pool as the Flask app.
     :param url: URL of the page to scrape.
     :return: Extracted text content of the page.
     """
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-
-            # Visit the page and wait for network activity to settle
-            page.goto(url, timeout=60000)
-            page.wait_for_load_state("networkidle")
-
-            # Extract all the text content from the page
-            content = page.evaluate("() => document.body.innerText")
-
-            browser.close()
-            return content
+        return get_browser_pool().scrape(url, read_page_text)
     except Exception as e:
         print(f"Error occurred while scraping: {e}")
         return None
@@ -35,29 +63,466 @@ def send_to_process_input(text_content, api_endpoint):
     Sends the extracted text content to the process_input endpoint.
     :param text_content: The text extracted from the page.
     :param api_endpoint: URL of the Flask API endpoint to process the input.
+    :return: True if the server processed the text (created entries or reported duplicates).
     """
     try:
-        response = requests.post(api_endpoint, data={"text": text_content})
+        # Processed in the request even when the server queues by default (PROCESS_ASYNC=true)
+        response = requests.post(api_endpoint, data={"text": text_content, "async": "false"})
+        if response.status_code == 202:
+            response = wait_for_job(api_endpoint, response.json())
         if response.status_code == 201:
             print("Success:", response.json())
+            return True
         elif response.status_code == 409:
             print("Duplicates detected:", response.json())
+            return True
         else:
             print("Error response:", response.json())
     except Exception as e:
         print(f"Error occurred while sending data to the server: {e}")
+    return False
+
+class _JobResult:
+    """Final status code and body of a queued job, shaped like a `requests` response."""
+
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        return self.body
+
+def wait_for_job(api_endpoint, job):
+    """Polls the status URL of a queued job until it is done or failed."""
+    status_url = urljoin(api_endpoint, job["status_url"])
+    deadline = time.monotonic() + JOB_POLL_TIMEOUT
+    while time.monotonic() < deadline:
+        state = requests.get(status_url, timeout=20).json()
+        if state["status"] in ("done", "failed"):
+            return _JobResult(state["status_code"], state["result"])
+        time.sleep(JOB_POLL_INTERVAL)
+    return _JobResult(504, {"error": f"Job {job['job_id']} did not finish in {JOB_POLL_TIMEOUT} s"})
+
+class _TextAndLinksParser(HTMLParser):
+    """Extracts visible text and link targets from static HTML."""
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self.links = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style", "noscript", "template"):
+            self._skip += 1
+        elif tag == "a":
+            href = dict(attrs).get("href")
+            if href:
+                self.links.append(href)
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style", "noscript", "template") and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip and data.strip():
+            self.parts.append(data.strip())
+
+def parse_html(html):
+    parser = _TextAndLinksParser()
+    parser.feed(html)
+    return "\n".join(parser.parts), parser.links
+
+def normalize_url(url):
+    """Canonical form used for deduplication: no fragment, lowercase scheme/host, no trailing slash."""
+    url, _ = urldefrag(url.strip())
+    parts = urlparse(url)
+    path = parts.path.rstrip("/") or "/"
+    return urlunparse((parts.scheme.lower(), parts.netloc.lower(), path, "", parts.query, ""))
+
+def simhash(text, bits=64):
+    """Similarity-preserving fingerprint of the 3-word shingles of `text`."""
+    words = re.findall(r"\w+", text.lower())
+    shingles = [" ".join(words[i:i + 3]) for i in range(max(len(words) - 2, 1))]
+    weights = [0] * bits
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.md5(shingle.encode()).digest()[:8], "big")
+        for bit in range(bits):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(bits) if weights[bit] > 0)
+
+def fetch_sitemap(url, depth=0):
+    """Returns the page URLs listed in a sitemap, following one level of sitemap index."""
+    response = requests.get(url, timeout=20, headers={"User-Agent": USER_AGENT})
+    response.raise_for_status()
+    root = ET.fromstring(response.content)
+    namespace = {"sm": "http://www.sitemaps.org/schemas/sitemap/0.9"}
+    if root.tag.endswith("sitemapindex") and depth == 0:
+        urls = []
+        for loc in root.findall("sm:sitemap/sm:loc", namespace):
+            urls.extend(fetch_sitemap(loc.text.strip(), depth + 1))
+        return urls
+    return [loc.text.strip() for loc in root.findall("sm:url/sm:loc", namespace)]
+
+def content_hash(text):
+    return hashlib.sha256(re.sub(r"\s+", " ", text).strip().encode()).hexdigest()
+
+class PageStore:
+    """
+    Per-URL state kept between crawls: HTTP validators (ETag, Last-Modified), the hash of
+    the page text last sent to the API and the links found on the page.
+    """
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                links TEXT,
+                last_crawled REAL,
+                last_changed REAL
+            )
+            """
+        )
+
+    def get(self, url):
+        row = self._db.execute(
+            "SELECT etag, last_modified, content_hash, links FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"etag": row[0], "last_modified": row[1], "content_hash": row[2], "links": json.loads(row[3] or "[]")}
+
+    def record(self, url, etag=None, last_modified=None, content_hash=None, links=None, changed=False):
+        now = time.time()
+        self._db.execute(
+            """
+            INSERT INTO pages (url, etag, last_modified, content_hash, links, last_crawled, last_changed)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (url) DO UPDATE SET
+                etag = excluded.etag,
+                last_modified = excluded.last_modified,
+                content_hash = coalesce(excluded.content_hash, pages.content_hash),
+                links = excluded.links,
+                last_crawled = excluded.last_crawled,
+                last_changed = CASE WHEN ? THEN excluded.last_changed ELSE pages.last_changed END
+            """,
+            (url, etag, last_modified, content_hash, json.dumps(links or []), now, now, changed)
+        )
+
+    def touch(self, url):
+        self._db.execute("UPDATE pages SET last_crawled = ? WHERE url = ?", (time.time(), url))
+
+class Crawler:
+    """
+    Breadth-first crawler over a set of seed URLs.
+
+    Follows links within the seed domains up to `max_depth`, skips URLs and near-identical
+    pages it has already seen, fetches with plain HTTP and falls back to the shared headless
+    browser when a page looks JavaScript-rendered (render="auto"). Requests to one host are
+    limited to `per_host` at a time and spaced by `delay` seconds, and robots.txt is honoured.
+    The frontier is checkpointed to `state_path` so an interrupted crawl resumes where it stopped.
+    With a `page_store`, pages are requested conditionally and only sent to the API when their
+    text changed since the last crawl.
+    """
+
+    def __init__(self, api_endpoint=None, max_depth=2, max_pages=500, concurrency=8, per_host=2,
+                 delay=0.5, render="auto", state_path=None, checkpoint_every=10, page_store=None):
+        self.api_endpoint = api_endpoint
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.delay = delay
+        self.render = render
+        self.state_path = state_path
+        self.checkpoint_every = checkpoint_every
+        self.page_store = page_store
+        self.report = {}
+
+        self.frontier = []
+        self.in_flight = {}
+        self.seen = set()
+        self.fingerprints = []
+        self.allowed_hosts = set()
+        self.stats = {"fetched": 0, "sent": 0, "near_duplicates": 0, "errors": 0, "robots_blocked": 0, "rendered": 0,
+                      "new": 0, "changed": 0, "unchanged": 0, "not_modified": 0}
+
+        self._host_slots = {}
+        self._host_last_request = {}
+        self._robots = {}
+        self._wakeup = None
+        self._completed = 0
+
+    # Frontier and checkpoints
+
+    def add_url(self, url, depth):
+        url = normalize_url(url)
+        parts = urlparse(url)
+        if parts.scheme not in ("http", "https") or parts.path.lower().endswith(SKIPPED_EXTENSIONS):
+            return
+        if parts.hostname not in self.allowed_hosts or url in self.seen:
+            return
+        if len(self.seen) >= self.max_pages:
+            return
+        self.seen.add(url)
+        self.frontier.append((url, depth))
+
+    def load_checkpoint(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return False
+        with open(self.state_path, encoding="utf-8") as f:
+            state = json.load(f)
+        self.frontier = [tuple(item) for item in state["frontier"]]
+        self.seen = set(state["seen"])
+        self.fingerprints = state["fingerprints"]
+        self.allowed_hosts = set(state["allowed_hosts"])
+        self.stats.update(state["stats"])
+        print(f"Resuming crawl: {len(self.frontier)} URL(s) left in the frontier.")
+        return True
+
+    def save_checkpoint(self):
+        if not self.state_path:
+            return
+        state = {
+            # Pages being fetched are saved as pending so a crash fetches them again
+            "frontier": list(self.in_flight.values()) + self.frontier,
+            "seen": sorted(self.seen),
+            "fingerprints": self.fingerprints,
+            "allowed_hosts": sorted(self.allowed_hosts),
+            "stats": self.stats,
+        }
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    # Politeness
+
+    @staticmethod
+    async def _read_robots(origin):
+        robots = RobotFileParser(f"{origin}/robots.txt")
+        try:
+            await asyncio.to_thread(robots.read)
+        except Exception:
+            return None
+        return robots
+
+    async def allowed_by_robots(self, url):
+        parts = urlparse(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        # One task per origin, awaited by every page of that origin fetched in the meantime
+        if origin not in self._robots:
+            self._robots[origin] = asyncio.ensure_future(self._read_robots(origin))
+        robots = await self._robots[origin]
+        return robots is None or robots.can_fetch(USER_AGENT, url)
+
+    async def _wait_for_turn(self, host):
+        elapsed = time.monotonic() - self._host_last_request.get(host, 0)
+        if elapsed < self.delay:
+            await asyncio.sleep(self.delay - elapsed)
+        self._host_last_request[host] = time.monotonic()
+
+    # Fetching
+
+    async def fetch(self, url, previous=None):
+        """
+        Fetches `url`, rendering with the browser only when needed. When `previous` validators
+        are known the request is conditional and a 304 is reported as `not_modified`.
+        :return: Dict with text, links, etag, last_modified and not_modified.
+        """
+        result = {"text": "", "links": [], "etag": None, "last_modified": None, "not_modified": False}
+        if self.render != "always":
+            headers = {"User-Agent": USER_AGENT}
+            if previous and previous["etag"]:
+                headers["If-None-Match"] = previous["etag"]
+            if previous and previous["last_modified"]:
+                headers["If-Modified-Since"] = previous["last_modified"]
+            response = await asyncio.to_thread(requests.get, url, timeout=20, headers=headers)
+            if response.status_code == 304:
+                return dict(result, links=previous["links"], etag=previous["etag"],
+                            last_modified=previous["last_modified"], not_modified=True)
+            response.raise_for_status()
+            result.update(etag=response.headers.get("ETag"), last_modified=response.headers.get("Last-Modified"))
+            if "html" not in response.headers.get("Content-Type", "html"):
+                return result
+            text, links = parse_html(response.text)
+            if self.render == "never" or len(text) >= MIN_STATIC_TEXT:
+                return dict(result, text=text, links=[urljoin(response.url, link) for link in links])
+
+        self.stats["rendered"] += 1
+        text, links = await get_browser_pool().scrape_async(url, read_page_text_and_links)
+        return dict(result, text=text, links=links)
+
+    def is_near_duplicate(self, text):
+        fingerprint = simhash(text)
+        if any(bin(fingerprint ^ other).count("1") <= SIMHASH_DISTANCE for other in self.fingerprints):
+            return True
+        self.fingerprints.append(fingerprint)
+        return False
+
+    async def process_page(self, text, url):
+        """Hands the page text to the extraction endpoint, returns True once it was processed."""
+        if not self.api_endpoint:
+            return False
+        sent = await asyncio.to_thread(send_to_process_input, text, self.api_endpoint)
+        if sent:
+            self.stats["sent"] += 1
+        return sent
+
+    def _mark(self, url, status):
+        self.stats[status] += 1
+        self.report[url] = status
+
+    async def crawl_one(self, url, depth):
+        host = urlparse(url).hostname
+        if not await self.allowed_by_robots(url):
+            self.stats["robots_blocked"] += 1
+            return
+
+        previous = self.page_store.get(url) if self.page_store else None
+        slots = self._host_slots.setdefault(host, asyncio.Semaphore(self.per_host))
+        async with slots:
+            await self._wait_for_turn(host)
+            # Only pages whose text already reached the API may be skipped with a 304
+            result = await self.fetch(url, previous if previous and previous["content_hash"] else None)
+        self.stats["fetched"] += 1
+
+        if depth < self.max_depth:
+            for link in result["links"]:
+                self.add_url(link, depth + 1)
+
+        if result["not_modified"]:
+            self._mark(url, "not_modified")
+            self.page_store.touch(url)
+            return
+
+        text = result["text"]
+        if not text or not text.strip():
+            return
+        digest = content_hash(text)
+        validators = {"etag": result["etag"], "last_modified": result["last_modified"], "links": result["links"]}
+        if previous and previous["content_hash"] == digest:
+            # Same text as last time: skip the LLM extraction entirely
+            self._mark(url, "unchanged")
+            self.page_store.record(url, content_hash=digest, **validators)
+            return
+
+        self._mark(url, "changed" if previous and previous["content_hash"] else "new")
+        if self.is_near_duplicate(text):
+            self.stats["near_duplicates"] += 1
+            processed = self.api_endpoint is not None
+        else:
+            processed = await self.process_page(text, url)
+
+        if self.page_store:
+            # The hash is only stored once the text reached the API, so failures are retried next crawl
+            self.page_store.record(url, content_hash=digest if processed else None, changed=processed, **validators)
+
+    async def _worker(self):
+        while True:
+            if not self.frontier:
+                if not self.in_flight:
+                    self._wakeup.set()
+                    return
+                # Wait for an in-flight page to add links or finish
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            url, depth = self.frontier.pop(0)
+            task_id = object()
+            self.in_flight[task_id] = (url, depth)
+            try:
+                await self.crawl_one(url, depth)
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"Error while crawling {url}: {e}")
+            finally:
+                del self.in_flight[task_id]
+                self._wakeup.set()
+
+            self._completed += 1
+            if self._completed % self.checkpoint_every == 0:
+                self.save_checkpoint()
+
+    async def run(self, seeds):
+        if not self.load_checkpoint():
+            self.allowed_hosts = {urlparse(normalize_url(seed)).hostname for seed in seeds}
+            for seed in seeds:
+                self.add_url(seed, 0)
+
+        self._wakeup = asyncio.Event()
+        await asyncio.gather(*(self._worker() for _ in range(self.concurrency)))
+
+        self.save_checkpoint()
+        return self.stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl partner websites and send their content to the extraction API.")
+    parser.add_argument("urls", nargs="*", help="Seed URLs")
+    parser.add_argument("--seed-file", help="File with one seed URL per line")
+    parser.add_argument("--sitemap", help="Sitemap URL whose pages are used as seeds")
+    parser.add_argument("--max-depth", type=int, default=2, help="Link depth to follow from the seeds")
+    parser.add_argument("--max-pages", type=int, default=500, help="Maximum number of URLs to crawl")
+    parser.add_argument("--concurrency", type=int, default=8, help="Pages fetched in parallel")
+    parser.add_argument("--per-host", type=int, default=2, help="Pages fetched in parallel on one host")
+    parser.add_argument("--delay", type=float, default=0.5, help="Seconds between two requests to one host")
+    parser.add_argument("--render", choices=["auto", "always", "never"], default="auto",
+                        help="When to render pages with the headless browser")
+    parser.add_argument("--state", help="Checkpoint file, resumed if it exists")
+    parser.add_argument("--dry-run", action="store_true", help="Crawl without sending pages to the API")
+    parser.add_argument("--page-store", default=os.getenv("CRAWLER_PAGE_STORE", ".crawl_pages.sqlite3"),
+                        help="SQLite file with validators and content hashes from previous crawls ('' to disable)")
+    parser.add_argument("--report", help="Write the per-URL new/changed/unchanged report to this JSON file")
+    args = parser.parse_args()
 
-if __name__ == "__main__":
-    # Input the URL to scrape and the Flask endpoint
-    url_to_scrape = input("Enter the URL to scrape: ")
     api_endpoint = os.getenv("PROCESS_INPUT_ENDPOINT", "http://127.0.0.1:5000/process-annuaire")
 
-    print("Scraping the page...")
-    scraped_text = scrape_content(url_to_scrape)
+    seeds = list(args.urls)
+    if args.seed_file:
+        with open(args.seed_file, encoding="utf-8") as f:
+            seeds.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    if args.sitemap:
+        seeds.extend(fetch_sitemap(args.sitemap))
+
+    if not seeds and not (args.state and os.path.exists(args.state)):
+        # Single page mode, as before
+        url_to_scrape = input("Enter the URL to scrape: ")
+
+        print("Scraping the page...")
+        scraped_text = scrape_content(url_to_scrape)
 
-    if scraped_text:
-        print("Text content extracted successfully.")
-        print("Sending to process_input endpoint...")
-        send_to_process_input(scraped_text, api_endpoint)
-    else:
-        print("Failed to extract content from the page.")
+        if scraped_text:
+            print("Text content extracted successfully.")
+            print("Sending to process_input endpoint...")
+            send_to_process_input(scraped_text, api_endpoint)
+        else:
+            print("Failed to extract content from the page.")
+        return
+
+    crawler = Crawler(
+        api_endpoint=None if args.dry_run else api_endpoint,
+        max_depth=args.max_depth,
+        max_pages=args.max_pages,
+        concurrency=args.concurrency,
+        per_host=args.per_host,
+        delay=args.delay,
+        render=args.render,
+        state_path=args.state,
+        page_store=PageStore(args.page_store) if args.page_store else None
+    )
+    stats = asyncio.run(crawler.run(seeds))
+    print("Crawl finished:", json.dumps(stats))
+    print(f"Pages new: {stats['new']}, changed: {stats['changed']}, "
+          f"skipped as unchanged: {stats['unchanged'] + stats['not_modified']}")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"summary": stats, "pages": crawler.report}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
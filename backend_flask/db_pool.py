@@ -0,0 +1,191 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be acquired before the timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections shared by every Flask route.
+    Connections are opened lazily up to `maxconn`, checked for health when they
+    are handed out and kept open between requests.
+    """
+
+    def __init__(self, minconn=1, maxconn=10, acquire_timeout=5.0, health_check=True, **connect_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Invalid pool size: expected 0 <= minconn <= maxconn and maxconn >= 1.")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.acquire_timeout = acquire_timeout
+        self.health_check = health_check
+        self.connect_kwargs = connect_kwargs
+
+        self._lock = threading.Condition()
+        self._idle = []
+        self._in_use = set()
+        self._opening = 0
+        self._waiting = 0
+        self._closed = False
+        self._warmed = False
+
+        # Metrics
+        self._acquired = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._acquire_time_total = 0.0
+        self._acquire_time_max = 0.0
+
+    def _connect(self):
+        return psycopg2.connect(**self.connect_kwargs)
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        if not self.health_check:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        self._discarded += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _warm(self):
+        """Open `minconn` connections on first use so import stays cheap."""
+        with self._lock:
+            if self._warmed:
+                return
+            self._warmed = True
+            missing = self.minconn - len(self._idle) - len(self._in_use)
+        for _ in range(max(missing, 0)):
+            try:
+                conn = self._connect()
+            except psycopg2.Error as e:
+                print(f"Error while warming the connection pool: {e}")
+                return
+            with self._lock:
+                self._idle.append(conn)
+                self._lock.notify()
+
+    def getconn(self, timeout=None):
+        """Check out a connection, waiting up to `timeout` seconds for a free slot."""
+        if not self._warmed:
+            self._warm()
+        timeout = self.acquire_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        while True:
+            conn = None
+            with self._lock:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("Connection pool is closed.")
+                    if self._idle:
+                        conn = self._idle.pop()
+                        break
+                    if len(self._in_use) + self._opening < self.maxconn:
+                        self._opening += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(f"Timed out after {timeout}s waiting for a database connection.")
+                    self._waiting += 1
+                    try:
+                        self._lock.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+            if conn is None:
+                # A slot was reserved above, open the connection outside the lock
+                try:
+                    conn = self._connect()
+                finally:
+                    with self._lock:
+                        self._opening -= 1
+                        if conn is None:
+                            self._lock.notify()
+            elif not self._is_healthy(conn):
+                with self._lock:
+                    self._discard(conn)
+                    self._lock.notify()
+                continue
+
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self._in_use.add(conn)
+                self._acquired += 1
+                self._acquire_time_total += elapsed
+                self._acquire_time_max = max(self._acquire_time_max, elapsed)
+            return conn
+
+    def putconn(self, conn):
+        """Return a connection to the pool, rolling back any unfinished transaction."""
+        try:
+            if not conn.closed and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            pass
+
+        with self._lock:
+            self._in_use.discard(conn)
+            if self._closed or conn.closed:
+                self._discard(conn)
+            else:
+                self._idle.append(conn)
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def close(self, drain_timeout=10.0):
+        """Stop handing out connections, wait for in-use ones to come back, then close everything."""
+        deadline = time.monotonic() + drain_timeout
+        with self._lock:
+            self._closed = True
+            self._lock.notify_all()
+            while self._in_use:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    print(f"Closing connection pool with {len(self._in_use)} connection(s) still in use.")
+                    break
+                self._lock.wait(remaining)
+            for conn in self._idle + list(self._in_use):
+                self._discard(conn)
+            self._idle = []
+            self._in_use = set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'min_size': self.minconn,
+                'max_size': self.maxconn,
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'acquired_total': self._acquired,
+                'timeouts_total': self._timeouts,
+                'discarded_total': self._discarded,
+                'acquire_latency_avg_ms': round(1000 * self._acquire_time_total / self._acquired, 3) if self._acquired else 0.0,
+                'acquire_latency_max_ms': round(1000 * self._acquire_time_max, 3),
+            }
@@ -0,0 +1,205 @@
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+from duplicates import SIMILARITY_THRESHOLD
+
+# "postgres" runs the pg_trgm query of duplicates.py, "memory" answers from DuplicateIndex
+DUPLICATE_BACKEND = os.getenv("DUPLICATE_BACKEND", "postgres")
+# Minimum weighted score over all the scored fields, on top of the match column threshold
+DUPLICATE_MIN_SCORE = float(os.getenv("DUPLICATE_MIN_SCORE", "0"))
+# Reload the whole table after this many seconds (0 = never), to pick up writes from other
+# processes (other workers, scripts/load_table.py)
+DUPLICATE_INDEX_REFRESH = float(os.getenv("DUPLICATE_INDEX_REFRESH", "300"))
+
+# For each table: the column compared with trigram similarity, the blocking keys
+# ("column" or "column:n" for the first n characters) and the weights of the scored fields.
+INDEX_RULES = {
+    "annuaire": {
+        "match": "nom",
+        "block": ["prenom:1"],
+        "weights": {"nom": 0.5, "prenom": 0.2, "localite": 0.2, "npa": 0.1},
+    },
+    "evenement": {
+        "match": "nom_evenement",
+        "block": ["nom_evenement:1"],
+        "weights": {"nom_evenement": 0.8, "date_debut": 0.2},
+    },
+}
+
+
+def normalize(value):
+    """Lower case, accents stripped, None for empty values."""
+    if value is None:
+        return None
+    text = unicodedata.normalize("NFKD", str(value))
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower().strip()
+    return text or None
+
+
+def trigrams(value):
+    """Trigram set as computed by pg_trgm: each alphanumeric word padded with two leading and one trailing space."""
+    text = normalize(value)
+    if text is None:
+        return frozenset()
+    grams = set()
+    for word in re.findall(r"\w+", text):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def similarity(a, b):
+    """pg_trgm similarity(): shared trigrams over the union of both trigram sets."""
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+def block_key(row, specs):
+    parts = []
+    for spec in specs:
+        column, _, length = spec.partition(":")
+        value = normalize(row.get(column))
+        if value is None:
+            return None
+        parts.append(value[:int(length)] if length else value)
+    return tuple(parts)
+
+
+class DuplicateIndex:
+    """
+    In-memory candidate index for one table: rows are grouped by blocking key and the
+    trigrams of the match column are kept in posting lists, so a lookup only scores the
+    rows of its block that share at least one trigram with the new entry.
+
+    Fed from any DB-API cursor (psycopg2 or sqlite3) with `load`, then kept in sync with
+    `add`, `update` and `remove` as rows are written.
+    """
+
+    def __init__(self, table_name, rules=None, threshold=SIMILARITY_THRESHOLD, min_score=DUPLICATE_MIN_SCORE):
+        self.table_name = table_name
+        self.rules = rules or INDEX_RULES[table_name]
+        self.threshold = threshold
+        self.min_score = min_score
+        self.loaded_at = None
+        self._columns = set(self.rules["weights"]) | {self.rules["match"]}
+        self._lock = threading.RLock()
+        self._clear()
+
+    def _clear(self):
+        self._rows = {}
+        self._grams = {}
+        self._blocks = {}
+        self._postings = defaultdict(lambda: defaultdict(set))
+
+    def load(self, cursor):
+        cursor.execute(f"SELECT * FROM {self.table_name}")
+        column_names = [desc[0] for desc in cursor.description]
+        with self._lock:
+            self._clear()
+            for row in cursor.fetchall():
+                self.add(dict(zip(column_names, row)))
+            self.loaded_at = time.time()
+        return len(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def add(self, row):
+        """Indexes a row dict, which must carry its `numero`."""
+        numero = row["numero"]
+        grams = {column: trigrams(row.get(column)) for column in self._columns}
+        key = block_key(row, self.rules["block"])
+        with self._lock:
+            if numero in self._rows:
+                self._unindex(numero)
+            self._rows[numero] = dict(row)
+            self._grams[numero] = grams
+            self._blocks[numero] = key
+            if key is not None:
+                for gram in grams[self.rules["match"]]:
+                    self._postings[key][gram].add(numero)
+
+    def update(self, numero, changes):
+        """Applies a partial update (as sent to the replace endpoints, `numero` included) to an indexed row."""
+        with self._lock:
+            current = self._rows.get(numero)
+            if current is None:
+                return
+            self.add(dict(current, **{k: v for k, v in changes.items() if k != "numero"}, numero=numero))
+
+    def remove(self, numero):
+        with self._lock:
+            if numero in self._rows:
+                self._unindex(numero)
+                del self._rows[numero], self._grams[numero], self._blocks[numero]
+
+    def _unindex(self, numero):
+        key = self._blocks[numero]
+        if key is None:
+            return
+        postings = self._postings[key]
+        for gram in self._grams[numero][self.rules["match"]]:
+            postings[gram].discard(numero)
+            if not postings[gram]:
+                del postings[gram]
+        if not postings:
+            del self._postings[key]
+
+    def score(self, grams, numero):
+        """Weighted trigram similarity over the scored fields present on both sides."""
+        total, weights = 0.0, 0.0
+        for column, weight in self.rules["weights"].items():
+            a, b = grams[column], self._grams[numero][column]
+            if a and b:
+                total += weight * similarity(a, b)
+                weights += weight
+        return total / weights if weights else 0.0
+
+    def find(self, entry):
+        """
+        Candidate rows for one new entry.
+        :return: List of (score, row dict) ordered by numero, like the Postgres backend.
+        """
+        match_col = self.rules["match"]
+        key = block_key(entry, self.rules["block"])
+        grams = {column: trigrams(entry.get(column)) for column in self._columns}
+        match_grams = grams[match_col]
+        if key is None or not match_grams:
+            return []
+
+        with self._lock:
+            postings = self._postings.get(key)
+            if not postings:
+                return []
+            shared = defaultdict(int)
+            for gram in match_grams:
+                for numero in postings.get(gram, ()):
+                    shared[numero] += 1
+
+            candidates = []
+            for numero, count in shared.items():
+                row_grams = self._grams[numero][match_col]
+                if count / (len(match_grams) + len(row_grams) - count) <= self.threshold:
+                    continue
+                score = self.score(grams, numero)
+                if score >= self.min_score:
+                    candidates.append((numero, score, dict(self._rows[numero])))
+        return [(score, row) for _, score, row in sorted(candidates, key=lambda c: c[0])]
+
+    def find_duplicate_candidates(self, entries):
+        """Drop-in for duplicates.find_duplicate_candidates: one list of matching row dicts per entry."""
+        return [[row for _, row in self.find(entry)] for entry in entries]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rows': len(self._rows),
+                'blocks': len(self._postings),
+                'loaded_at': self.loaded_at,
+            }
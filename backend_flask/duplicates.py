@@ -0,0 +1,75 @@
+import os
+
+SIMILARITY_THRESHOLD = float(os.getenv("DUPLICATE_SIMILARITY_THRESHOLD", "0.3"))
+
+# For each table: the column compared with pg_trgm similarity and the column whose
+# first letter must match (cheap blocking key).
+DUPLICATE_RULES = {
+    "annuaire": {"match": "nom", "block": "prenom"},
+    "evenement": {"match": "nom_evenement", "block": "nom_evenement"},
+}
+
+
+def duplicate_query(table_name, entries, threshold=SIMILARITY_THRESHOLD):
+    """
+    Builds the set-based candidate lookup for a batch of new entries.
+    The batch is passed as arrays unnested into a derived table and joined with the `%`
+    trigram operator, which can use the GIN gin_trgm_ops index on the match column.
+    :return: Tuple (sql, params).
+    """
+    rule = DUPLICATE_RULES[table_name]
+    match_col, block_col = rule["match"], rule["block"]
+    query = f"""
+        SELECT v.idx, t.*
+        FROM unnest(%s::text[], %s::text[]) WITH ORDINALITY AS v(match_value, block_value, idx)
+        JOIN {table_name} t
+          ON t.{match_col} %% v.match_value
+         AND similarity(t.{match_col}, v.match_value) > %s
+         AND LEFT(t.{block_col}, 1) = LEFT(v.block_value, 1)
+        ORDER BY v.idx, t.numero;
+        """
+    params = (
+        [entry.get(match_col) for entry in entries],
+        [entry.get(block_col) for entry in entries],
+        threshold,
+    )
+    return query, params
+
+
+# `%` compares against pg_trgm.similarity_threshold, keep it in line with the explicit check.
+# set_config() rather than SET so the value can be bound as a parameter by any driver.
+THRESHOLD_QUERY = "SELECT set_config('pg_trgm.similarity_threshold', %s, true)"
+
+
+def group_matches(rows, description, count):
+    """Splits the joined rows into one list of matching row dicts per new entry."""
+    matches = [[] for _ in range(count)]
+    column_names = [desc[0] for desc in description][1:]
+    for row in rows:
+        # WITH ORDINALITY is 1-based
+        matches[row[0] - 1].append(dict(zip(column_names, row[1:])))
+    return matches
+
+
+def find_duplicate_candidates(cursor, table_name, entries, threshold=SIMILARITY_THRESHOLD):
+    """
+    Looks up close matches for a whole batch of new entries in a single round trip.
+    :param cursor: Open psycopg2 cursor.
+    :param table_name: 'annuaire' or 'evenement'.
+    :param entries: List of entry dicts as produced by `model_dump()`.
+    :return: List of the same length as `entries`, each a list of matching row dicts.
+    """
+    if not entries:
+        return []
+    cursor.execute(THRESHOLD_QUERY, (str(threshold),))
+    cursor.execute(*duplicate_query(table_name, entries, threshold))
+    return group_matches(cursor.fetchall(), cursor.description, len(entries))
+
+
+async def find_duplicate_candidates_async(cursor, table_name, entries, threshold=SIMILARITY_THRESHOLD):
+    """Same as find_duplicate_candidates with a psycopg 3 AsyncCursor."""
+    if not entries:
+        return []
+    await cursor.execute(THRESHOLD_QUERY, (str(threshold),))
+    await cursor.execute(*duplicate_query(table_name, entries, threshold))
+    return group_matches(await cursor.fetchall(), cursor.description, len(entries))
@@ -0,0 +1,309 @@
+"""
+Whole-table duplicate detection, e.g.
+
+    python entity_resolution.py annuaire --output merges.json --replace-payload replace.json
+
+Rows are grouped by cheap blocking keys, every pair inside a block is scored at once with
+numpy, and pairs above the threshold are clustered with union-find. Each cluster becomes a
+merge proposal: the most complete row survives and its empty fields are filled from the
+other rows. `replace.json` holds those updates as the JSON array PUT /replace-annuaire
+(or /replace-evenement) expects; the duplicate rows are listed for review, not deleted.
+"""
+import argparse
+import json
+import os
+import re
+import time
+from collections import defaultdict
+from datetime import date, datetime
+
+import numpy as np
+
+from dedup_index import normalize, trigrams
+from export import json_default
+
+RESOLUTION_THRESHOLD = float(os.getenv("RESOLUTION_THRESHOLD", "0.6"))
+# Larger blocks are compared in overlapping windows of this many rows sorted by the first field
+MAX_BLOCK_SIZE = int(os.getenv("RESOLUTION_MAX_BLOCK_SIZE", "1000"))
+FETCH_SIZE = 5000
+
+# For each table: trigram-compared fields with their weight, fields compared exactly after
+# normalization, and the blocking keys ("column", "column:n" for a prefix, "phone" for any phone number).
+RESOLUTION_RULES = {
+    "annuaire": {
+        "fields": {"nom": 0.35, "prenom": 0.2, "voie": 0.15, "localite": 0.1},
+        "exact": {"courriel": 0.1, "phone": 0.1},
+        "blocks": [["npa", "nom:1"], ["phone"], ["courriel"]],
+        "phone_columns": ["telephone", "portable"],
+    },
+    "evenement": {
+        "fields": {"nom_evenement": 0.6, "titre_evenement": 0.2},
+        "exact": {"date_debut": 0.2},
+        "blocks": [["date_debut"], ["nom_evenement:3"]],
+        "phone_columns": [],
+    },
+}
+
+
+def normalize_phone(value):
+    """Last 9 digits, so +41 21 123 45 67, 0041211234567 and 021 123 45 67 compare equal."""
+    if value is None:
+        return None
+    digits = re.sub(r"\D", "", str(value))
+    return digits[-9:] if len(digits) >= 9 else None
+
+
+def _value(row, column):
+    value = row.get(column)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return normalize(value)
+
+
+def compact_record(row, rules):
+    """The few normalized values needed for blocking and scoring, so the whole table fits in memory."""
+    record = {column: _value(row, column) for column in rules["fields"]}
+    for column in rules["exact"]:
+        if column != "phone":
+            record[column] = _value(row, column)
+    phones = [normalize_phone(row.get(column)) for column in rules["phone_columns"]]
+    record["phone"] = next((phone for phone in phones if phone), None)
+    for spec in rules["blocks"]:
+        for part in spec:
+            column = part.partition(":")[0]
+            if column not in record:
+                record[column] = _value(row, column)
+    return record
+
+
+def block_keys(record, rules):
+    keys = []
+    for i, spec in enumerate(rules["blocks"]):
+        parts = []
+        for part in spec:
+            column, _, length = part.partition(":")
+            value = record.get(column)
+            if value is None:
+                break
+            parts.append(value[:int(length)] if length else value)
+        else:
+            keys.append((i,) + tuple(parts))
+    return keys
+
+
+def _trigram_matrix(values):
+    """Binary (rows x trigrams) matrix of a column, and the trigram count of each row."""
+    grams = [trigrams(value) for value in values]
+    vocabulary = {}
+    for row_grams in grams:
+        for gram in row_grams:
+            vocabulary.setdefault(gram, len(vocabulary))
+    matrix = np.zeros((len(values), max(1, len(vocabulary))), dtype=np.float32)
+    for i, row_grams in enumerate(grams):
+        for gram in row_grams:
+            matrix[i, vocabulary[gram]] = 1.0
+    return matrix, matrix.sum(axis=1)
+
+
+def score_block(records, rules):
+    """
+    Scores every pair of `records` at once.
+    :return: (n x n) matrix of weighted similarities; fields empty on either side are left out of the weighting.
+    """
+    n = len(records)
+    total = np.zeros((n, n), dtype=np.float32)
+    weights = np.zeros((n, n), dtype=np.float32)
+
+    for column, weight in rules["fields"].items():
+        matrix, sizes = _trigram_matrix([record[column] for record in records])
+        shared = matrix @ matrix.T
+        union = sizes[:, None] + sizes[None, :] - shared
+        present = (sizes[:, None] > 0) & (sizes[None, :] > 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            similarity = np.where(present, shared / np.maximum(union, 1), 0.0)
+        total += weight * similarity
+        weights += weight * present
+
+    for column, weight in rules["exact"].items():
+        values = [record[column] for record in records]
+        codes = {value: i for i, value in enumerate(set(values) - {None})}
+        ids = np.array([codes.get(value, -1) for value in values])
+        present = (ids[:, None] >= 0) & (ids[None, :] >= 0)
+        total += weight * (present & (ids[:, None] == ids[None, :]))
+        weights += weight * present
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(weights > 0, total / np.maximum(weights, 1e-9), 0.0)
+
+
+class UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        parent = self.parent.setdefault(item, item)
+        if parent != item:
+            parent = self.parent[item] = self.find(parent)
+        return parent
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+
+def iter_rows(cursor, table_name, fetch_size=FETCH_SIZE):
+    cursor.execute(f"SELECT * FROM {table_name} ORDER BY numero")
+    column_names = None
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            return
+        column_names = column_names or [desc[0] for desc in cursor.description]
+        for row in rows:
+            yield dict(zip(column_names, row))
+
+
+def find_duplicate_pairs(rows, rules, threshold=RESOLUTION_THRESHOLD, max_block_size=MAX_BLOCK_SIZE):
+    """
+    :param rows: Iterable of row dicts, consumed once.
+    :return: Dict {(numero_a, numero_b): score} of the pairs at or above `threshold`.
+    """
+    numeros = []
+    records = []
+    blocks = defaultdict(list)
+    for row in rows:
+        record = compact_record(row, rules)
+        for key in block_keys(record, rules):
+            blocks[key].append(len(records))
+        numeros.append(row["numero"])
+        records.append(record)
+
+    sort_column = next(iter(rules["fields"]))
+    pairs = {}
+    for members in blocks.values():
+        if len(members) < 2:
+            continue
+        if len(members) > max_block_size:
+            # Sorted neighbourhood: overlapping windows keep memory at max_block_size^2 per step
+            members = sorted(members, key=lambda i: records[i][sort_column] or "")
+            step = max_block_size // 2
+            windows = [members[start:start + max_block_size] for start in range(0, len(members) - step, step)]
+        else:
+            windows = [members]
+
+        for window in windows:
+            scores = score_block([records[i] for i in window], rules)
+            for a, b in zip(*np.nonzero(np.triu(scores >= threshold, k=1))):
+                pair = tuple(sorted((numeros[window[a]], numeros[window[b]])))
+                pairs[pair] = max(pairs.get(pair, 0.0), float(scores[a, b]))
+    return pairs
+
+
+def cluster_pairs(pairs):
+    union_find = UnionFind()
+    for a, b in pairs:
+        union_find.union(a, b)
+    clusters = defaultdict(set)
+    for numero in list(union_find.parent):
+        clusters[union_find.find(numero)].add(numero)
+    return [sorted(members) for members in clusters.values()]
+
+
+def _completeness(row):
+    filled = sum(1 for key, value in row.items() if key != "numero" and value not in (None, ""))
+    modified = str(row.get("date_derniere_modification") or "")
+    return filled, modified, -row["numero"]
+
+
+def merge_proposal(rows, pairs):
+    """
+    Picks the most complete (then most recently modified) row as survivor and fills its
+    empty fields from the other rows of the cluster.
+    """
+    rows = sorted(rows, key=_completeness, reverse=True)
+    survivor = rows[0]
+    filled = {}
+    for row in rows[1:]:
+        for column, value in row.items():
+            if column != "numero" and survivor.get(column) in (None, "") and value not in (None, "") and column not in filled:
+                filled[column] = value
+    members = {row["numero"] for row in rows}
+    cluster_pairs_ = [[a, b, round(score, 3)] for (a, b), score in pairs.items() if a in members and b in members]
+    return {
+        "survivor": survivor["numero"],
+        "duplicates": sorted(row["numero"] for row in rows[1:]),
+        "pairs": sorted(cluster_pairs_),
+        "replace": dict(filled, numero=survivor["numero"]) if filled else None,
+    }
+
+
+def resolve_table(cursor_factory, table_name, threshold=RESOLUTION_THRESHOLD, max_block_size=MAX_BLOCK_SIZE):
+    """
+    Runs the whole batch: one pass to find and cluster pairs, a second pass to collect the
+    full rows of the clustered records only.
+    :param cursor_factory: Callable returning a fresh DB-API cursor (a psycopg2 named cursor streams the table).
+    :return: Report dict with the clusters and the combined replace payload.
+    """
+    rules = RESOLUTION_RULES[table_name]
+    started = time.time()
+    pairs = find_duplicate_pairs(iter_rows(cursor_factory(), table_name), rules, threshold, max_block_size)
+    clusters = cluster_pairs(pairs)
+
+    clustered = {numero for members in clusters for numero in members}
+    full_rows = {}
+    for row in iter_rows(cursor_factory(), table_name):
+        if row["numero"] in clustered:
+            full_rows[row["numero"]] = row
+
+    proposals = [merge_proposal([full_rows[numero] for numero in members], pairs) for members in clusters]
+    proposals.sort(key=lambda proposal: proposal["survivor"])
+    return {
+        "table": table_name,
+        "threshold": threshold,
+        "elapsed_s": round(time.time() - started, 3),
+        "pairs": len(pairs),
+        "clusters": proposals,
+        "replace_payload": [proposal["replace"] for proposal in proposals if proposal["replace"]],
+    }
+
+
+def main():
+    import psycopg2
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Find duplicate rows in a whole table and propose merges.")
+    parser.add_argument("table", choices=sorted(RESOLUTION_RULES))
+    parser.add_argument("--threshold", type=float, default=RESOLUTION_THRESHOLD)
+    parser.add_argument("--max-block-size", type=int, default=MAX_BLOCK_SIZE)
+    parser.add_argument("--output", help="Write the full report (clusters, pair scores) to this JSON file")
+    parser.add_argument("--replace-payload", help="Write the body for PUT /replace-<table> to this JSON file")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(
+        host=os.getenv("DB_HOST"),
+        database=os.getenv("DB_NAME"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD")
+    )
+    cursors = iter(range(2))
+    try:
+        # Named (server-side) cursors stream the table in FETCH_SIZE batches
+        report = resolve_table(lambda: conn.cursor(name=f"resolve_{args.table}_{next(cursors)}"),
+                               args.table, args.threshold, args.max_block_size)
+    finally:
+        conn.close()
+
+    print(f"{report['pairs']} duplicate pairs in {len(report['clusters'])} clusters "
+          f"({len(report['replace_payload'])} survivors to update) in {report['elapsed_s']}s")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, default=json_default, ensure_ascii=False, indent=2)
+    if args.replace_payload:
+        with open(args.replace_payload, "w", encoding="utf-8") as f:
+            json.dump(report["replace_payload"], f, default=json_default, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
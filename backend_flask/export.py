@@ -0,0 +1,125 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import uuid
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from listing import ListingError, parse_fields
+from tables import TABLE_COLUMNS
+
+EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", "2000"))
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+class ExportError(ValueError):
+    """Raised for invalid export parameters, reported to the client as a 400."""
+
+
+def json_default(value):
+    # Decimal as a string, like the listing endpoints, so no precision is lost
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def check_export_format(export_format):
+    if export_format not in EXPORT_FORMATS:
+        raise ExportError(f"Unsupported export format, expected one of: {', '.join(EXPORT_FORMATS)}")
+    if export_format == "xlsx":
+        try:
+            import xlsxwriter  # noqa: F401
+        except ImportError:
+            raise ExportError("XLSX export requires the 'xlsxwriter' package.")
+
+
+def export_columns(table_name, fields=None):
+    """Exported columns, parsed and validated like the `fields` of the listing endpoints."""
+    try:
+        columns = parse_fields(table_name, {"fields": fields})
+    except ListingError as e:
+        raise ExportError(str(e))
+    return columns or list(TABLE_COLUMNS[table_name])
+
+
+def iter_rows(conn, table_name, columns, fetch_size=EXPORT_FETCH_SIZE):
+    """
+    Yields batches of rows through a server-side (named) cursor so only
+    `fetch_size` rows are held in memory at any time.
+    """
+    cursor = conn.cursor(name=f"export_{table_name}_{uuid.uuid4().hex}")
+    cursor.itersize = fetch_size
+    try:
+        cursor.execute(f"SELECT {', '.join(columns)} FROM {table_name} ORDER BY numero")
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+
+
+def stream_ndjson(batches, columns):
+    for rows in batches:
+        yield "".join(json.dumps(dict(zip(columns, row)), default=json_default, ensure_ascii=False) + "\n"
+                      for row in rows)
+
+
+def stream_csv(batches, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM so that Excel opens the accented headers correctly
+    buffer.write("\ufeff")
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_xlsx(batches, columns, chunk_size=64 * 1024):
+    """
+    XLSX is a zip archive and cannot be produced incrementally, so rows are written with
+    xlsxwriter's constant_memory mode to a temporary file which is then streamed back.
+    """
+    import xlsxwriter
+
+    with tempfile.NamedTemporaryFile(suffix=".xlsx") as tmp:
+        workbook = xlsxwriter.Workbook(tmp.name, {"constant_memory": True, "default_date_format": "yyyy-mm-dd"})
+        worksheet = workbook.add_worksheet()
+        worksheet.write_row(0, 0, columns)
+        row_index = 1
+        for rows in batches:
+            for row in rows:
+                worksheet.write_row(row_index, 0, [
+                    float(v) if isinstance(v, Decimal) else v.isoformat() if isinstance(v, time) else v
+                    for v in row
+                ])
+                row_index += 1
+        workbook.close()
+
+        tmp.seek(0)
+        while True:
+            chunk = tmp.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+STREAMERS = {
+    "ndjson": stream_ndjson,
+    "csv": stream_csv,
+    "xlsx": stream_xlsx,
+}
@@ -0,0 +1,151 @@
+import asyncio
+import functools
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import get_args
+
+from pydantic import ValidationError
+
+CHUNK_TOKENS = int(os.getenv("LLM_CHUNK_TOKENS", "1500"))
+MAX_WORKERS = int(os.getenv("LLM_MAX_WORKERS", "4"))
+
+@functools.lru_cache(maxsize=None)
+def get_encoding():
+    """tiktoken encoding, loaded on first use since it reads (or downloads) the BPE ranks."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text):
+    """Exact token count with tiktoken when available, ~4 characters per token otherwise."""
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+def chunk_records(records, token_budget=CHUNK_TOKENS):
+    """
+    Splits tabular rows into JSON arrays that each fit in `token_budget`.
+    Rows are never split, a single oversized row becomes its own chunk.
+    """
+    chunks = []
+    # One token for the brackets of the array and one per row for its ", " separator
+    current, current_tokens = [], 1
+    for record in records:
+        tokens = count_tokens(json.dumps(record, ensure_ascii=False)) + 1
+        if current and current_tokens + tokens > token_budget:
+            chunks.append(json.dumps(current, ensure_ascii=False))
+            current, current_tokens = [], 1
+        current.append(record)
+        current_tokens += tokens
+    if current:
+        chunks.append(json.dumps(current, ensure_ascii=False))
+    return chunks
+
+
+def _split_oversized(block, token_budget):
+    """Splits a paragraph that exceeds the budget on line boundaries, then on characters."""
+    pieces = []
+    for line in block.split("\n"):
+        while count_tokens(line) > token_budget:
+            cut = max(1, len(line) * token_budget // count_tokens(line))
+            pieces.append(line[:cut])
+            line = line[cut:]
+        pieces.append(line)
+    return pieces
+
+
+def chunk_text(text, token_budget=CHUNK_TOKENS):
+    """Splits free text into chunks of whole paragraphs that each fit in `token_budget`."""
+    paragraphs = [p for p in text.split("\n\n") if p.strip()]
+    chunks = []
+    current, current_tokens = [], 0
+    for paragraph in paragraphs:
+        tokens = count_tokens(paragraph)
+        parts = [paragraph] if tokens <= token_budget else _split_oversized(paragraph, token_budget)
+        for part in parts:
+            part_tokens = count_tokens(part)
+            if current and current_tokens + part_tokens > token_budget:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(part)
+            current_tokens += part_tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def extract_entries(program, chunks, max_workers=MAX_WORKERS, usage=None):
+    """
+    Runs the Pydantic program on every chunk with a bounded thread pool and merges
+    the extracted entries, keeping the order of the input.
+    :param usage: Optional TokenUsage passed to metered programs to collect the request's token counts.
+    :raises: The first extraction error, if any chunk fails.
+    """
+    kwargs = {"usage": usage} if usage is not None else {}
+    if len(chunks) == 1:
+        return list(program(text_input=chunks[0], **kwargs).entries)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as executor:
+        results = list(executor.map(lambda chunk: program(text_input=chunk, **kwargs), chunks))
+    return [entry for result in results for entry in result.entries]
+
+
+async def extract_entries_async(program, chunks, max_workers=MAX_WORKERS, usage=None):
+    """Same as extract_entries with the async program API, at most `max_workers` calls in flight."""
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+    kwargs = {"usage": usage} if usage is not None else {}
+
+    async def extract(chunk):
+        async with semaphore:
+            return await program.acall(text_input=chunk, **kwargs)
+
+    results = await asyncio.gather(*(extract(chunk) for chunk in chunks))
+    return [entry for result in results for entry in result.entries]
+
+
+class FakeProgram:
+    """
+    Offline stand-in for OpenAIPydanticProgram (LLM_BACKEND=fake).
+    Reads JSON records whose keys are the model field names instead of calling the LLM,
+    after sleeping `latency` seconds to simulate the API round trip.
+    """
+
+    def __init__(self, output_cls, latency=0.0):
+        self.output_cls = output_cls
+        self.entry_cls = get_args(output_cls.model_fields["entries"].annotation)[0]
+        self.latency = latency
+
+    def __call__(self, text_input, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._parse(text_input)
+
+    async def acall(self, text_input, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._parse(text_input)
+
+    def _parse(self, text_input):
+        try:
+            records = json.loads(text_input)
+        except (TypeError, ValueError):
+            records = []
+        if isinstance(records, dict):
+            records = [records]
+
+        entries = []
+        for record in records if isinstance(records, list) else []:
+            if not isinstance(record, dict):
+                continue
+            try:
+                entries.append(self.entry_cls(**{f: record.get(f) for f in self.entry_cls.model_fields}))
+            except ValidationError:
+                continue
+        return self.output_cls(entries=entries)
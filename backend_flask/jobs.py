@@ -0,0 +1,244 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", str(24 * 3600)))
+# A running job whose owner has not renewed its lease for this long is taken over by another worker
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+# A job taken over this many times is failed instead of leased again: it likely kills its worker
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+
+class JobQueue:
+    """
+    Durable job queue in a local SQLite table, drained by a pool of worker threads.
+
+    `handler(kind, payload, progress)` does the work and returns (result, status_code);
+    `progress(stage, **details)` records where the job is so clients can poll or stream it.
+    Several processes (gunicorn workers) can share the file: a running job is leased by its
+    owner, which renews the lease from a heartbeat thread, and is only taken over once the
+    lease has expired, i.e. when the owning process died. A job whose owners keep dying is
+    marked failed once it has been claimed `max_attempts` times.
+    """
+
+    def __init__(self, handler, path=JOB_DB_PATH, workers=JOB_WORKERS, json_default=None,
+                 lease_seconds=JOB_LEASE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS):
+        self.handler = handler
+        self.path = path
+        self.workers = workers
+        self.json_default = json_default
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.owner = self._new_owner()
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                progress TEXT,
+                result TEXT,
+                status_code INTEGER,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                owner TEXT,
+                lease_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        columns = {row[1] for row in db.execute("PRAGMA table_info(jobs)")}
+        for column, column_type in (("owner", "TEXT"), ("lease_until", "REAL"),
+                                    ("attempts", "INTEGER NOT NULL DEFAULT 0")):
+            if column not in columns:
+                db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at)")
+
+    def _db(self):
+        # sqlite3 connections cannot be shared between threads, keep one per thread
+        if not hasattr(self._local, "db"):
+            self._local.db = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+        return self._local.db
+
+    @staticmethod
+    def _new_owner():
+        return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopping.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat, name="job-lease-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def restart_after_fork(self):
+        """Threads and SQLite connections do not survive fork(): start over in the child."""
+        if not self._threads:
+            return
+        self.owner = self._new_owner()
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self.start()
+
+    def stop(self, timeout=30):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def enqueue(self, kind, payload):
+        job_id = uuid.uuid4().hex
+        self._db().execute(
+            "INSERT INTO jobs (id, kind, status, payload, progress, created_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+            (job_id, kind, json.dumps(payload), json.dumps({"stage": "queued"}), time.time())
+        )
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        row = self._db().execute(
+            """
+            SELECT id, kind, status, progress, result, status_code, error, created_at, started_at, finished_at,
+                   attempts
+            FROM jobs WHERE id = ?
+            """,
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row[0],
+            "kind": row[1],
+            "status": row[2],
+            "progress": json.loads(row[3]) if row[3] else None,
+            "result": json.loads(row[4]) if row[4] else None,
+            "status_code": row[5],
+            "error": row[6],
+            "created_at": row[7],
+            "started_at": row[8],
+            "finished_at": row[9],
+            "attempts": row[10],
+        }
+
+    def _claim(self):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            while True:
+                row = db.execute(
+                    """
+                    SELECT id, kind, payload, attempts FROM jobs
+                    WHERE status = 'queued' OR (status = 'running' AND (lease_until IS NULL OR lease_until < ?))
+                    ORDER BY created_at LIMIT 1
+                    """,
+                    (now,)
+                ).fetchone()
+                if row is None or row[3] < self.max_attempts:
+                    break
+                # Every previous owner died while running it
+                error = f"Abandoned after {row[3]} attempts: the worker running it stopped every time."
+                db.execute(
+                    """
+                    UPDATE jobs SET status = 'failed', result = ?, status_code = 500, error = ?, progress = ?,
+                                    finished_at = ?, lease_until = NULL
+                    WHERE id = ?
+                    """,
+                    (json.dumps({"error": error}), error, json.dumps({"stage": "failed"}), now, row[0])
+                )
+            if row is not None:
+                db.execute(
+                    """
+                    UPDATE jobs SET status = 'running', started_at = ?, owner = ?, lease_until = ?,
+                                    attempts = attempts + 1
+                    WHERE id = ?
+                    """,
+                    (now, self.owner, now + self.lease_seconds, row[0])
+                )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return row[:3] if row is not None else None
+
+    def _heartbeat(self):
+        db = self._db()
+        while not self._stopping.wait(self.lease_seconds / 3):
+            try:
+                db.execute(
+                    "UPDATE jobs SET lease_until = ? WHERE owner = ? AND status = 'running'",
+                    (time.time() + self.lease_seconds, self.owner)
+                )
+            except sqlite3.OperationalError as e:
+                print(f"Error while renewing the job leases: {e}")
+
+    def _set_progress(self, job_id, stage, **details):
+        self._db().execute(
+            "UPDATE jobs SET progress = ? WHERE id = ? AND owner = ?",
+            (json.dumps(dict(details, stage=stage), default=self.json_default), job_id, self.owner)
+        )
+
+    def _finish(self, job_id, status, result=None, status_code=None, error=None):
+        self._db().execute(
+            """
+            UPDATE jobs SET status = ?, result = ?, status_code = ?, error = ?, progress = ?, finished_at = ?,
+                            lease_until = NULL
+            WHERE id = ? AND owner = ?
+            """,
+            (status, json.dumps(result, default=self.json_default) if result is not None else None,
+             status_code, error, json.dumps({"stage": status}), time.time(), job_id, self.owner)
+        )
+
+    def _purge(self):
+        self._db().execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+            (time.time() - JOB_RETENTION,)
+        )
+
+    def _work(self):
+        while not self._stopping.is_set():
+            try:
+                job = self._claim()
+            except sqlite3.OperationalError as e:
+                print(f"Error while claiming a job: {e}")
+                job = None
+            if job is None:
+                self._wakeup.wait(1.0)
+                self._wakeup.clear()
+                continue
+
+            job_id, kind, payload = job
+            try:
+                result, status_code = self.handler(
+                    kind, json.loads(payload), lambda stage, **details: self._set_progress(job_id, stage, **details)
+                )
+                self._finish(job_id, "done", result, status_code)
+            except Exception as e:
+                traceback.print_exc()
+                self._finish(job_id, "failed", {"error": str(e)}, 500, str(e))
+            self._purge()
@@ -0,0 +1,244 @@
+import base64
+import json
+from datetime import date
+
+from tables import TABLE_COLUMNS, INDEXED_COLUMNS, INTEGER_COLUMNS, DATE_COLUMNS
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Range of the Postgres INTEGER columns
+MIN_INTEGER = -2 ** 31
+MAX_INTEGER = 2 ** 31 - 1
+
+# Query parameters that switch GET /annuaire and GET /evenements to paginated mode
+LISTING_PARAMS = {"limit", "after", "fields", "sort", "order", "count"}
+
+
+# Body layouts of the listing endpoints, picked with ?format=
+LISTING_FORMATS = ("records", "columnar")
+
+
+class ListingError(ValueError):
+    """Raised for invalid listing parameters, reported to the client as a 400."""
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+
+def decode_cursor(token):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (ValueError, TypeError):
+        raise ListingError("Invalid 'after' cursor.")
+    if not isinstance(values, list) or len(values) != 2:
+        raise ListingError("Invalid 'after' cursor.")
+    return values
+
+
+def wants_pagination(table_name, args):
+    return any(key in LISTING_PARAMS or key in INDEXED_COLUMNS[table_name] for key in args)
+
+
+def parse_listing_format(args):
+    """`records` (list of objects, the default) or `columnar` ({"columns", "rows"} with rows as arrays)."""
+    listing_format = args.get("format", "records")
+    if listing_format not in LISTING_FORMATS:
+        raise ListingError(f"'format' must be one of: {', '.join(LISTING_FORMATS)}.")
+    return listing_format
+
+
+def parse_limit(args):
+    try:
+        limit = int(args.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ListingError("'limit' must be an integer.")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ListingError(f"'limit' must be between 1 and {MAX_PAGE_SIZE}.")
+    return limit
+
+
+def parse_fields(table_name, args):
+    """Columns requested with ?fields=a,b, or None for all of them."""
+    if not args.get("fields"):
+        return None
+    fields = [f.strip() for f in args["fields"].split(",") if f.strip()]
+    unknown = [f for f in fields if f not in TABLE_COLUMNS[table_name]]
+    if unknown:
+        raise ListingError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+
+def parse_filter_value(table_name, column, value):
+    """
+    Checks an equality filter against the column type, so ?npa=abc is a 400 rather than a database error.
+    :return: The value converted to the column type.
+    """
+    if column in INTEGER_COLUMNS[table_name]:
+        try:
+            number = int(value)
+        except ValueError:
+            raise ListingError(f"'{column}' must be an integer.")
+        if not MIN_INTEGER <= number <= MAX_INTEGER:
+            raise ListingError(f"'{column}' is out of range.")
+        return number
+    if column in DATE_COLUMNS[table_name]:
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise ListingError(f"'{column}' must be a date (YYYY-MM-DD).")
+    return value
+
+
+def parse_filters(table_name, args, columns):
+    """Equality filters given in the query string for `columns`, validated with parse_filter_value."""
+    return {column: parse_filter_value(table_name, column, args[column])
+            for column in columns if args.get(column) not in (None, "")}
+
+
+def parse_listing_args(table_name, args):
+    """
+    Validates the query string of a listing request.
+    :param table_name: Table being listed.
+    :param args: Request query parameters (werkzeug MultiDict or plain dict).
+    :return: Dict of listing options consumed by build_listing_query.
+    """
+    indexed = INDEXED_COLUMNS[table_name]
+
+    limit = parse_limit(args)
+    fields = parse_fields(table_name, args)
+
+    sort = args.get("sort", "numero")
+    if sort not in indexed:
+        raise ListingError(f"Sorting is only supported on: {', '.join(indexed)}")
+    order = args.get("order", "asc").lower()
+    if order not in ("asc", "desc"):
+        raise ListingError("'order' must be 'asc' or 'desc'.")
+
+    count = args.get("count", "estimate")
+    if count not in ("estimate", "exact", "none"):
+        raise ListingError("'count' must be 'estimate', 'exact' or 'none'.")
+
+    filters = parse_filters(table_name, args, indexed)
+
+    return {
+        "limit": limit,
+        "fields": fields,
+        "sort": sort,
+        "descending": order == "desc",
+        "count": count,
+        "filters": filters,
+        "after": decode_cursor(args["after"]) if args.get("after") else None,
+    }
+
+
+def _where_clause(options):
+    conditions = []
+    params = []
+    for column, value in options["filters"].items():
+        conditions.append(f"{column} = %s")
+        params.append(value)
+
+    if options["after"] is not None:
+        sort = options["sort"]
+        last_value, last_numero = options["after"]
+        op = "<" if options["descending"] else ">"
+        if sort == "numero":
+            conditions.append(f"numero {op} %s")
+            params.append(last_numero)
+        elif last_value is None:
+            # NULLS LAST: only the remaining NULL rows are left to page through
+            conditions.append(f"({sort} IS NULL AND numero {op} %s)")
+            params.append(last_numero)
+        else:
+            conditions.append(f"({sort} {op} %s OR ({sort} = %s AND numero {op} %s) OR {sort} IS NULL)")
+            params.extend([last_value, last_value, last_numero])
+
+    return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+
+def build_listing_query(table_name, options):
+    """Builds the keyset-paginated SELECT. One extra row is fetched to know whether a next page exists."""
+    sort = options["sort"]
+    if options["fields"]:
+        # numero and the sort column are always returned since the cursor is built from them
+        selected = ["numero"] + ([sort] if sort != "numero" else [])
+        selected += [f for f in options["fields"] if f not in selected]
+    else:
+        selected = list(TABLE_COLUMNS[table_name])
+
+    where, params = _where_clause(options)
+    direction = "DESC" if options["descending"] else "ASC"
+    order_by = f"numero {direction}" if sort == "numero" else f"{sort} {direction} NULLS LAST, numero {direction}"
+    query = f"SELECT {', '.join(selected)} FROM {table_name}{where} ORDER BY {order_by} LIMIT %s"
+    return query, params + [options["limit"] + 1]
+
+
+def next_cursor(rows, column_names, options):
+    if len(rows) <= options["limit"]:
+        return None
+    last = dict(zip(column_names, rows[options["limit"] - 1]))
+    return encode_cursor([last[options["sort"]], last["numero"]])
+
+
+def _count_plan(table_name, options):
+    filters_only = dict(options, after=None)
+    return _where_clause(filters_only)
+
+
+def _plan_rows(plan):
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def count_rows(cursor, table_name, options):
+    """
+    Counts the rows matching the filters (ignoring the cursor).
+    The default estimate reads planner statistics instead of scanning the table.
+    :return: Tuple (total, is_estimate), total is None when counting is disabled.
+    """
+    if options["count"] == "none":
+        return None, False
+
+    where, params = _count_plan(table_name, options)
+
+    if options["count"] == "exact":
+        cursor.execute(f"SELECT count(*) FROM {table_name}{where}", params)
+        return cursor.fetchone()[0], False
+
+    if not where:
+        cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", (table_name,))
+        row = cursor.fetchone()
+        # reltuples is -1 (or 0 on old servers) until the table has been analyzed
+        if row and row[0] > 0:
+            return row[0], True
+        cursor.execute(f"SELECT count(*) FROM {table_name}")
+        return cursor.fetchone()[0], False
+
+    cursor.execute(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM {table_name}{where}", params)
+    return _plan_rows(cursor.fetchone()[0]), True
+
+
+async def count_rows_async(cursor, table_name, options):
+    """Same as count_rows with a psycopg 3 AsyncCursor."""
+    if options["count"] == "none":
+        return None, False
+
+    where, params = _count_plan(table_name, options)
+
+    if options["count"] == "exact":
+        await cursor.execute(f"SELECT count(*) FROM {table_name}{where}", params)
+        return (await cursor.fetchone())[0], False
+
+    if not where:
+        await cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", (table_name,))
+        row = await cursor.fetchone()
+        if row and row[0] > 0:
+            return row[0], True
+        await cursor.execute(f"SELECT count(*) FROM {table_name}")
+        return (await cursor.fetchone())[0], False
+
+    await cursor.execute(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM {table_name}{where}", params)
+    return _plan_rows((await cursor.fetchone())[0]), True
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".llm_cache.sqlite3"))
+CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+
+
+def normalize_input(text):
+    """Unicode and whitespace normalization so cosmetic differences hit the same cache entry."""
+    text = unicodedata.normalize("NFC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def program_fingerprint(program_name, model, prompt_template, output_cls):
+    """Identifies everything besides the input that changes what the LLM would return."""
+    schema = json.dumps(output_cls.model_json_schema(), sort_keys=True)
+    return hashlib.sha256("\x00".join([program_name, model, prompt_template, schema]).encode()).hexdigest()
+
+
+class ExtractionCache:
+    """
+    SQLite-backed cache of extraction results keyed on sha256(program fingerprint + normalized input).
+    Entries expire after `ttl` seconds, and the least recently used ones are evicted once
+    the cache holds more than `max_entries` results or `max_bytes` of JSON.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS extraction_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_extraction_cache_last_access ON extraction_cache (last_access)")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(fingerprint, text_input):
+        return hashlib.sha256(f"{fingerprint}\x00{normalize_input(text_input)}".encode()).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, created_at FROM extraction_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._db.execute("DELETE FROM extraction_cache WHERE key = ?", (key,))
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE extraction_cache SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        payload = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO extraction_cache (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now, now)
+            )
+            self._evict(now)
+
+    def _evict(self, now):
+        cursor = self._db.execute("DELETE FROM extraction_cache WHERE created_at < ?", (now - self.ttl,))
+        self.evictions += max(cursor.rowcount, 0)
+
+        count, total = self._db.execute("SELECT count(*), coalesce(sum(size), 0) FROM extraction_cache").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        victims = []
+        for key, size in self._db.execute("SELECT key, size FROM extraction_cache ORDER BY last_access"):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            victims.append((key,))
+            count -= 1
+            total -= size
+        self._db.executemany("DELETE FROM extraction_cache WHERE key = ?", victims)
+        self.evictions += len(victims)
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM extraction_cache")
+
+    def stats(self):
+        with self._lock:
+            count, total = self._db.execute("SELECT count(*), coalesce(sum(size), 0) FROM extraction_cache").fetchone()
+            return {
+                'entries': count,
+                'bytes': total,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class CachedProgram:
+    """Wraps a Pydantic program so identical inputs reuse the stored entries instead of calling the LLM."""
+
+    def __init__(self, program, cache, fingerprint):
+        self.program = program
+        self.cache = cache
+        self.fingerprint = fingerprint
+        self.output_cls = program.output_cls
+
+    def __call__(self, text_input, **kwargs):
+        key = self.cache.make_key(self.fingerprint, text_input)
+        cached = self.cache.get(key)
+        if cached is not None:
+            if kwargs.get("usage") is not None:
+                kwargs["usage"].record_cache_hit()
+            return self.output_cls(**cached)
+        result = self.program(text_input=text_input, **kwargs)
+        self.cache.set(key, result.model_dump())
+        return result
+
+    async def acall(self, text_input, **kwargs):
+        key = self.cache.make_key(self.fingerprint, text_input)
+        cached = self.cache.get(key)
+        if cached is not None:
+            if kwargs.get("usage") is not None:
+                kwargs["usage"].record_cache_hit()
+            return self.output_cls(**cached)
+        result = await self.program.acall(text_input=text_input, **kwargs)
+        self.cache.set(key, result.model_dump())
+        return result
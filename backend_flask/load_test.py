@@ -0,0 +1,91 @@
+"""
+Concurrent load test for comparing the Flask (WSGI) and ASGI servers, e.g.
+
+    python app.py                                   # Flask dev server on :5000
+    uvicorn asgi:application --port 8000            # ASGI mode
+    python load_test.py --base-url http://localhost:5000 --path /annuaire --concurrency 50
+    python load_test.py --base-url http://localhost:8000 --path /annuaire --concurrency 50
+
+POST /process-* can be exercised with --text; run the server with LLM_BACKEND=fake and
+FAKE_LLM_LATENCY set to the typical API latency to measure the serving layer alone.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run_load(base_url, path, requests, concurrency, text=None, timeout=120.0, send=None):
+    """
+    Sends `requests` requests with at most `concurrency` in flight.
+    :param send: Optional coroutine function `send(client, i)` issuing request number i itself,
+                 for payloads other than a GET or a posted text.
+    :return: Dict with throughput, latency percentiles (ms) and status code counts.
+    """
+    latencies = []
+    statuses = {}
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout) as client:
+        async def worker():
+            while not queue.empty():
+                i = queue.get_nowait()
+                start = time.perf_counter()
+                try:
+                    if send is not None:
+                        response = await send(client, i)
+                    elif text is not None:
+                        response = await client.post(path, data={'text': text})
+                    else:
+                        response = await client.get(path)
+                    status = response.status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                latencies.append((time.perf_counter() - start) * 1000)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'elapsed_s': round(elapsed, 3),
+        'requests_per_s': round(requests / elapsed, 1) if elapsed else None,
+        'mean_ms': round(statistics.mean(latencies), 1) if latencies else None,
+        'p50_ms': round(percentile(latencies, 50), 1) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95), 1) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99), 1) if latencies else None,
+        'statuses': statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test for the backend endpoints.")
+    parser.add_argument("--base-url", default="http://localhost:5000")
+    parser.add_argument("--path", default="/annuaire")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--text", help="POST this text as the `text` form field instead of sending GETs")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load(args.base_url, args.path, args.requests, args.concurrency, args.text))
+    for key, value in report.items():
+        print(f"{key:>15}: {value}")
+
+
+if __name__ == "__main__":
+    main()
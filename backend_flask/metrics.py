@@ -0,0 +1,141 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from a cached listing to a multi-chunk LLM extraction
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series["counts"]):
+                    le = _format_labels(self.labelnames, labels, [("le", repr(bound))])
+                    lines.append(f"{self.name}_bucket{le} {count}")
+                inf = _format_labels(self.labelnames, labels, [("le", "+Inf")])
+                lines.append(f"{self.name}_bucket{inf} {series['count']}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {series['sum']!r}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {series['count']}")
+        return lines
+
+
+REQUESTS_TOTAL = Counter(
+    "cassis_http_requests_total", "HTTP requests by endpoint, method and status.", ("endpoint", "method", "status")
+)
+REQUEST_SECONDS = Histogram(
+    "cassis_http_request_duration_seconds", "HTTP request latency by endpoint.", ("endpoint", "method")
+)
+STAGE_SECONDS = Histogram(
+    "cassis_stage_duration_seconds", "Time spent in each stage of a request.", ("endpoint", "stage")
+)
+ERRORS_TOTAL = Counter(
+    "cassis_stage_errors_total", "Stages that raised or returned an error.", ("endpoint", "stage")
+)
+
+METRICS = [REQUESTS_TOTAL, REQUEST_SECONDS, STAGE_SECONDS, ERRORS_TOTAL]
+
+# Callables returning [(name, type, help, [(labels dict, value), ...])] for values owned elsewhere (pools, caches)
+COLLECTORS = []
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for collector in COLLECTORS:
+        try:
+            samples = collector()
+        except Exception as e:
+            print(f"Error while collecting metrics: {e}")
+            continue
+        for name, metric_type, documentation, values in samples:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in values:
+                lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class StageTimer:
+    """
+    Times the stages of one request: each `with timer.stage("name")` block is observed in
+    the STAGE_SECONDS histogram and kept in `breakdown` (milliseconds) for the response.
+    """
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.breakdown = {}
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            ERRORS_TOTAL.inc(self.endpoint, name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            STAGE_SECONDS.observe(elapsed, self.endpoint, name)
+            self.breakdown[name] = round(self.breakdown.get(name, 0.0) + elapsed * 1000, 3)
+
+    def error(self, name):
+        ERRORS_TOTAL.inc(self.endpoint, name)
+
+    def summary(self):
+        return dict(self.breakdown, total=round((time.perf_counter() - self._started) * 1000, 3))
@@ -0,0 +1,219 @@
+"""
+Cache of the listing responses (GET /annuaire, GET /evenements) keyed on table and query string.
+
+Every table has a version counter, bumped after each committed write. A cached body is only
+served while the version it was built at is current, so a write invalidates every listing of
+its table at once. Writers also send a Postgres NOTIFY on CHANGES_CHANNEL inside their
+transaction; listen_for_changes bumps the counters of the other workers (and picks up
+scripts/load_table.py runs) when it is delivered at commit.
+
+Bodies are served with a strong ETag (hash of the uncompressed body) and `Cache-Control:
+no-cache`, so polling clients revalidate with If-None-Match and get a 304 without a body.
+Large bodies are compressed with gzip, or brotli when the optional `brotli` package is installed.
+"""
+import gzip
+import hashlib
+import os
+import select
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "true").lower() == "true"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+RESPONSE_CACHE_MAX_MB = float(os.getenv("RESPONSE_CACHE_MAX_MB", "256"))
+# Listen for the writes of other processes (several workers, bulk loads)
+RESPONSE_CACHE_LISTEN = os.getenv("RESPONSE_CACHE_LISTEN", "true").lower() == "true"
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+
+CHANGES_CHANNEL = "cassis_table_changes"
+NOTIFY_QUERY = "SELECT pg_notify('cassis_table_changes', %s)"
+LISTEN_RETRY_SECONDS = 5
+
+
+class TableVersions:
+    """Per-table write counters."""
+
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, table_name):
+        with self._lock:
+            return self._versions.setdefault(table_name, 0)
+
+    def bump(self, table_name=None):
+        """Bumps `table_name`, or every table when None (changes may have been missed)."""
+        with self._lock:
+            names = [table_name] if table_name is not None else list(self._versions)
+            for name in names:
+                self._versions[name] = self._versions.get(name, 0) + 1
+
+
+table_versions = TableVersions()
+
+
+def listen_for_changes(connect, versions=table_versions):
+    """
+    Bumps `versions` for each table named by a notification on CHANGES_CHANNEL. Runs forever,
+    meant for a daemon thread; reconnects after errors and then invalidates every table.
+    :param connect: Callable returning a new psycopg2 connection.
+    """
+    while True:
+        conn = None
+        try:
+            conn = connect()
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANGES_CHANNEL}")
+            versions.bump()
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    versions.bump(conn.notifies.pop(0).payload)
+        except Exception as e:
+            print(f"Error while listening for table changes: {e}")
+            time.sleep(LISTEN_RETRY_SECONDS)
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+
+def choose_encoding(accept_encoding):
+    """Best content coding of the Accept-Encoding header we can produce: br, gzip or None."""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    for encoding in (["br"] if brotli is not None else []) + ["gzip"]:
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match comparison, ignoring the W/ prefix and the content coding suffix."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    base = etag.strip('"')
+    for candidate in if_none_match.split(","):
+        tag = candidate.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag.strip('"').split("-", 1)[0] == base:
+            return True
+    return False
+
+
+class CachedBody:
+    """A response body with its ETag and its compressed variants, built on first request."""
+
+    def __init__(self, body, content_type):
+        self.body = body
+        self.content_type = content_type
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        return len(self.body) + sum(len(v) for v in self._encoded.values())
+
+    def encoded(self, encoding):
+        if encoding is None:
+            return self.body
+        with self._lock:
+            if encoding not in self._encoded:
+                self._encoded[encoding] = compress(self.body, encoding)
+            return self._encoded[encoding]
+
+    def respond(self, if_none_match, accept_encoding):
+        """
+        :return: Tuple (status, body, headers) answering a request with these headers:
+                 304 without a body when the client copy is current, 200 otherwise.
+        """
+        encoding = choose_encoding(accept_encoding) if len(self.body) >= COMPRESS_MIN_BYTES else None
+        etag = self.etag if encoding is None else f'{self.etag[:-1]}-{encoding}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(if_none_match, self.etag):
+            return 304, b"", headers
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return 200, self.encoded(encoding), headers
+
+
+class ResponseCache:
+    """LRU of CachedBody per key, each valid for one table version."""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES, max_bytes=int(RESPONSE_CACHE_MAX_MB * 1024 * 1024)):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key, version):
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None or cached[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return cached[1]
+
+    def put(self, key, version, body, content_type):
+        entry = CachedBody(body, content_type)
+        if len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            self._entries[key] = (version, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries or self._size() > self.max_bytes:
+                self._entries.popitem(last=False)
+        return entry
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def _size(self):
+        return sum(entry.size for _, entry in self._entries.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+            }
@@ -0,0 +1,150 @@
+import asyncio
+import os
+import re
+import threading
+from typing import List, Optional
+
+from pydantic import create_model
+
+from dedup_index import normalize
+
+# full: the whole entry schema in one call (previous behaviour)
+# core: only the CORE_FIELDS schema
+# two_pass: core schema first, then a second call for the optional fields the text hints at
+SCHEMA_MODE = os.getenv("LLM_SCHEMA_MODE", "full")
+
+# Identity and contact fields present in almost every source text
+CORE_FIELDS = {
+    "annuaire": ["nom", "prenom", "type_de_partenaire", "voie", "complement", "npa", "localite", "pays",
+                 "telephone", "portable", "courriel", "site_web"],
+}
+
+# Fields asked in the second pass only when one of their keywords appears in the text
+FIELD_HINTS = {
+    "annuaire": {
+        ("medecin", "medecin_intra_hospitalier"): r"m[ée]decin|docteur|\bdr\b|h[oô]pital|clinique",
+        ("activite_specialite",): r"sp[ée]cialit|activit[ée]|cabinet|th[ée]rap|soins",
+        ("horaires_ouverture",): r"horaire|ouvert|lundi|mardi|mercredi|jeudi|vendredi|samedi|\d{1,2}h\d{0,2}",
+        ("personnalite_juridique", "type_de_fournisseur"): r"\bs[àa]rl\b|\bsa\b|association|fondation|ind[ée]pendant|fournisseur",
+        ("besoin_convention", "type_de_convention", "date_convention_soumise", "date_convention_valide_recue"): r"convention",
+        ("coord_geo_nord", "coord_geo_est", "coord_geo_long", "coord_geo_lat"): r"\d+[.,]\d{4,}|coordonn|latitude|longitude|gps",
+        ("date_saisie", "date_derniere_modification", "date_dernier_appel_actualisation"): r"saisi|modifi|actualis",
+    },
+}
+
+# Fields used to line up the entries of the two passes
+KEY_FIELDS = {
+    "annuaire": ["nom", "prenom"],
+}
+
+TWO_PASS_PROMPT = (
+    "For each person or organisation in the following text, extract only the listed fields, "
+    "together with nom and prenom to identify them: {text_input}"
+)
+
+
+def supports_trimming(table_name):
+    return table_name in CORE_FIELDS
+
+
+def detect_fields(table_name, text):
+    """Optional fields whose keywords appear in `text`, in schema order."""
+    haystack = text.lower()
+    fields = []
+    for group, pattern in FIELD_HINTS[table_name].items():
+        if re.search(pattern, haystack):
+            fields.extend(group)
+    return fields
+
+
+def subset_model(entry_cls, fields, name):
+    """
+    Builds `{name}Entries` whose entries only carry `fields` of `entry_cls`, every one of them
+    optional, so the function-calling schema shrinks to what is asked for.
+    """
+    definitions = {field: (Optional[entry_cls.model_fields[field].annotation], None) for field in fields}
+    entry_model = create_model(f"{name}Entry", __doc__=entry_cls.__doc__, **definitions)
+    return create_model(f"{name}Entries", entries=(List[entry_model], ...))
+
+
+def _key(values, key_fields):
+    return tuple(normalize(values.get(field)) for field in key_fields)
+
+
+class TrimmedProgram:
+    """
+    Program with the interface of the full-schema one (returns `output_cls` instances) which
+    only asks the LLM for a reduced schema.
+
+    :param make_program: Callable (output_cls, prompt_template) -> program, used to build the
+                         core program and, lazily, one program per set of second-pass fields.
+    :param two_pass: Run the second pass for the optional fields detected in the text.
+    """
+
+    def __init__(self, table_name, output_cls, make_program, prompt_template, two_pass=True):
+        self.table_name = table_name
+        self.output_cls = output_cls
+        self.entry_cls = output_cls.model_fields["entries"].annotation.__args__[0]
+        self.make_program = make_program
+        self.two_pass = two_pass
+        self.key_fields = KEY_FIELDS[table_name]
+        self.core_program = make_program(
+            subset_model(self.entry_cls, CORE_FIELDS[table_name], f"{self.entry_cls.__name__}Core"),
+            prompt_template
+        )
+        self._detail_programs = {}
+        self._detail_programs_lock = threading.Lock()
+
+    def _detail_program(self, fields):
+        key = tuple(fields)
+        # Chunks are extracted from several threads at once
+        with self._detail_programs_lock:
+            if key not in self._detail_programs:
+                model = subset_model(self.entry_cls, self.key_fields + list(fields), f"{self.entry_cls.__name__}Detail")
+                self._detail_programs[key] = self.make_program(model, TWO_PASS_PROMPT)
+            return self._detail_programs[key]
+
+    def _fields_for(self, text_input):
+        if not self.two_pass:
+            return []
+        return [f for f in detect_fields(self.table_name, text_input) if f not in CORE_FIELDS[self.table_name]]
+
+    def _merge(self, core_result, detail_result):
+        details = {}
+        if detail_result is not None:
+            for entry in detail_result.entries:
+                values = entry.model_dump(exclude_none=True)
+                details.setdefault(_key(values, self.key_fields), values)
+
+        entries = []
+        for entry in core_result.entries:
+            values = dict.fromkeys(self.entry_cls.model_fields)
+            values.update(entry.model_dump())
+            for field, value in details.get(_key(values, self.key_fields), {}).items():
+                if values.get(field) in (None, ""):
+                    values[field] = value
+            for field, info in self.entry_cls.model_fields.items():
+                # Required text fields the LLM left out are stored empty, as with the full schema
+                if values[field] is None and info.annotation is str:
+                    values[field] = ""
+            entries.append(self.entry_cls(**values))
+        return self.output_cls(entries=entries)
+
+    def __call__(self, text_input, **kwargs):
+        fields = self._fields_for(text_input)
+        core_result = self.core_program(text_input=text_input, **kwargs)
+        detail_result = None
+        if fields and core_result.entries:
+            detail_result = self._detail_program(fields)(text_input=text_input, **kwargs)
+        return self._merge(core_result, detail_result)
+
+    async def acall(self, text_input, **kwargs):
+        fields = self._fields_for(text_input)
+        if not fields:
+            return self._merge(await self.core_program.acall(text_input=text_input, **kwargs), None)
+        # Both passes only depend on the text, run them concurrently
+        core_result, detail_result = await asyncio.gather(
+            self.core_program.acall(text_input=text_input, **kwargs),
+            self._detail_program(fields).acall(text_input=text_input, **kwargs),
+        )
+        return self._merge(core_result, detail_result)
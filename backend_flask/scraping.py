@@ -0,0 +1,122 @@
+import os
+import time
+import weakref
+from urllib.parse import urlparse
+
+SCRAPE_MODE = os.getenv("SCRAPE_MODE", "fast")
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+BLOCKED_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "facebook.net",
+    "hotjar.com", "matomo.cloud", "segment.io", "clarity.ms", "adservice.google.com",
+)
+DOM_QUIET_MS = int(os.getenv("SCRAPE_DOM_QUIET_MS", "300"))
+DOM_SETTLE_TIMEOUT_MS = int(os.getenv("SCRAPE_DOM_SETTLE_TIMEOUT_MS", "2000"))
+TOGGLE_BUDGET_MS = int(os.getenv("SCRAPE_TOGGLE_BUDGET_MS", "1500"))
+CONTENT_SELECTOR = os.getenv("SCRAPE_CONTENT_SELECTOR")
+TOGGLE_SELECTOR = "button, .toggle, [data-toggle]"
+
+# Resolves once no DOM mutation happened for `quiet` ms, or after `timeout` ms at the latest
+WAIT_FOR_DOM_SETTLED_JS = """
+([quiet, timeout]) => new Promise((resolve) => {
+    let timer = null;
+    const observer = new MutationObserver(() => {
+        clearTimeout(timer);
+        timer = setTimeout(done, quiet);
+    });
+    function done() {
+        observer.disconnect();
+        clearTimeout(deadline);
+        resolve(true);
+    }
+    const deadline = setTimeout(() => { observer.disconnect(); clearTimeout(timer); resolve(false); }, timeout);
+    observer.observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+    timer = setTimeout(done, quiet);
+})
+"""
+
+_pages_with_blocking = weakref.WeakSet()
+
+
+def _is_blocked(request):
+    if request.resource_type in BLOCKED_RESOURCE_TYPES:
+        return True
+    host = urlparse(request.url).hostname or ""
+    return any(host == blocked or host.endswith("." + blocked) for blocked in BLOCKED_HOSTS)
+
+
+async def _route_request(route):
+    if _is_blocked(route.request):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+async def install_resource_blocking(page):
+    """Aborts images, fonts, media and analytics requests; installed once per pooled page."""
+    if page not in _pages_with_blocking:
+        await page.route("**/*", _route_request)
+        _pages_with_blocking.add(page)
+
+
+async def wait_for_dom_settled(page, quiet_ms=DOM_QUIET_MS, timeout_ms=DOM_SETTLE_TIMEOUT_MS):
+    return await page.evaluate(WAIT_FOR_DOM_SETTLED_JS, [quiet_ms, timeout_ms])
+
+
+async def click_toggles(page, budget_ms=TOGGLE_BUDGET_MS):
+    """Clicks visible toggles to reveal hidden content until the time budget is spent."""
+    deadline = time.monotonic() + budget_ms / 1000
+    clicked = 0
+    for toggle in await page.query_selector_all(TOGGLE_SELECTOR):
+        remaining_ms = (deadline - time.monotonic()) * 1000
+        if remaining_ms <= 0:
+            break
+        try:
+            if await toggle.is_visible():
+                await toggle.click(timeout=min(remaining_ms, 500), no_wait_after=True)
+                clicked += 1
+        except Exception:
+            # Detached or covered elements are expected on busy pages
+            continue
+    return clicked
+
+
+async def fast_scrape(page, url, timings=None):
+    """
+    Loads `url` with heavy resources blocked, waits for the DOM to stop changing instead of
+    sleeping, reveals toggled content within a fixed budget and returns the visible text.
+    :param timings: Optional dict filled with the duration of each phase in milliseconds.
+    """
+    timings = {} if timings is None else timings
+    start = phase = time.monotonic()
+
+    def lap(name):
+        nonlocal phase
+        now = time.monotonic()
+        timings[name] = round((now - phase) * 1000, 1)
+        phase = now
+
+    await install_resource_blocking(page)
+    await page.goto(url, timeout=60000, wait_until="domcontentloaded")
+    lap("goto_ms")
+
+    await wait_for_dom_settled(page)
+    lap("settle_ms")
+
+    try:
+        if await click_toggles(page):
+            await wait_for_dom_settled(page)
+    except Exception as toggle_error:
+        print(f"Error clicking toggles: {toggle_error}")
+    lap("toggles_ms")
+
+    if CONTENT_SELECTOR:
+        try:
+            await page.wait_for_selector(CONTENT_SELECTOR, timeout=DOM_SETTLE_TIMEOUT_MS)
+        except Exception as wait_error:
+            print(f"Content not found in time: {wait_error}")
+        lap("content_ms")
+
+    content = await page.evaluate("() => document.body.innerText")
+    lap("extract_ms")
+    timings["total_ms"] = round((time.monotonic() - start) * 1000, 1)
+    return content
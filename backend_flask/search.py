@@ -0,0 +1,197 @@
+import math
+import re
+
+from listing import ListingError, decode_cursor, encode_cursor, parse_fields, parse_filters, parse_limit
+from tables import TABLE_COLUMNS, INDEXED_COLUMNS
+
+# Text search configuration: French stemming and stop words
+SEARCH_CONFIG = "french"
+MAX_QUERY_LENGTH = 200
+
+# Searched columns and their weight in the ranking, A being the strongest
+SEARCH_COLUMNS = {
+    "annuaire": [("nom", "A"), ("prenom", "A"), ("localite", "B"), ("activite_specialite", "C")],
+    "evenement": [("nom_evenement", "A"), ("titre_evenement", "A"), ("court_descriptif", "B"), ("texte_libre", "C")],
+}
+
+# Nearest-partner search: a GiST index on the (longitude, latitude) point answers the bounding
+# box of the search radius, the exact great-circle distance is only computed inside it
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.195
+DEFAULT_RADIUS_KM = 10.0
+MAX_RADIUS_KM = 500.0
+GEO_POINT = "point(coord_geo_long::float8, coord_geo_lat::float8)"
+GEO_PREDICATE = "coord_geo_lat IS NOT NULL AND coord_geo_long IS NOT NULL"
+
+
+def search_vector(table_name):
+    """tsvector expression of the search index; queries repeat it verbatim so the index is used."""
+    return " || ".join(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce({column}, '')), '{weight}')"
+        for column, weight in SEARCH_COLUMNS[table_name]
+    )
+
+
+# Created by scripts/load_table.py with the other indexes
+SEARCH_INDEXES = {
+    table_name: f"CREATE INDEX IF NOT EXISTS idx_{table_name}_search ON {table_name} USING gin (({search_vector(table_name)}));"
+    for table_name in SEARCH_COLUMNS
+}
+GEO_INDEX = f"CREATE INDEX IF NOT EXISTS idx_annuaire_geo ON annuaire USING gist (({GEO_POINT})) WHERE {GEO_PREDICATE};"
+
+
+def _parse_float(args, name, low, high, default=None):
+    value = args.get(name)
+    if value in (None, ""):
+        if default is None:
+            raise ListingError(f"'{name}' is required.")
+        return default
+    try:
+        number = float(value)
+    except ValueError:
+        raise ListingError(f"'{name}' must be a number.")
+    if not low <= number <= high:
+        raise ListingError(f"'{name}' must be between {low:g} and {high:g}.")
+    return number
+
+
+def _parse_filters(table_name, args):
+    # Same equality filters on the indexed columns as the listing endpoints, checked against the column types
+    return parse_filters(table_name, args, [c for c in INDEXED_COLUMNS[table_name] if c != "numero"])
+
+
+def _parse_after(args):
+    if not args.get("after"):
+        return None
+    last_key, last_numero = decode_cursor(args["after"])
+    if not isinstance(last_key, (int, float)) or not isinstance(last_numero, int):
+        raise ListingError("Invalid 'after' cursor.")
+    return last_key, last_numero
+
+
+def parse_search_args(table_name, args):
+    """
+    Validates a full-text search request, e.g. ?q=physiothérapie lausanne&limit=20.
+    `q` follows the web search syntax ("quoted phrase", -excluded, or); with prefix=true every
+    word is matched as a prefix instead, for search-as-you-type.
+    :return: Dict of options consumed by build_search_query.
+    """
+    text = (args.get("q") or "").strip()
+    if not text:
+        raise ListingError("'q' is required.")
+    if len(text) > MAX_QUERY_LENGTH:
+        raise ListingError(f"'q' must be at most {MAX_QUERY_LENGTH} characters.")
+
+    prefix = args.get("prefix", "false").lower() == "true"
+    if prefix:
+        words = re.findall(r"\w+", text)
+        if not words:
+            raise ListingError("'q' must contain at least one word.")
+        text = " & ".join(f"{word}:*" for word in words)
+
+    return {
+        "text": text,
+        "prefix": prefix,
+        "limit": parse_limit(args),
+        "fields": parse_fields(table_name, args),
+        "filters": _parse_filters(table_name, args),
+        "after": _parse_after(args),
+    }
+
+
+def parse_nearby_args(args):
+    """
+    Validates a nearest-partner request, e.g. ?lat=46.52&lon=6.63&radius_km=5.
+    :return: Dict of options consumed by build_nearby_query.
+    """
+    return {
+        "lat": _parse_float(args, "lat", -90, 90),
+        "lon": _parse_float(args, "lon", -180, 180),
+        "radius_km": _parse_float(args, "radius_km", 0, MAX_RADIUS_KM, DEFAULT_RADIUS_KM),
+        "limit": parse_limit(args),
+        "fields": parse_fields("annuaire", args),
+        "filters": _parse_filters("annuaire", args),
+        "after": _parse_after(args),
+    }
+
+
+def _select(table_name, options):
+    if not options["fields"]:
+        return list(TABLE_COLUMNS[table_name])
+    return ["numero"] + [f for f in options["fields"] if f != "numero"]
+
+
+def _filter_conditions(options):
+    return [f"{column} = %s" for column in options["filters"]], list(options["filters"].values())
+
+
+def build_search_query(table_name, options):
+    """
+    Ranked full-text search: rows matching the query through the GIN index, best ts_rank_cd
+    first, then keyset-paginated on (rank, numero). One extra row tells whether a next page exists.
+    """
+    vector = search_vector(table_name)
+    to_tsquery = "to_tsquery" if options["prefix"] else "websearch_to_tsquery"
+    conditions, params = _filter_conditions(options)
+    conditions.insert(0, f"({vector}) @@ q.query")
+
+    outer = ""
+    if options["after"] is not None:
+        outer = " WHERE (rank < %s::real OR (rank = %s::real AND numero > %s))"
+    query = (
+        f"SELECT * FROM ("
+        f"SELECT {', '.join(_select(table_name, options))}, ts_rank_cd({vector}, q.query) AS rank "
+        f"FROM {table_name}, {to_tsquery}('{SEARCH_CONFIG}', %s) AS q(query) "
+        f"WHERE {' AND '.join(conditions)}"
+        f") AS matches{outer} ORDER BY rank DESC, numero LIMIT %s"
+    )
+    params = [options["text"]] + params
+    if options["after"] is not None:
+        last_rank, last_numero = options["after"]
+        params += [last_rank, last_rank, last_numero]
+    return query, params + [options["limit"] + 1]
+
+
+def build_nearby_query(options):
+    """
+    Partners within `radius_km` of (lat, lon), nearest first, keyset-paginated on (distance, numero).
+    The bounding box of the radius is answered by the GiST index on GEO_POINT.
+    """
+    lat, lon, radius = options["lat"], options["lon"], options["radius_km"]
+    delta_lat = radius / KM_PER_DEGREE
+    # Degrees of longitude shrink with the latitude; near the poles the box spans every longitude
+    cos_lat = math.cos(math.radians(min(abs(lat) + delta_lat, 90)))
+    delta_lon = 180 if cos_lat < 1e-6 else min(180, radius / (KM_PER_DEGREE * cos_lat))
+
+    distance = (
+        f"2 * {EARTH_RADIUS_KM} * asin(least(1, sqrt("
+        "power(sin(radians(coord_geo_lat::float8 - origin.lat) / 2), 2) + "
+        "cos(radians(origin.lat)) * cos(radians(coord_geo_lat::float8)) * "
+        "power(sin(radians(coord_geo_long::float8 - origin.lon) / 2), 2))))"
+    )
+    conditions, params = _filter_conditions(options)
+    conditions[:0] = [GEO_PREDICATE, f"{GEO_POINT} <@ box(point(%s, %s), point(%s, %s))"]
+
+    outer = "distance_km <= %s"
+    if options["after"] is not None:
+        outer += " AND (distance_km > %s OR (distance_km = %s AND numero > %s))"
+    query = (
+        f"SELECT * FROM ("
+        f"SELECT {', '.join(_select('annuaire', options))}, {distance} AS distance_km "
+        f"FROM annuaire, (SELECT %s::float8 AS lat, %s::float8 AS lon) AS origin "
+        f"WHERE {' AND '.join(conditions)}"
+        f") AS nearby WHERE {outer} ORDER BY distance_km, numero LIMIT %s"
+    )
+    params = [lat, lon, lon - delta_lon, lat - delta_lat, lon + delta_lon, lat + delta_lat] + params + [radius]
+    if options["after"] is not None:
+        last_distance, last_numero = options["after"]
+        params += [last_distance, last_distance, last_numero]
+    return query, params + [options["limit"] + 1]
+
+
+def next_search_cursor(rows, column_names, options, key):
+    """Cursor of the last row of the page, on `key` (rank or distance_km) and numero."""
+    if len(rows) <= options["limit"]:
+        return None
+    last = dict(zip(column_names, rows[options["limit"] - 1]))
+    return encode_cursor([last[key], last["numero"]])
@@ -0,0 +1,132 @@
+"""
+JSON encoding of the listing rows without Flask's jsonify.
+
+jsonify turns every row into a dict, sorts its keys and calls the provider's `default`
+hook, in Python, for each Decimal and date value. RowSerializer instead looks at the
+cursor description once, converts only the NUMERIC/date/time columns of each tuple, and
+hands plain lists and strings to orjson (JSON_BACKEND=orjson, used by default when the
+package is installed) or to the C encoder of the json module. Values are rendered as
+jsonify did (Decimal as a string, dates as HTTP dates, keys sorted) so clients see the same
+data; TIME columns, which jsonify could not encode, are rendered in ISO format.
+"""
+import functools
+import json
+import os
+from datetime import date, datetime, time
+from decimal import Decimal
+from operator import itemgetter
+
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# auto: orjson when installed, stdlib json otherwise
+JSON_BACKEND = os.getenv("JSON_BACKEND", "auto")
+
+# PostgreSQL type OIDs of the columns that are not JSON types once fetched
+NUMERIC_OID = 1700
+DATE_OID = 1082
+TIME_OID = 1083
+TIMESTAMP_OID = 1114
+TIMESTAMPTZ_OID = 1184
+TIMETZ_OID = 1266
+
+
+@functools.lru_cache(maxsize=8192)
+def _http_date(value):
+    # The same few dates (saisie, modification) come back on most rows
+    return http_date(value)
+
+
+COLUMN_ENCODERS = {
+    NUMERIC_OID: str,
+    DATE_OID: _http_date,
+    TIMESTAMP_OID: http_date,
+    TIMESTAMPTZ_OID: http_date,
+    TIME_OID: time.isoformat,
+    TIMETZ_OID: time.isoformat,
+}
+
+
+def json_fallback(value):
+    """Values of types not listed in COLUMN_ENCODERS (arrays of numerics, computed columns)."""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return http_date(value)
+    if isinstance(value, time):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if JSON_BACKEND == "orjson" and orjson is None:
+    print("JSON_BACKEND=orjson but the 'orjson' package is not installed, using the json module.")
+
+
+def use_orjson(backend=JSON_BACKEND):
+    return orjson is not None and backend in ("auto", "orjson")
+
+
+def dumps(obj, backend=JSON_BACKEND):
+    """Compact UTF-8 JSON bytes of `obj`."""
+    if use_orjson(backend):
+        return orjson.dumps(obj, default=json_fallback)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=json_fallback).encode()
+
+
+class RowSerializer:
+    """
+    Converts the rows of one query result, built from its cursor description.
+    :param description: `cursor.description` of psycopg2 or psycopg 3.
+    """
+
+    def __init__(self, description, backend=JSON_BACKEND):
+        self.columns = [column.name for column in description]
+        self.encoders = [(i, COLUMN_ENCODERS[column.type_code]) for i, column in enumerate(description)
+                         if column.type_code in COLUMN_ENCODERS]
+        self.backend = backend
+        # Records keep the sorted keys of jsonify
+        order = sorted(range(len(self.columns)), key=self.columns.__getitem__)
+        self.keys = [self.columns[i] for i in order]
+        if len(order) == 1:
+            self.reorder = lambda values, i=order[0]: (values[i],)
+        else:
+            self.reorder = itemgetter(*order)
+
+    def values(self, rows):
+        """Rows as lists in column order, with every value JSON serializable."""
+        encoders = self.encoders
+        if not encoders:
+            return [list(row) for row in rows]
+        converted = []
+        for row in rows:
+            values = list(row)
+            for i, encode in encoders:
+                value = values[i]
+                if value is not None:
+                    values[i] = encode(value)
+            converted.append(values)
+        return converted
+
+    def records(self, rows):
+        keys = self.keys
+        reorder = self.reorder
+        return [dict(zip(keys, reorder(values))) for values in self.values(rows)]
+
+    def listing(self, rows, listing_format="records"):
+        """The rows as `records` (list of objects) or `columnar` ({"columns", "rows"})."""
+        if listing_format == "columnar":
+            return {"columns": self.columns, "rows": self.values(rows)}
+        return self.records(rows)
+
+    def page(self, rows, listing_format="records", **fields):
+        """Paginated body: the rows under `entries` (or `columns`/`rows`) next to `fields`, keys sorted."""
+        listing = self.listing(rows, listing_format)
+        body = dict(fields, **(listing if listing_format == "columnar" else {"entries": listing}))
+        return dict(sorted(body.items()))
+
+    def dumps(self, obj):
+        return dumps(obj, self.backend)
@@ -0,0 +1,133 @@
+"""
+Microbenchmark of the listing serialization: the previous jsonify path against RowSerializer
+with each JSON backend and body format, on synthetic annuaire rows, e.g.
+
+    python serialization_benchmark.py --rows 100000 --runs 5
+
+No database is needed, rows are built as psycopg2 returns them (Decimal coordinates, date
+columns). Every path is checked to decode to the same data as jsonify before being timed.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+from decimal import Decimal
+
+from flask import Flask, jsonify
+
+import serialization
+from serialization import RowSerializer
+from tables import TABLE_COLUMNS, BOOLEAN_COLUMNS, INTEGER_COLUMNS, FLOAT_COLUMNS, DATE_COLUMNS
+
+Column = namedtuple("Column", ["name", "type_code"])
+
+TYPE_CODES = {"bool": 16, "int": 23, "numeric": serialization.NUMERIC_OID, "date": serialization.DATE_OID,
+              "text": 1043}
+
+
+def column_type(table_name, column):
+    if column in BOOLEAN_COLUMNS[table_name]:
+        return "bool"
+    if column in INTEGER_COLUMNS[table_name]:
+        return "int"
+    if column in FLOAT_COLUMNS[table_name]:
+        return "numeric"
+    if column in DATE_COLUMNS[table_name]:
+        return "date"
+    return "text"
+
+
+def synthetic_rows(table_name, count, seed=0):
+    """Rows shaped like the fetchall() of `SELECT * FROM table_name`, with a few NULLs."""
+    rng = random.Random(seed)
+    types = [column_type(table_name, column) for column in TABLE_COLUMNS[table_name]]
+    start = date(2020, 1, 1)
+    rows = []
+    for n in range(count):
+        row = []
+        for column, kind in zip(TABLE_COLUMNS[table_name], types):
+            if column != "numero" and rng.random() < 0.15:
+                row.append(None)
+            elif kind == "bool":
+                row.append(rng.random() < 0.5)
+            elif kind == "int":
+                row.append(n + 1 if column == "numero" else rng.randint(1000, 9999))
+            elif kind == "numeric":
+                row.append(Decimal(f"{rng.uniform(45.8, 47.8):.6f}"))
+            elif kind == "date":
+                row.append(start + timedelta(days=rng.randint(0, 1500)))
+            else:
+                row.append(f"{column.replace('_', ' ').capitalize()} {rng.randint(1, 5000)} é")
+        rows.append(tuple(row))
+    description = [Column(column, TYPE_CODES[kind]) for column, kind in zip(TABLE_COLUMNS[table_name], types)]
+    return rows, description
+
+
+def time_runs(function, runs):
+    timings = []
+    body = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        body = function()
+        timings.append(time.perf_counter() - start)
+    return timings, body
+
+
+def run(table_name, count, runs):
+    rows, description = synthetic_rows(table_name, count)
+    app = Flask(__name__)
+
+    def legacy():
+        column_names = [desc[0] for desc in description]
+        with app.app_context():
+            return jsonify([dict(zip(column_names, row)) for row in rows]).get_data()
+
+    paths = {"jsonify (previous)": legacy}
+    backends = ["json"] + (["orjson"] if serialization.orjson is not None else [])
+    for backend in backends:
+        for listing_format in ("records", "columnar"):
+            def fast(backend=backend, listing_format=listing_format):
+                serializer = RowSerializer(description, backend=backend)
+                return serializer.dumps(serializer.listing(rows, listing_format))
+            paths[f"{backend} {listing_format}"] = fast
+
+    expected = json.loads(legacy())
+    results = []
+    for name, function in paths.items():
+        timings, body = time_runs(function, runs)
+        decoded = json.loads(body)
+        if isinstance(decoded, dict):
+            decoded = [dict(zip(decoded["columns"], values)) for values in decoded["rows"]]
+        if decoded != expected:
+            raise AssertionError(f"{name} does not produce the same data as jsonify")
+        results.append({
+            "path": name,
+            "median_ms": round(statistics.median(timings) * 1000, 1),
+            "rows_per_s": round(count / statistics.median(timings)),
+            "bytes": len(body),
+        })
+
+    baseline = results[0]["median_ms"]
+    for result in results:
+        result["speedup"] = round(baseline / result["median_ms"], 2) if result["median_ms"] else None
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the serialization paths of the listing endpoints.")
+    parser.add_argument("--table", choices=sorted(TABLE_COLUMNS), default="annuaire")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'path':<20} {'median ms':>10} {'rows/s':>10} {'bytes':>12} {'speedup':>8}")
+    for result in run(args.table, args.rows, args.runs):
+        print(f"{result['path']:<20} {result['median_ms']:>10} {result['rows_per_s']:>10} "
+              f"{result['bytes']:>12} {result['speedup']:>8}")
+
+
+if __name__ == "__main__":
+    main()
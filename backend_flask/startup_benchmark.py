@@ -0,0 +1,69 @@
+"""
+Measures the cold start of a worker: the time a fresh interpreter takes to import the app,
+and which heavy dependencies that import pulled in, e.g.
+
+    python startup_benchmark.py --runs 10
+    python startup_benchmark.py --module asgi
+
+Each run is a new process, so nothing is shared through the OS page cache beyond what a
+real worker restart would see. Run it on two revisions to compare them.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Modules that are expensive to import and should only be loaded on first use
+HEAVY_MODULES = ["pandas", "numpy", "playwright", "llama_index", "openai", "tiktoken", "openpyxl", "xlsxwriter"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"import_s": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module, runs, env=None):
+    """
+    :return: Dict with the min/median/max import time in seconds over `runs` fresh processes
+             and the heavy modules found in sys.modules after the import.
+    """
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    timings = []
+    loaded = []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=backend_dir, env=dict(os.environ, **(env or {})), capture_output=True, text=True
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{completed.stderr}")
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        timings.append(result["import_s"])
+        loaded = result["loaded"]
+    return {
+        "module": module,
+        "runs": runs,
+        "min_s": round(min(timings), 4),
+        "median_s": round(statistics.median(timings), 4),
+        "max_s": round(max(timings), 4),
+        "heavy_modules_loaded": loaded,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the import time of the backend in fresh processes.")
+    parser.add_argument("--module", default="app", help="Module to import (app or asgi)")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    report = measure(args.module, args.runs)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
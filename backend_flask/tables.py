@@ -0,0 +1,107 @@
+# Column metadata for the tables exposed by the Flask API.
+# Column names are interpolated into SQL, so every user supplied identifier must be
+# checked against these lists first.
+
+TABLE_COLUMNS = {
+    "annuaire": [
+        "numero", "type_de_partenaire", "personnalite_juridique", "type_de_fournisseur",
+        "nom", "prenom", "voie", "complement", "npa", "localite", "pays", "telephone",
+        "portable", "courriel", "site_web", "activite_specialite", "medecin",
+        "medecin_intra_hospitalier", "horaires_ouverture", "coord_geo_nord", "coord_geo_est",
+        "coord_geo_long", "coord_geo_lat", "besoin_convention", "type_de_convention",
+        "date_convention_soumise", "date_convention_valide_recue", "date_derniere_modification",
+        "date_saisie", "date_dernier_appel_actualisation", "date_derniere_modif",
+    ],
+    "evenement": [
+        "numero", "nom_evenement", "titre_evenement", "date_debut", "date_fin",
+        "horaire_debut", "horaire_fin", "texte_libre", "court_descriptif", "numero_partenaire",
+        "nom_partenaire", "partenaire_de_la_selection", "sites_originaux", "date_creation",
+        "mode_creation", "date_derniere_modification", "mode_modification",
+        "id_dernier_modificateur", "date_de_peremption",
+    ],
+}
+
+# Columns backed by a B-tree index (CREATE_INDEXES in scripts/load_table.py), the only ones
+# the listing endpoints allow to filter and sort on.
+INDEXED_COLUMNS = {
+    "annuaire": ["numero", "nom", "localite", "npa", "type_de_partenaire", "date_derniere_modification"],
+    "evenement": ["numero", "nom_evenement", "date_debut", "numero_partenaire", "date_derniere_modification"],
+}
+
+# French spreadsheet headers used by the exports of the original directory,
+# mapped to the table columns (also used by the bulk loader, scripts/load_table.py).
+HEADER_MAPPINGS = {
+    "annuaire": {
+        "Numéro": "numero",
+        "Type de partenaire": "type_de_partenaire",
+        "Personnalité juridique": "personnalite_juridique",
+        "Type de fournisseur": "type_de_fournisseur",
+        "Nom": "nom",
+        "Prénom": "prenom",
+        "Voie": "voie",
+        "Complément": "complement",
+        "NPA": "npa",
+        "Localité": "localite",
+        "Pays": "pays",
+        "N° de téléphone": "telephone",
+        "N° de portable": "portable",
+        "Courriel": "courriel",
+        "Site web": "site_web",
+        "Activité et éventuelle(s) spécialité(s)": "activite_specialite",
+        "Médecin": "medecin",
+        "Médecin intra-hospitalier": "medecin_intra_hospitalier",
+        "Horaires d’ouverture": "horaires_ouverture",
+        "Coordonnées de géolocalisation long.": "coord_geo_long",
+        "Coordonnées de géolocalisation lat.": "coord_geo_lat",
+        "Coordonnées de géolocalisation Nord": "coord_geo_nord",
+        "Coordonnées de géolocalisation Est": "coord_geo_est",
+        "Besoin d'une convention": "besoin_convention",
+        "Type de convention": "type_de_convention",
+        "Date convention soumise": "date_convention_soumise",
+        "Date convention valide reçue": "date_convention_valide_recue",
+        "Date dernière modification": "date_derniere_modification",
+        "Date de saisie": "date_saisie",
+        "Date du dernier appel à actualisation des données": "date_dernier_appel_actualisation",
+        "Date de dernière modification": "date_derniere_modif",
+    },
+    "evenement": {
+        "Numéro": "numero",
+        "Nom événement": "nom_evenement",
+        "Titre de l'événement": "titre_evenement",
+        "Date de début": "date_debut",
+        "Date de fin": "date_fin",
+        "Horaire début": "horaire_debut",
+        "Horaire fin": "horaire_fin",
+        "Texte libre": "texte_libre",
+        "Court descriptif": "court_descriptif",
+        "Numéro partenaire": "numero_partenaire",
+        "Nom partenaire (organisateur)": "nom_partenaire",
+        "Partenaire de la sélection": "partenaire_de_la_selection",
+        "Sites originaux": "sites_originaux",
+        "Date de création": "date_creation",
+        "Mode de création": "mode_creation",
+        "Date de dernière modification": "date_derniere_modification",
+        "Mode de modification": "mode_modification",
+        "Id dernier modificateur": "id_dernier_modificateur",
+        "Date de péremption": "date_de_peremption",
+    },
+}
+
+# Column types needed to convert spreadsheet values without the LLM
+BOOLEAN_COLUMNS = {
+    "annuaire": ["medecin", "medecin_intra_hospitalier", "besoin_convention"],
+    "evenement": [],
+}
+INTEGER_COLUMNS = {
+    "annuaire": ["numero", "npa"],
+    "evenement": ["numero", "numero_partenaire"],
+}
+FLOAT_COLUMNS = {
+    "annuaire": ["coord_geo_nord", "coord_geo_est", "coord_geo_long", "coord_geo_lat"],
+    "evenement": [],
+}
+DATE_COLUMNS = {
+    "annuaire": ["date_convention_soumise", "date_convention_valide_recue", "date_derniere_modification",
+                 "date_saisie", "date_dernier_appel_actualisation", "date_derniere_modif"],
+    "evenement": ["date_debut", "date_fin", "date_creation", "date_derniere_modification", "date_de_peremption"],
+}
@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+CHECK = """
+import threading
+import app, asgi
+assert threading.active_count() == 1, [t.name for t in threading.enumerate()]
+assert app.db_pool.stats()['idle'] == 0 and app.extraction_cache is None and app.job_queue is None
+"""
+
+
+def test_importing_the_app_starts_nothing(tmp_path):
+    env = dict(os.environ, JOB_DB_PATH=str(tmp_path / "jobs.sqlite3"), LLM_CACHE_PATH=str(tmp_path / "cache.sqlite3"),
+               DUPLICATE_BACKEND="memory", RESPONSE_CACHE="true", RESPONSE_CACHE_LISTEN="true",
+               DB_HOST="127.0.0.1", DB_PORT="1")
+    result = subprocess.run([sys.executable, "-c", CHECK], cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from browser_pool import BrowserPool
+from scraping import fast_scrape
+
+pytest.importorskip("playwright")
+
+PAGES = {
+    "static.html": "<html><body><h1>Cabinet Favre</h1><p>Rue du Lac 12, 1006 Lausanne</p></body></html>",
+    # Content added by JavaScript after the DOM is loaded, and an image that is blocked
+    "dynamic.html": """<html><body><div id="list"></div><img src="photo.png">
+        <script>
+        setTimeout(() => {
+            document.getElementById("list").innerText = "Pharmacie du Centre, 1003 Lausanne";
+        }, 100);
+        </script></body></html>""",
+    "toggle.html": """<html><body><button onclick="document.getElementById('more').hidden = false">Plus</button>
+        <div id="more" hidden>Horaires: lundi 8h-12h</div></body></html>""",
+}
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = BrowserPool(max_pages=2, max_uses=3)
+    try:
+        pool.scrape("about:blank", lambda page, url: asyncio.sleep(0), timeout=60)
+    except Exception as e:
+        pool.close()
+        pytest.skip(f"Chromium cannot be launched: {e}")
+    yield pool
+    pool.close()
+
+
+def test_scrape_returns_body_text(pool, serve_files):
+    base_url = serve_files(PAGES)
+    text = pool.scrape(f"{base_url}/static.html")
+    assert "Cabinet Favre" in text
+    assert "1006 Lausanne" in text
+
+
+def test_fast_scrape_waits_for_rendered_content(pool, serve_files):
+    base_url = serve_files(PAGES)
+    timings = {}
+    text = pool.scrape(f"{base_url}/dynamic.html", lambda page, url: fast_scrape(page, url, timings))
+    assert "Pharmacie du Centre" in text
+    assert {"goto_ms", "settle_ms", "toggles_ms", "extract_ms", "total_ms"} <= set(timings)
+
+
+def test_fast_scrape_reveals_toggled_content(pool, serve_files):
+    base_url = serve_files(PAGES)
+    text = pool.scrape(f"{base_url}/toggle.html", fast_scrape)
+    assert "lundi 8h-12h" in text
+
+
+def test_concurrent_scrapes_share_the_pool(pool, serve_files):
+    base_url = serve_files(PAGES)
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        texts = list(executor.map(lambda i: pool.scrape(f"{base_url}/static.html"), range(12)))
+    assert all("Cabinet Favre" in text for text in texts)
+    assert pool.stats()["idle_pages"] <= pool.max_pages
+
+
+def test_timeout_cancels_the_scrape_and_frees_its_page(pool, serve_files):
+    base_url = serve_files(PAGES)
+    cancelled = threading.Event()
+
+    async def hang(page, url):
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    for _ in range(pool.max_pages):
+        with pytest.raises(TimeoutError):
+            pool.scrape(f"{base_url}/static.html", hang, timeout=0.5)
+    assert cancelled.is_set()
+    # Every page was released, the next scrape does not wait for the hung ones
+    assert "Cabinet Favre" in pool.scrape(f"{base_url}/static.html", timeout=30)
@@ -0,0 +1,124 @@
+import io
+import json
+from typing import List, Optional
+
+import pandas as pd
+from pydantic import BaseModel
+
+from column_mapping import convert_frame, frame_to_entries, map_headers, merge_llm_fields
+from extraction import FakeProgram
+
+
+class Entry(BaseModel):
+    numero: Optional[int]
+    nom: str
+    prenom: str
+    npa: Optional[int]
+    localite: Optional[str]
+    telephone: Optional[str]
+    medecin: Optional[bool]
+    coord_geo_lat: Optional[float]
+    date_saisie: Optional[str]
+
+
+class Entries(BaseModel):
+    entries: List[Entry]
+
+
+def read_csv(text):
+    # Same options as the upload parsing in app.py
+    return pd.read_csv(io.StringIO(text), dtype=str)
+
+
+def test_map_headers_matches_labels_column_names_and_typos():
+    headers = ["Nom", "Prénom", "NPA ", "localite", "N° de telephone", "Unnamed: 0", "Remarque"]
+    mapping, unmapped = map_headers("annuaire", headers)
+    assert mapping == {"Nom": "nom", "Prénom": "prenom", "NPA ": "npa", "localite": "localite",
+                       "N° de telephone": "telephone"}
+    assert unmapped == ["Remarque"]
+
+
+def test_map_headers_maps_a_column_once():
+    mapping, unmapped = map_headers("annuaire", ["Nom", "nom"])
+    assert mapping == {"Nom": "nom"}
+    assert unmapped == ["nom"]
+
+
+def test_convert_frame_reads_day_first_dates():
+    df = pd.DataFrame({"date_saisie": ["2024-06-01", "2024-06-01 00:00:00", "03.04.2024", "03/04/2024",
+                                       "1.6.24", "", None]})
+    records, invalid = convert_frame("annuaire", df)
+    assert [r["date_saisie"] for r in records] == ["2024-06-01", "2024-06-01", "2024-04-03", "2024-04-03",
+                                                   "2024-06-01", None, None]
+    assert invalid == [{}] * 7
+
+
+def test_convert_frame_reports_unparsable_values():
+    df = pd.DataFrame({"nom": ["Favre", "Rochat"], "date_saisie": ["31.02.2024", "01.06.2024"],
+                       "npa": ["abc", "1000"], "medecin": ["peut-être", "oui"]})
+    records, invalid = convert_frame("annuaire", df)
+    assert invalid == [{"date_saisie": "31.02.2024", "npa": "abc", "medecin": "peut-être"}, {}]
+    assert records[1] == {"nom": "Rochat", "date_saisie": "2024-06-01", "npa": 1000, "medecin": True}
+
+
+def test_convert_frame_types_booleans_numbers_and_blanks():
+    df = pd.DataFrame({"medecin": ["Oui", " non", "1", None], "npa": ["1000", "1003.0", None, ""],
+                       "coord_geo_lat": ["46.52", None, "46", "7"], "telephone": [21000000.0, None, 22.0, 1.5],
+                       "localite": [" Lausanne ", None, float("nan"), "Vevey"]})
+    records, invalid = convert_frame("annuaire", df)
+    assert [r["medecin"] for r in records] == [True, False, True, None]
+    assert [r["npa"] for r in records] == [1000, 1003, None, None]
+    assert [r["coord_geo_lat"] for r in records] == [46.52, None, 46.0, 7.0]
+    # Whole floats lose the ".0" added by pandas only when the whole column is integral
+    assert [r["telephone"] for r in records] == ["21000000.0", None, "22.0", "1.5"]
+    assert [r["localite"] for r in records] == ["Lausanne", None, None, "Vevey"]
+    assert invalid == [{}] * 4
+
+
+def test_frame_to_entries_reports_rejected_rows():
+    df = read_csv("Nom,Prénom,NPA,Date de saisie\n"
+                  "Favre,Anne,1000,01.06.2024\n"
+                  "Rochat,Luc,abc,01.06.2024\n"
+                  "Muller,Eva,1003,31/02/2024\n")
+    entries, leftovers, rejected = frame_to_entries("annuaire", df, Entry)
+    assert [e.nom for e in entries] == ["Favre"]
+    assert entries[0].date_saisie == "2024-06-01"
+    assert leftovers == []
+    assert rejected == [{"line": 3, "error": "invalid value for npa ('abc')"},
+                        {"line": 4, "error": "invalid value for date_saisie ('31/02/2024')"}]
+
+
+def test_frame_to_entries_needs_the_required_columns():
+    assert frame_to_entries("annuaire", read_csv("Prénom,NPA\nAnne,1000\n"), Entry) is None
+
+
+def test_frame_to_entries_keeps_unmapped_columns_for_the_llm():
+    df = read_csv("Nom,Prénom,Remarque\nFavre,Anne,tel 021 000 00 00\nRochat,Luc,\n")
+    entries, leftovers, rejected = frame_to_entries("annuaire", df, Entry)
+    assert [e.nom for e in entries] == ["Favre", "Rochat"]
+    assert leftovers == [(0, {"nom": "Favre", "prenom": "Anne", "Remarque": "tel 021 000 00 00"})]
+    assert rejected == []
+
+    llm_entries = [Entry(numero=None, nom="Favre", prenom="Anne", npa=None, localite=None,
+                         telephone="021 000 00 00", medecin=None, coord_geo_lat=None, date_saisie=None)]
+    assert merge_llm_fields(entries, leftovers, llm_entries) == 1
+    assert entries[0].telephone == "021 000 00 00"
+    assert merge_llm_fields(entries, leftovers, []) == 0
+
+
+def test_frame_to_entries_matches_the_llm_path():
+    text = ("numero,nom,prenom,npa,localite,telephone,medecin,coord_geo_lat,date_saisie\n"
+            ",Favre,Anne,1000,Lausanne,021 000 00 00,true,46.52,2024-06-01\n"
+            ",Rochat,,1800,,0790000000,false,,\n"
+            ",Muller,Eva,,Vevey,,,46.46,2023-12-31\n")
+    df = read_csv(text)
+    entries, leftovers, rejected = frame_to_entries("annuaire", df, Entry)
+    assert leftovers == [] and rejected == []
+
+    # The LLM path sends the same rows as JSON records, read back by the fake program
+    records = json.loads(df.to_json(orient="records"))
+    for record in records:
+        # Required text fields are blank rather than missing on both paths
+        record["prenom"] = record["prenom"] or ""
+    llm_entries = FakeProgram(Entries)(text_input=json.dumps(records)).entries
+    assert [e.model_dump() for e in entries] == [e.model_dump() for e in llm_entries]
@@ -0,0 +1,148 @@
+import asyncio
+import json
+
+import pytest
+
+import crawler
+from crawler import Crawler
+
+PARTNER_TEXT = (
+    "Le cabinet de physiotherapie {name} accueille ses patients a Lausanne du lundi au vendredi. "
+    "Adresse: Rue du Lac {number}, 1006 Lausanne. Telephone 021 555 {number:02d} {number:02d}. "
+    "Specialites: reeducation du sport, drainage lymphatique et physiotherapie respiratoire."
+)
+
+
+def page(body, links=()):
+    anchors = "".join(f'<a href="{link}">{link}</a>' for link in links)
+    return f"<html><body><p>{body}</p>{anchors}</body></html>"
+
+
+SITE = {
+    "robots.txt": "User-agent: *\nDisallow: /private/\n",
+    "index.html": page("Annuaire des partenaires de la region lausannoise. " * 5,
+                       ["/favre.html", "/rochat.html", "/favre.html?ref=newsletter#contact", "/private/secret.html",
+                        "/brochure.pdf", "http://example.invalid/ailleurs.html"]),
+    "favre.html": page(PARTNER_TEXT.format(name="Favre", number=12), ["/index.html", "/dubois.html"]),
+    "rochat.html": page(PARTNER_TEXT.format(name="Rochat", number=34).replace("physiotherapie", "osteopathie")
+                        + " Consultations a domicile le samedi matin."),
+    "dubois.html": page("Pharmacie Dubois, Avenue de la Gare 3, 1003 Lausanne, ouverte 7 jours sur 7. " * 3),
+    "private/secret.html": page("Page interne " * 30),
+}
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Texts handed to the extraction endpoint, by URL."""
+    sent = []
+    monkeypatch.setattr(crawler, "send_to_process_input", lambda text, api_endpoint: sent.append(text) or True)
+    return sent
+
+
+def make_crawler(**kwargs):
+    return Crawler(api_endpoint="http://api.invalid/process-annuaire", delay=0, render="never", **kwargs)
+
+
+def test_crawl_follows_links_and_honours_robots(serve_files, sent):
+    base_url = serve_files(SITE)
+    c = make_crawler(max_depth=2)
+    stats = asyncio.run(c.run([f"{base_url}/index.html"]))
+
+    assert stats["robots_blocked"] == 1
+    assert stats["fetched"] == 5
+    assert stats["errors"] == 0
+    assert f"{base_url}/private/secret.html" in c.seen
+    assert not any(url.endswith(".pdf") or "example.invalid" in url for url in c.seen)
+    assert not any("Page interne" in text for text in sent)
+
+
+def test_near_duplicate_pages_are_not_sent(serve_files, sent):
+    base_url = serve_files(SITE)
+    stats = asyncio.run(make_crawler(max_depth=1).run([f"{base_url}/index.html"]))
+
+    # favre.html?ref=newsletter is another URL for the same text
+    assert stats["near_duplicates"] == 1
+    assert sum("Favre" in text for text in sent) == 1
+    assert sum("Rochat" in text for text in sent) == 1
+    assert stats["sent"] == len(sent) == 3
+
+
+def test_max_depth_limits_the_frontier(serve_files, sent):
+    base_url = serve_files(SITE)
+    c = make_crawler(max_depth=1)
+    asyncio.run(c.run([f"{base_url}/index.html"]))
+    assert f"{base_url}/dubois.html" not in c.seen
+
+
+def test_robots_txt_is_read_once_per_origin(serve_files, sent, monkeypatch):
+    base_url = serve_files(SITE)
+    reads = []
+    read_robots = Crawler._read_robots
+
+    async def counting_read_robots(origin):
+        reads.append(origin)
+        await asyncio.sleep(0.05)
+        return await read_robots(origin)
+
+    monkeypatch.setattr(Crawler, "_read_robots", staticmethod(counting_read_robots))
+    c = make_crawler(concurrency=8, per_host=8)
+
+    async def check_all():
+        return await asyncio.gather(*(c.allowed_by_robots(f"{base_url}/{path}") for path in SITE))
+
+    allowed = asyncio.run(check_all())
+    assert reads == [base_url]
+    assert allowed.count(False) == 1
+
+
+def test_interrupted_crawl_resumes_from_checkpoint(serve_files, sent, tmp_path):
+    base_url = serve_files(SITE)
+    state_path = str(tmp_path / "crawl-state.json")
+    seed = f"{base_url}/index.html"
+
+    # First run stops right after the seed page, with its links in the frontier
+    first = make_crawler(state_path=state_path)
+
+    async def crawl_seed_only():
+        first.allowed_hosts = {"127.0.0.1"}
+        first.add_url(seed, 0)
+        url, depth = first.frontier.pop(0)
+        await first.crawl_one(url, depth)
+        first.save_checkpoint()
+
+    asyncio.run(crawl_seed_only())
+    with open(state_path, encoding="utf-8") as f:
+        state = json.load(f)
+    assert state["stats"]["fetched"] == 1
+    assert f"{base_url}/favre.html" in [url for url, _ in state["frontier"]]
+    sent_before = len(sent)
+
+    second = make_crawler(state_path=state_path)
+    stats = asyncio.run(second.run([seed]))
+
+    # The seed is not fetched again, the counters carry on from the checkpoint
+    assert stats["fetched"] == 5
+    assert not any("Annuaire des partenaires" in text for text in sent[sent_before:])
+    with open(state_path, encoding="utf-8") as f:
+        assert json.load(f)["frontier"] == []
+
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+def test_send_to_process_input_waits_for_a_queued_job(monkeypatch):
+    posted = []
+    states = iter([{"status": "running"}, {"status": "done", "status_code": 201, "result": {"successful_inserts": [1]}}])
+    monkeypatch.setattr(crawler, "JOB_POLL_INTERVAL", 0)
+    monkeypatch.setattr(crawler.requests, "post", lambda url, data: posted.append(data) or FakeResponse(
+        202, {"job_id": "abc", "status_url": "/jobs/abc", "events_url": "/jobs/abc/events"}))
+    monkeypatch.setattr(crawler.requests, "get", lambda url, timeout: FakeResponse(200, next(states)))
+
+    assert crawler.send_to_process_input("texte", "http://api.invalid/process-annuaire")
+    assert posted == [{"text": "texte", "async": "false"}]
@@ -0,0 +1,103 @@
+import sqlite3
+
+import pytest
+
+from dedup_index import DuplicateIndex, similarity, trigrams
+
+ROWS = [
+    (1, "Favre", "Anne", "Lausanne", "1006"),
+    (2, "Rochat", "Luc", "Vevey", "1800"),
+    (3, "Müller", "Sophie", "Morges", "1110"),
+    (4, "Favre-Bonvin", "Anne", "Pully", "1009"),
+    (5, "Favre", "Marc", "Lausanne", "1006"),
+]
+
+
+@pytest.fixture
+def cursor():
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE annuaire (numero INTEGER PRIMARY KEY, nom TEXT, prenom TEXT, localite TEXT, npa TEXT)")
+    db.executemany("INSERT INTO annuaire VALUES (?, ?, ?, ?, ?)", ROWS)
+    yield db.cursor()
+    db.close()
+
+
+@pytest.fixture
+def index(cursor):
+    index = DuplicateIndex("annuaire", threshold=0.3)
+    assert index.load(cursor) == len(ROWS)
+    return index
+
+
+def numeros(matches):
+    return [row["numero"] for row in matches]
+
+
+def test_trigrams_match_pg_trgm():
+    assert trigrams("Favre") == {"  f", " fa", "fav", "avr", "vre", "re "}
+    assert trigrams("Müller") == trigrams("MULLER")
+    assert trigrams("") == frozenset()
+    assert similarity(trigrams("Favre"), trigrams("Favre")) == 1.0
+
+
+def test_finds_similar_names_in_the_same_block(index):
+    matches = index.find_duplicate_candidates([{"nom": "Favre", "prenom": "Anne", "localite": "Lausanne"}])[0]
+    assert numeros(matches) == [1, 4]
+
+
+def test_blocking_key_separates_first_names(index):
+    # Same name, other first initial: row 5 (Marc) only
+    matches = index.find_duplicate_candidates([{"nom": "Favre", "prenom": "Marie"}])[0]
+    assert numeros(matches) == [5]
+
+
+def test_accents_and_case_are_ignored(index):
+    matches = index.find_duplicate_candidates([{"nom": "MULLER", "prenom": "sophie"}])[0]
+    assert numeros(matches) == [3]
+
+
+def test_entries_without_block_or_match_value_have_no_candidates(index):
+    assert index.find_duplicate_candidates([{"nom": "Favre"}, {"prenom": "Anne"}, {"nom": "", "prenom": "Anne"}]) == [
+        [], [], []
+    ]
+
+
+def test_min_score_filters_on_the_weighted_fields(cursor):
+    index = DuplicateIndex("annuaire", threshold=0.3, min_score=0.9)
+    index.load(cursor)
+    matches = index.find({"nom": "Favre", "prenom": "Anne", "localite": "Lausanne", "npa": "1006"})
+    assert [row["numero"] for _, row in matches] == [1]
+
+
+def test_add_update_and_remove_keep_the_index_in_sync(index):
+    index.add({"numero": 6, "nom": "Perret", "prenom": "Julie", "localite": "Nyon", "npa": "1260"})
+    assert numeros(index.find_duplicate_candidates([{"nom": "Perret", "prenom": "Julie"}])[0]) == [6]
+
+    # Renamed row leaves its old posting lists
+    index.update(6, {"nom": "Dubois"})
+    assert index.find_duplicate_candidates([{"nom": "Perret", "prenom": "Julie"}])[0] == []
+    assert numeros(index.find_duplicate_candidates([{"nom": "Dubois", "prenom": "Julie"}])[0]) == [6]
+
+    index.remove(6)
+    assert index.find_duplicate_candidates([{"nom": "Dubois", "prenom": "Julie"}])[0] == []
+    assert len(index) == len(ROWS)
+    # Updates of rows that are not indexed are ignored
+    index.update(42, {"nom": "Dubois"})
+    assert len(index) == len(ROWS)
+
+
+def test_update_accepts_the_replace_payload(index):
+    # /replace-* bodies carry the numero of the row next to the changed fields
+    index.update(2, {"numero": 2, "nom": "Rochat-Gay", "localite": "Montreux"})
+    assert numeros(index.find_duplicate_candidates([{"nom": "Rochat-Gay", "prenom": "Luc"}])[0]) == [2]
+    assert index.find({"nom": "Rochat-Gay", "prenom": "Luc"})[0][1]["localite"] == "Montreux"
+    index.update(2, {"numero": "2", "prenom": "Lucien"})
+    assert numeros(index.find_duplicate_candidates([{"nom": "Rochat-Gay", "prenom": "Lucien"}])[0]) == [2]
+
+
+def test_reload_picks_up_rows_written_elsewhere(index, cursor):
+    cursor.execute("INSERT INTO annuaire VALUES (7, 'Gay', 'Claire', 'Sion', '1950')")
+    assert index.find_duplicate_candidates([{"nom": "Gay", "prenom": "Claire"}])[0] == []
+    index.load(cursor)
+    assert numeros(index.find_duplicate_candidates([{"nom": "Gay", "prenom": "Claire"}])[0]) == [7]
+    assert index.stats()["rows"] == len(ROWS) + 1
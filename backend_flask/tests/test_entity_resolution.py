@@ -0,0 +1,85 @@
+import entity_resolution
+from entity_resolution import RESOLUTION_RULES, cluster_pairs, find_duplicate_pairs, resolve_table
+
+RULES = RESOLUTION_RULES["annuaire"]
+COLUMNS = ["numero", "nom", "prenom", "voie", "npa", "localite", "telephone", "portable", "courriel",
+           "date_derniere_modification"]
+
+
+def row(numero, nom, prenom=None, npa=1000, **values):
+    return dict({column: None for column in COLUMNS}, numero=numero, nom=nom, prenom=prenom, npa=npa, **values)
+
+
+class FakeCursor:
+    """Just enough of a DB-API cursor for iter_rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.description = [(column,) for column in COLUMNS]
+
+    def execute(self, query):
+        self.pending = [tuple(r[column] for column in COLUMNS) for r in self.rows]
+
+    def fetchmany(self, size):
+        batch, self.pending = self.pending[:size], self.pending[size:]
+        return batch
+
+
+def test_large_block_is_compared_in_sorted_windows(monkeypatch):
+    # One npa + initial block of ten rows, larger than the window
+    names = [("Fischer", "Ueli"), ("Fontana", "Marco"), ("Favre", "Anne"), ("Frei", "Sandra"), ("Furrer", "Paul"),
+             ("Ferrari", "Lucia"), ("Fankhauser", "Beat"), ("Fontana", "Marc"), ("Flückiger", "Ruth"), ("Fuchs", "Hans")]
+    rows = [row(i + 1, nom, prenom) for i, (nom, prenom) in enumerate(names)]
+
+    sizes = []
+    score_block = entity_resolution.score_block
+
+    def recording_score_block(records, rules):
+        sizes.append(len(records))
+        return score_block(records, rules)
+
+    monkeypatch.setattr(entity_resolution, "score_block", recording_score_block)
+    pairs = find_duplicate_pairs(rows, RULES, max_block_size=4)
+    # Far apart in the table, next to each other once sorted by nom
+    assert list(pairs) == [(2, 8)]
+    assert sizes and max(sizes) <= 4
+
+
+def test_clusters_are_transitive():
+    rows = [row(1, "Rochat", "Jean-Pierre", voie="Avenue de la Gare 12"),
+            row(2, "Rochat", "Jean-Pierre", voie="Av. de Cour 3"),
+            row(3, "Rochat", "J.-P.", voie="Av. de Cour 3"),
+            row(4, "Muller", "Eva")]
+    pairs = find_duplicate_pairs(rows, RULES)
+    # 1 and 3 are not similar enough on their own, both match 2
+    assert set(pairs) == {(1, 2), (2, 3)}
+    assert cluster_pairs(pairs) == [[1, 2, 3]]
+
+    cursors = iter([FakeCursor(rows), FakeCursor(rows)])
+    report = resolve_table(lambda: next(cursors), "annuaire")
+    assert [(c["survivor"], c["duplicates"]) for c in report["clusters"]] == [(1, [2, 3])]
+    assert report["replace_payload"] == []
+
+
+def test_cluster_pairs_merges_chains_and_keeps_separate_groups():
+    assert sorted(cluster_pairs({(5, 9): 0.7, (1, 5): 0.8, (3, 4): 0.9, (4, 9): 0.6, (7, 8): 0.9})) == [
+        [1, 3, 4, 5, 9], [7, 8]]
+
+
+def test_rows_with_null_keys():
+    rows = [row(1, None, npa=None, telephone="+41 21 123 45 67"),
+            row(2, "Rochat", "Luc", npa=None, telephone="021 123 45 67", voie="Rue du Lac 4"),
+            row(3, "Rochat", "Luc", npa=None),
+            row(4, None, npa=None),
+            row(5, "Rochat", "Luc", npa=None, courriel="luc@example.ch", voie="Rue du Lac 4"),
+            row(6, "Rochat", "Luc", npa=1000, courriel="LUC@example.ch ")]
+    pairs = find_duplicate_pairs(rows, RULES)
+    # Rows only meet in the blocks of their non-null keys: 3 and 4 share none with any row,
+    # 2 and 5 have a phone and an email respectively and are never compared
+    assert set(pairs) == {(1, 2), (5, 6)}
+
+    cursors = iter([FakeCursor(rows), FakeCursor(rows)])
+    clusters = {c["survivor"]: c for c in resolve_table(lambda: next(cursors), "annuaire")["clusters"]}
+    # The empty row 1 is absorbed by the complete one, which has nothing to take from it
+    assert clusters[2]["duplicates"] == [1] and clusters[2]["replace"] is None
+    assert clusters[5]["duplicates"] == [6] and clusters[5]["replace"] == {"npa": 1000, "numero": 5}
@@ -0,0 +1,81 @@
+import asyncio
+import json
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from extraction import (FakeProgram, chunk_records, chunk_text, count_tokens, extract_entries,
+                        extract_entries_async)
+
+
+class Entry(BaseModel):
+    nom: str
+    prenom: Optional[str] = None
+
+
+class Entries(BaseModel):
+    entries: List[Entry]
+
+
+def records(count):
+    return [{"nom": f"Favre{i}", "prenom": "Anne", "localite": f"Ville{i}"} for i in range(count)]
+
+
+def test_chunk_records_fit_the_budget_and_keep_every_row():
+    rows = records(200)
+    chunks = chunk_records(rows, token_budget=300)
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 300 for chunk in chunks)
+    assert [row for chunk in chunks for row in json.loads(chunk)] == rows
+
+
+def test_chunk_records_oversized_row_is_its_own_chunk():
+    rows = [{"nom": "Favre", "prenom": "Anne"}, {"nom": "x" * 4000}, {"nom": "Rochat", "prenom": "Luc"}]
+    chunks = chunk_records(rows, token_budget=100)
+    assert [json.loads(chunk) for chunk in chunks] == [[rows[0]], [rows[1]], [rows[2]]]
+
+
+def test_chunk_text_keeps_paragraphs_whole():
+    paragraphs = [f"Paragraphe {i}: " + "mot " * 50 for i in range(30)]
+    chunks = chunk_text("\n\n".join(paragraphs), token_budget=200)
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 200 for chunk in chunks)
+    assert [p for chunk in chunks for p in chunk.split("\n\n")] == paragraphs
+
+
+def test_chunk_text_splits_oversized_paragraph():
+    text = "mot " * 2000
+    chunks = chunk_text(text, token_budget=100)
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 100 for chunk in chunks)
+    # Pieces of a paragraph are joined back with blank lines, nothing is lost
+    assert "".join(chunk.replace("\n\n", "") for chunk in chunks) == text
+
+
+def test_fake_program_reads_records_back():
+    program = FakeProgram(Entries)
+    result = program(text_input=json.dumps(records(3)))
+    assert [entry.nom for entry in result.entries] == ["Favre0", "Favre1", "Favre2"]
+
+
+def test_fake_program_ignores_invalid_input():
+    program = FakeProgram(Entries)
+    assert program(text_input="not json").entries == []
+    assert program(text_input=json.dumps([{"prenom": "sans nom"}, "text", {"nom": "Favre"}])).entries == [
+        Entry(nom="Favre")
+    ]
+
+
+def test_extract_entries_merges_chunks_in_order():
+    rows = records(100)
+    chunks = chunk_records(rows, token_budget=200)
+    assert len(chunks) > 2
+    entries = extract_entries(FakeProgram(Entries), chunks, max_workers=4)
+    assert [entry.nom for entry in entries] == [row["nom"] for row in rows]
+
+
+def test_extract_entries_async_merges_chunks_in_order():
+    rows = records(100)
+    chunks = chunk_records(rows, token_budget=200)
+    entries = asyncio.run(extract_entries_async(FakeProgram(Entries), chunks, max_workers=4))
+    assert [entry.nom for entry in entries] == [row["nom"] for row in rows]
@@ -0,0 +1,52 @@
+import time
+
+from jobs import JobQueue
+
+
+def handler(kind, payload, progress):
+    return {"echo": payload}, 201
+
+
+def expire_leases(queue):
+    queue._db().execute("UPDATE jobs SET lease_until = ? WHERE status = 'running'", (time.time() - 1,))
+
+
+def wait_for(queue, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
+
+def test_job_runs_once_and_counts_its_attempt(tmp_path):
+    queue = JobQueue(handler, path=str(tmp_path / "jobs.sqlite3"), workers=1)
+    job_id = queue.enqueue("annuaire", {"text": "x"})
+    queue.start()
+    try:
+        job = wait_for(queue, job_id)
+    finally:
+        queue.stop()
+    assert (job["status"], job["status_code"], job["result"], job["attempts"]) == ("done", 201, {"echo": {"text": "x"}}, 1)
+
+
+def test_job_whose_workers_keep_dying_is_failed(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    queue = JobQueue(handler, path=path, max_attempts=2)
+    job_id = queue.enqueue("annuaire", {})
+
+    # Two owners claim the job and die without finishing it
+    for attempt in (1, 2):
+        claimed = JobQueue(handler, path=path, max_attempts=2)._claim()
+        assert claimed[0] == job_id
+        assert queue.get(job_id)["attempts"] == attempt
+        expire_leases(queue)
+
+    other_id = queue.enqueue("annuaire", {})
+    # The abandoned job is failed and the next one is handed out instead
+    assert queue._claim()[0] == other_id
+    job = queue.get(job_id)
+    assert (job["status"], job["status_code"], job["attempts"]) == ("failed", 500, 2)
+    assert job["error"].startswith("Abandoned after 2 attempts")
@@ -0,0 +1,26 @@
+from datetime import date
+
+import pytest
+
+from listing import ListingError, build_listing_query, parse_listing_args
+
+
+def test_filters_are_converted_to_the_column_type():
+    options = parse_listing_args("annuaire", {"npa": "1000", "date_derniere_modification": "2024-06-01",
+                                              "localite": "Lausanne", "nom": ""})
+    assert options["filters"] == {"npa": 1000, "date_derniere_modification": date(2024, 6, 1), "localite": "Lausanne"}
+    query, params = build_listing_query("annuaire", options)
+    assert "npa = %s" in query and params[:-1] == list(options["filters"].values())
+
+
+@pytest.mark.parametrize("table_name, args, message", [
+    ("annuaire", {"npa": "abc"}, "'npa' must be an integer."),
+    ("annuaire", {"numero": "1.5"}, "'numero' must be an integer."),
+    ("annuaire", {"npa": "99999999999"}, "'npa' is out of range."),
+    ("annuaire", {"date_derniere_modification": "01.06.2024"}, "'date_derniere_modification' must be a date"),
+    ("evenement", {"numero_partenaire": "x"}, "'numero_partenaire' must be an integer."),
+    ("evenement", {"date_debut": "2024-02-30"}, "'date_debut' must be a date"),
+])
+def test_badly_typed_filters_are_rejected(table_name, args, message):
+    with pytest.raises(ListingError, match=message.replace(".", r"\.").replace("(", r"\(")):
+        parse_listing_args(table_name, args)
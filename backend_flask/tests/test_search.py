@@ -0,0 +1,19 @@
+import pytest
+
+from listing import ListingError
+from search import parse_nearby_args, parse_search_args
+
+
+def test_search_filters_are_converted_to_the_column_type():
+    options = parse_search_args("annuaire", {"q": "physio", "npa": "1003", "localite": "Lausanne"})
+    assert options["filters"] == {"localite": "Lausanne", "npa": 1003}
+
+
+@pytest.mark.parametrize("parse, args", [
+    (lambda args: parse_search_args("annuaire", args), {"q": "physio", "npa": "abc"}),
+    (lambda args: parse_search_args("evenement", args), {"q": "concert", "date_debut": "demain"}),
+    (parse_nearby_args, {"lat": "46.52", "lon": "6.63", "npa": "10O0"}),
+])
+def test_badly_typed_search_filters_are_rejected(parse, args):
+    with pytest.raises(ListingError):
+        parse(args)
@@ -0,0 +1,164 @@
+import contextvars
+import functools
+import json
+import threading
+import time
+
+from extraction import count_tokens
+
+
+class TokenUsage:
+    """Thread-safe counters of the LLM calls made for one request, or for the whole process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.estimated_calls = 0
+        self.cache_hits = 0
+        self.prompt_tokens = 0
+        self.schema_tokens = 0
+        self.completion_tokens = 0
+        self.seconds = 0.0
+
+    def record(self, prompt_tokens, schema_tokens, completion_tokens, seconds, estimated=False):
+        with self._lock:
+            self.calls += 1
+            self.estimated_calls += int(estimated)
+            self.prompt_tokens += prompt_tokens
+            self.schema_tokens += schema_tokens
+            self.completion_tokens += completion_tokens
+            self.seconds += seconds
+
+    def record_cache_hit(self):
+        with self._lock:
+            self.cache_hits += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'estimated_calls': self.estimated_calls,
+                'cache_hits': self.cache_hits,
+                'prompt_tokens': self.prompt_tokens,
+                'schema_tokens': self.schema_tokens,
+                'completion_tokens': self.completion_tokens,
+                'total_tokens': self.prompt_tokens + self.completion_tokens,
+                'llm_seconds': round(self.seconds, 3),
+            }
+
+
+# Process-wide totals per program name, reported by /token-metrics
+token_totals = {}
+token_totals_lock = threading.Lock()
+
+
+def get_totals(name):
+    with token_totals_lock:
+        if name not in token_totals:
+            token_totals[name] = TokenUsage()
+        return token_totals[name]
+
+
+def schema_token_count(output_cls):
+    """Tokens of the function-calling schema sent along with every request for `output_cls`."""
+    return count_tokens(json.dumps(output_cls.model_json_schema()))
+
+
+# Token counts reported by the API for the program call running in the current thread or task
+_call_usage = contextvars.ContextVar("llm_call_usage", default=None)
+
+
+@functools.lru_cache(maxsize=None)
+def usage_callback_manager():
+    """
+    LlamaIndex callback manager for the LLM clients, adding the `usage` the OpenAI API returns
+    with each response to the MeteredProgram call that made it. One manager is shared by every
+    request: a call is found through a context variable, not through the handler state.
+    """
+    from llama_index.core.callbacks import CallbackManager
+    from llama_index.core.callbacks.base_handler import BaseCallbackHandler
+    from llama_index.core.callbacks.schema import CBEventType, EventPayload
+    from llama_index.core.callbacks.token_counting import get_tokens_from_response
+
+    class UsageHandler(BaseCallbackHandler):
+        def __init__(self):
+            super().__init__(event_starts_to_ignore=[], event_ends_to_ignore=[])
+
+        def on_event_start(self, event_type, payload=None, event_id="", parent_id="", **kwargs):
+            return event_id
+
+        def on_event_end(self, event_type, payload=None, event_id="", **kwargs):
+            counts = _call_usage.get()
+            if counts is None or event_type != CBEventType.LLM or not payload:
+                return
+            response = payload.get(EventPayload.RESPONSE)
+            if response is None:
+                return
+            prompt_tokens, completion_tokens = get_tokens_from_response(response)
+            if prompt_tokens or completion_tokens:
+                counts["prompt_tokens"] += prompt_tokens
+                counts["completion_tokens"] += completion_tokens
+                counts["responses"] += 1
+
+        def start_trace(self, trace_id=None):
+            pass
+
+        def end_trace(self, trace_id=None, trace_map=None):
+            pass
+
+    return CallbackManager([UsageHandler()])
+
+
+class MeteredProgram:
+    """
+    Wraps a Pydantic program to count the tokens of each call. The counts are those of the
+    API `usage` when the LLM client reports it through usage_callback_manager; otherwise
+    (FakeProgram, clients without the callback) they are estimated with tiktoken: the rendered
+    prompt plus the output schema on the way in, the returned JSON on the way out.
+    Calls accept an optional `usage` TokenUsage collecting the counts of the current request.
+    """
+
+    def __init__(self, program, name, prompt_template):
+        self.program = program
+        self.output_cls = program.output_cls
+        self.prompt_template = prompt_template
+        self.schema_tokens = schema_token_count(self.output_cls)
+        self.totals = get_totals(name)
+
+    def _record(self, text_input, result, started, usage, counts):
+        estimated = not counts["responses"]
+        if estimated:
+            prompt_tokens = count_tokens(self.prompt_template.format(text_input=text_input)) + self.schema_tokens
+            completion_tokens = count_tokens(result.model_dump_json())
+        else:
+            prompt_tokens, completion_tokens = counts["prompt_tokens"], counts["completion_tokens"]
+        elapsed = time.perf_counter() - started
+        for counter in (self.totals, usage):
+            if counter is not None:
+                counter.record(prompt_tokens, self.schema_tokens, completion_tokens, elapsed, estimated)
+
+    @staticmethod
+    def _new_counts():
+        return {"prompt_tokens": 0, "completion_tokens": 0, "responses": 0}
+
+    def __call__(self, text_input, usage=None, **kwargs):
+        started = time.perf_counter()
+        counts = self._new_counts()
+        token = _call_usage.set(counts)
+        try:
+            result = self.program(text_input=text_input, **kwargs)
+        finally:
+            _call_usage.reset(token)
+        self._record(text_input, result, started, usage, counts)
+        return result
+
+    async def acall(self, text_input, usage=None, **kwargs):
+        started = time.perf_counter()
+        counts = self._new_counts()
+        token = _call_usage.set(counts)
+        try:
+            result = await self.program.acall(text_input=text_input, **kwargs)
+        finally:
+            _call_usage.reset(token)
+        self._record(text_input, result, started, usage, counts)
+        return result
@@ -0,0 +1,462 @@
+"""
+Idempotent bulk loader for the annuaire and evenement tables, e.g.
+
+    python load_table.py annuaire ../data/sample_annuaire.csv
+    python load_table.py evenement ../data/evenement.csv --key nom_evenement,date_debut
+    python load_table.py annuaire --indexes-only
+
+The file is read in chunks, converted with the same header mapping and typing as the API
+uploads, and streamed with COPY into a temporary staging table. Staging rows are then
+upserted on the natural key (the source `Numéro` by default): rows that changed are
+updated, new rows inserted, identical rows left alone, so rerunning a load is a no-op.
+Indexes are created once the data is in, and the counts are printed as JSON. Running API
+workers are notified of the change so their cached listings are refreshed.
+
+Connection settings come from DB_HOST, DB_PORT, DB_NAME, DB_USER and DB_PASSWORD
+(backend_flask/.env is read if present).
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+import psycopg2
+from dotenv import load_dotenv
+from psycopg2 import sql
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend_flask")
+sys.path.insert(0, BACKEND_DIR)
+
+from column_mapping import convert_frame, map_headers  # noqa: E402
+from tables import TABLE_COLUMNS  # noqa: E402
+from response_cache import NOTIFY_QUERY  # noqa: E402
+from search import GEO_INDEX, SEARCH_INDEXES  # noqa: E402
+
+CHUNK_SIZE = 50000
+NULL = "\\N"
+
+CREATE_TABLES = {
+    "annuaire": """
+        CREATE TABLE IF NOT EXISTS annuaire (
+            numero SERIAL PRIMARY KEY,
+            type_de_partenaire VARCHAR(50),
+            personnalite_juridique VARCHAR(50),
+            type_de_fournisseur VARCHAR(50),
+            nom VARCHAR(100),
+            prenom VARCHAR(100),
+            voie VARCHAR(200),
+            complement VARCHAR(100),
+            npa INTEGER,
+            localite VARCHAR(100),
+            pays VARCHAR(50),
+            telephone VARCHAR(15),
+            portable VARCHAR(15),
+            courriel VARCHAR(100),
+            site_web VARCHAR(100),
+            activite_specialite TEXT,
+            medecin BOOLEAN,
+            medecin_intra_hospitalier BOOLEAN,
+            horaires_ouverture TEXT,
+            coord_geo_nord NUMERIC,
+            coord_geo_est NUMERIC,
+            coord_geo_long NUMERIC,
+            coord_geo_lat NUMERIC,
+            besoin_convention BOOLEAN,
+            type_de_convention VARCHAR(100),
+            date_convention_soumise DATE,
+            date_convention_valide_recue DATE,
+            date_derniere_modification DATE,
+            date_saisie DATE,
+            date_dernier_appel_actualisation DATE,
+            date_derniere_modif DATE
+        );
+    """,
+    "evenement": """
+        CREATE TABLE IF NOT EXISTS evenement (
+            numero SERIAL PRIMARY KEY,
+            nom_evenement VARCHAR(200),
+            titre_evenement VARCHAR(200),
+            date_debut DATE,
+            date_fin DATE,
+            horaire_debut TIME,
+            horaire_fin TIME,
+            texte_libre TEXT,
+            court_descriptif TEXT,
+            numero_partenaire INTEGER,
+            nom_partenaire VARCHAR(200),
+            partenaire_de_la_selection TEXT,
+            sites_originaux TEXT,
+            date_creation DATE,
+            mode_creation VARCHAR(50),
+            date_derniere_modification DATE,
+            mode_modification VARCHAR(50),
+            id_dernier_modificateur INTEGER,
+            date_de_peremption DATE
+        );
+    """,
+}
+
+# Indexes backing the filter/sort columns of the paginated listing API and the search endpoints
+CREATE_INDEXES = {
+    "annuaire": """
+        CREATE INDEX IF NOT EXISTS idx_annuaire_nom ON annuaire (nom);
+        CREATE INDEX IF NOT EXISTS idx_annuaire_localite ON annuaire (localite);
+        CREATE INDEX IF NOT EXISTS idx_annuaire_npa ON annuaire (npa);
+        CREATE INDEX IF NOT EXISTS idx_annuaire_type_de_partenaire ON annuaire (type_de_partenaire);
+        CREATE INDEX IF NOT EXISTS idx_annuaire_date_derniere_modification ON annuaire (date_derniere_modification);
+    """ + SEARCH_INDEXES["annuaire"] + GEO_INDEX,
+    "evenement": """
+        CREATE INDEX IF NOT EXISTS idx_evenement_nom_evenement ON evenement (nom_evenement);
+        CREATE INDEX IF NOT EXISTS idx_evenement_date_debut ON evenement (date_debut);
+        CREATE INDEX IF NOT EXISTS idx_evenement_numero_partenaire ON evenement (numero_partenaire);
+        CREATE INDEX IF NOT EXISTS idx_evenement_date_derniere_modification ON evenement (date_derniere_modification);
+    """ + SEARCH_INDEXES["evenement"],
+}
+
+# Trigram indexes used by the batched duplicate detection, skipped when pg_trgm is not available
+CREATE_EXTENSION = "CREATE EXTENSION IF NOT EXISTS pg_trgm;"
+CREATE_TRIGRAM_INDEXES = {
+    "annuaire": "CREATE INDEX IF NOT EXISTS idx_annuaire_nom_trgm ON annuaire USING gin (nom gin_trgm_ops);",
+    "evenement": "CREATE INDEX IF NOT EXISTS idx_evenement_nom_evenement_trgm "
+                 "ON evenement USING gin (nom_evenement gin_trgm_ops);",
+}
+
+DEFAULT_KEYS = {
+    "annuaire": ["numero"],
+    "evenement": ["numero"],
+}
+
+
+def connection_settings(database=None):
+    return {
+        "host": os.getenv("DB_HOST", "localhost"),
+        "port": os.getenv("DB_PORT", "5432"),
+        "dbname": database or os.getenv("DB_NAME", "cassis_ia"),
+        "user": os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASSWORD"),
+    }
+
+
+def ensure_database(database):
+    conn = psycopg2.connect(**connection_settings("postgres"))
+    conn.autocommit = True  # CREATE DATABASE cannot run in a transaction
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", (database,))
+            if cursor.fetchone() is None:
+                print(f"Database '{database}' does not exist. Creating...", file=sys.stderr)
+                cursor.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(database)))
+    finally:
+        conn.close()
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE):
+    """Yields DataFrames of at most `chunk_size` rows with every value read as a string."""
+    if path.endswith(".xlsx"):
+        from openpyxl import load_workbook
+
+        # read_only streams the sheet instead of building the whole workbook in memory
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = [str(h) if h is not None else f"Unnamed: {i}" for i, h in enumerate(next(rows, []))]
+        batch = []
+        for row in rows:
+            batch.append([None if v is None else str(v) for v in row])
+            if len(batch) >= chunk_size:
+                yield pd.DataFrame(batch, columns=headers)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=headers)
+        workbook.close()
+    else:
+        # utf-8-sig drops the BOM written by Excel and by /export
+        yield from pd.read_csv(path, dtype=str, chunksize=chunk_size, encoding="utf-8-sig")
+
+
+def column_lengths(cursor, table_name):
+    """VARCHAR limits, checked before COPY so one overlong value does not abort the whole load."""
+    cursor.execute(
+        """
+        SELECT column_name, character_maximum_length FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = %s AND character_maximum_length IS NOT NULL
+        """,
+        (table_name,)
+    )
+    return dict(cursor.fetchall())
+
+
+def convert_chunk(table_name, df, mapping, keys, first_line, lengths=None):
+    """
+    Renames and types one chunk like the API uploads do.
+    :return: Tuple (accepted rows as lists in column order with their file line, rejected (line, reason) pairs).
+    """
+    columns = list(mapping.values())
+    raw = df[list(mapping)].rename(columns=mapping)
+    records, invalid_values = convert_frame(table_name, raw)
+
+    accepted, rejected = [], []
+    for offset, (record, invalid) in enumerate(zip(records, invalid_values)):
+        line = first_line + offset
+        missing = [key for key in keys if record.get(key) in (None, "")]
+        if missing:
+            rejected.append((line, f"missing key {', '.join(missing)}"))
+            continue
+        # Values that were present in the file but could not be converted to the column type
+        if invalid:
+            rejected.append((line, "invalid value for " + ", ".join(f"{c} ({v!r})" for c, v in sorted(invalid.items()))))
+            continue
+        too_long = [c for c, limit in (lengths or {}).items()
+                    if c in record and record[c] is not None and len(str(record[c])) > limit]
+        if too_long:
+            rejected.append((line, f"value too long for {', '.join(sorted(too_long))}"))
+            continue
+        accepted.append([line] + [record.get(c) for c in columns])
+    return accepted, rejected
+
+
+def copy_rows(cursor, staging, columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([NULL if value is None else value for value in row])
+    buffer.seek(0)
+    cursor.copy_expert(
+        sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL {})").format(
+            sql.Identifier(staging),
+            sql.SQL(", ").join(map(sql.Identifier, ["_line"] + columns)),
+            sql.Literal(NULL)
+        ),
+        buffer
+    )
+
+
+def upsert(cursor, table_name, staging, columns, keys):
+    """
+    Applies the staging table to `table_name`.
+    :return: Dict with the duplicate_in_file, updated, unchanged and inserted counts.
+    """
+    table, stage = sql.Identifier(table_name), sql.Identifier(staging)
+    key_match = sql.SQL(" AND ").join(
+        sql.SQL("t.{0} = s.{0}").format(sql.Identifier(k)) for k in keys
+    )
+    values = [c for c in columns if c not in keys]
+
+    # A key repeated in the file keeps its last occurrence
+    cursor.execute(sql.SQL(
+        "DELETE FROM {stage} s USING {stage} d WHERE {same_key} AND d._line > s._line"
+    ).format(
+        stage=stage,
+        same_key=sql.SQL(" AND ").join(sql.SQL("d.{0} = s.{0}").format(sql.Identifier(k)) for k in keys)
+    ))
+    counts = {"duplicate_in_file": cursor.rowcount}
+
+    cursor.execute(sql.SQL("SELECT count(*) FROM {stage} s JOIN {table} t ON {key_match}").format(
+        stage=stage, table=table, key_match=key_match
+    ))
+    matched = cursor.fetchone()[0]
+
+    if values:
+        target = sql.SQL(", ").join(sql.SQL("t.{}").format(sql.Identifier(c)) for c in values)
+        source = sql.SQL(", ").join(sql.SQL("s.{}").format(sql.Identifier(c)) for c in values)
+        cursor.execute(sql.SQL(
+            "UPDATE {table} t SET ({columns}) = ROW({source}) FROM {stage} s "
+            "WHERE {key_match} AND ({target}) IS DISTINCT FROM ({source})"
+        ).format(
+            table=table, stage=stage, key_match=key_match, target=target, source=source,
+            columns=sql.SQL(", ").join(map(sql.Identifier, values))
+        ))
+        counts["updated"] = cursor.rowcount
+    else:
+        counts["updated"] = 0
+    counts["unchanged"] = matched - counts["updated"]
+
+    column_list = sql.SQL(", ").join(map(sql.Identifier, columns))
+    cursor.execute(sql.SQL(
+        "INSERT INTO {table} ({columns}) SELECT {source} FROM {stage} s "
+        "WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE {key_match}) ORDER BY s._line"
+    ).format(
+        table=table, stage=stage, key_match=key_match, columns=column_list,
+        source=sql.SQL(", ").join(sql.SQL("s.{}").format(sql.Identifier(c)) for c in columns)
+    ))
+    counts["inserted"] = cursor.rowcount
+
+    if "numero" in columns:
+        # Explicit numeros bypass the sequence, move it past them for rows added by the API
+        cursor.execute(sql.SQL(
+            "SELECT setval(pg_get_serial_sequence({name}, 'numero'), GREATEST(max(numero), 1)) FROM {table}"
+        ).format(name=sql.Literal(table_name), table=table))
+    return counts
+
+
+def drop_indexes(cursor, table_name):
+    """Drops the secondary indexes so a large reload does not maintain them row by row."""
+    cursor.execute(
+        """
+        SELECT indexname FROM pg_indexes
+        WHERE schemaname = 'public' AND tablename = %s AND indexname LIKE %s
+        """,
+        (table_name, f"idx_{table_name}_%")
+    )
+    for (name,) in cursor.fetchall():
+        cursor.execute(sql.SQL("DROP INDEX IF EXISTS {}").format(sql.Identifier(name)))
+
+
+def load(conn, table_name, path, keys=None, chunk_size=CHUNK_SIZE, rebuild_indexes=False, rejects_path=None):
+    """
+    Loads `path` into `table_name` in a single transaction, then builds the missing indexes.
+    :return: Report dict with the row counts and timings.
+    """
+    keys = keys or DEFAULT_KEYS[table_name]
+    unknown = [k for k in keys if k not in TABLE_COLUMNS[table_name]]
+    if unknown:
+        raise ValueError(f"Unknown key column(s) for {table_name}: {', '.join(unknown)}")
+
+    started = time.time()
+    report = {"table": table_name, "file": path, "key": keys, "read": 0, "rejected": 0}
+    staging = f"staging_{table_name}"
+    rejects = []
+    mapping = columns = None
+
+    with conn.cursor() as cursor:
+        cursor.execute(CREATE_TABLES[table_name])
+        lengths = column_lengths(cursor, table_name)
+        if rebuild_indexes:
+            drop_indexes(cursor, table_name)
+
+        line = 2  # line 1 is the header
+        for df in read_chunks(path, chunk_size):
+            if mapping is None:
+                mapping, unmapped = map_headers(table_name, df.columns)
+                columns = list(mapping.values())
+                missing = [k for k in keys if k not in columns]
+                if missing:
+                    raise ValueError(f"Key column(s) {', '.join(missing)} not found in {path}")
+                if unmapped:
+                    print(f"Ignored columns: {', '.join(map(str, unmapped))}", file=sys.stderr)
+                report["columns"] = columns
+                # Staging table with the target column types, dropped at commit
+                cursor.execute(sql.SQL(
+                    "CREATE TEMP TABLE {stage} ON COMMIT DROP AS SELECT 0::bigint AS _line, {columns} FROM {table} WITH NO DATA"
+                ).format(
+                    stage=sql.Identifier(staging), table=sql.Identifier(table_name),
+                    columns=sql.SQL(", ").join(map(sql.Identifier, columns))
+                ))
+
+            accepted, rejected = convert_chunk(table_name, df, mapping, keys, line, lengths)
+            copy_rows(cursor, staging, columns, accepted)
+            report["read"] += len(df)
+            report["rejected"] += len(rejected)
+            rejects.extend(rejected)
+            line += len(df)
+
+        if mapping is None:
+            raise ValueError(f"No rows found in {path}")
+        report["copy_s"] = round(time.time() - started, 3)
+
+        report.update(upsert(cursor, table_name, staging, columns, keys))
+        report["upsert_s"] = round(time.time() - started - report["copy_s"], 3)
+
+        # Delivered to the listening API workers at commit
+        cursor.execute(NOTIFY_QUERY, (table_name,))
+    conn.commit()
+
+    # Built after the data commit, so a missing extension or a failed index does not lose the load
+    index_started = time.time()
+    report["trigram_indexes"] = build_indexes(conn, table_name)
+    report["index_s"] = round(time.time() - index_started, 3)
+
+    if rejects_path and rejects:
+        with open(rejects_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["line", "reason"])
+            writer.writerows(rejects)
+
+    report["elapsed_s"] = round(time.time() - started, 3)
+    report["rows_per_s"] = round(report["read"] / report["elapsed_s"]) if report["elapsed_s"] else None
+    return report
+
+
+def build_indexes(conn, table_name):
+    """
+    Creates the missing indexes and refreshes the planner statistics, each step in its own transaction.
+    :return: Whether the trigram indexes exist, False when the pg_trgm extension could not be created.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(CREATE_INDEXES[table_name])
+        cursor.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(table_name)))
+    conn.commit()
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(CREATE_EXTENSION)
+    except psycopg2.Error as e:
+        conn.rollback()
+        print(f"pg_trgm is not available, trigram indexes skipped: {str(e).strip()}", file=sys.stderr)
+        return False
+    conn.commit()
+    with conn.cursor() as cursor:
+        cursor.execute(CREATE_TRIGRAM_INDEXES[table_name])
+    conn.commit()
+    return True
+
+
+def create_indexes(conn, table_name):
+    """Creates the table and its missing indexes without loading anything, e.g. after an upgrade."""
+    started = time.time()
+    with conn.cursor() as cursor:
+        cursor.execute(CREATE_TABLES[table_name])
+    conn.commit()
+    trigram_indexes = build_indexes(conn, table_name)
+    return {"table": table_name, "trigram_indexes": trigram_indexes, "index_s": round(time.time() - started, 3)}
+
+
+def main(argv=None):
+    load_dotenv(os.path.join(BACKEND_DIR, ".env"))
+    parser = argparse.ArgumentParser(description="Load a CSV/XLSX export into the annuaire or evenement table.")
+    parser.add_argument("table", choices=sorted(CREATE_TABLES))
+    parser.add_argument("file", nargs="?", help="CSV or XLSX file with the French export headers or the column names")
+    parser.add_argument("--key", help="Comma separated natural key columns (default: numero)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--rebuild-indexes", action="store_true",
+                        help="Drop the secondary indexes before loading and recreate them afterwards")
+    parser.add_argument("--rejects", help="Write the rejected file lines and reasons to this CSV file")
+    parser.add_argument("--create-database", action="store_true", help="Create DB_NAME if it does not exist")
+    parser.add_argument("--indexes-only", action="store_true",
+                        help="Only create the table and its missing indexes, no file is loaded")
+    args = parser.parse_args(argv)
+
+    if not args.indexes_only and not args.file:
+        parser.error("the file argument is required unless --indexes-only is given")
+    if not args.indexes_only and not os.path.exists(args.file):
+        print(f"File '{args.file}' not found.", file=sys.stderr)
+        return 1
+
+    settings = connection_settings()
+    if args.create_database:
+        ensure_database(settings["dbname"])
+
+    conn = psycopg2.connect(**settings)
+    try:
+        if args.indexes_only:
+            report = create_indexes(conn, args.table)
+        else:
+            keys = [k.strip() for k in args.key.split(",")] if args.key else None
+            report = load(conn, args.table, args.file, keys, args.chunk_size, args.rebuild_indexes, args.rejects)
+    except Exception as e:
+        conn.rollback()
+        action = "create the indexes of" if args.indexes_only else f"load '{args.file}' into"
+        print(f"Failed to {action} '{args.table}': {e}", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())